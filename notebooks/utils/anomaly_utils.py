@@ -0,0 +1,355 @@
+import pandas as pd
+import numpy as np
+from utils.streaming_utils import STREAM_RESOLUTIONS, StreamingAggregator
+
+# Franjas estacionales de la línea base: día de la semana para datos diarios y hora de la semana para el resto
+SEASONAL_SLOTS = {'day': 7, 'hour': 168, 'minute': 168}
+
+# Peso de cada observación nueva en la media y varianza exponenciales de su franja
+DEFAULT_ALPHA = 0.1
+
+# Desviaciones respecto a la línea base a partir de las que un periodo es anómalo
+DEFAULT_THRESHOLD = 3.0
+
+# Las observaciones se recortan a media ± DEFAULT_CLIP desviaciones antes de actualizar la línea base
+DEFAULT_CLIP = 3.0
+
+# Observaciones de una franja necesarias antes de marcar anomalías en ella
+DEFAULT_WARMUP = 4
+
+ANOMALY_COLUMNS = ['expected', 'std', 'zscore', 'is_anomaly']
+
+def seasonal_slot(periods, resolution: str = 'day'):
+    """
+    Franja estacional de cada periodo: día de la semana (0 = lunes) o hora de la semana (0-167).
+    Acepta un np.datetime64 o un array de ellos.
+    """
+    if resolution == 'day':
+        return (periods.astype('datetime64[D]').astype(np.int64) + 3) % 7
+
+    hours = periods.astype('datetime64[h]').astype(np.int64)
+    return ((hours // 24 + 3) % 7) * 24 + hours % 24
+
+def period_instants(timestamp: pd.Timestamp) -> tuple:
+    """
+    Instante (UTC si tiene zona horaria) para ordenar los periodos y hora local para asignar su franja,
+    de forma que la franja de las 9:00 sigue siendo la de las 9:00 tras un cambio de hora
+    """
+    instant = timestamp.to_datetime64().astype('datetime64[ns]')
+    wall_clock = timestamp.tz_localize(None).to_datetime64().astype('datetime64[ns]') if timestamp.tz is not None else instant
+
+    return instant, wall_clock
+
+def baseline_std(mean, var):
+    """
+    Desviación de la línea base, con la varianza de Poisson (la media) y 1 como mínimos para franjas con pocos datos
+    """
+    return np.sqrt(np.maximum(np.maximum(var, mean), 1.0))
+
+def baseline_step(mean, var, n, x, alpha: float, threshold: float, clip: float, warmup: int) -> tuple:
+    """
+    Puntúa una observación frente a la línea base de su franja y actualiza la media y varianza exponenciales.
+    Funciona igual con escalares (detector en línea) que con arrays (reproducción por lotes), con las mismas
+    operaciones en el mismo orden, de forma que ambos modos dan exactamente los mismos resultados.
+    Una observación sin valor (NaN) no se puntúa (zscore NaN) ni modifica la franja: media, varianza y número
+    de observaciones se quedan como estaban.
+
+    Parameters:
+    - mean: media exponencial de la franja
+    - var: varianza exponencial de la franja
+    - n: observaciones previas de la franja
+    - x: admisiones del periodo
+    - alpha (float): peso de la observación nueva
+    - threshold (float): umbral de anomalía en desviaciones
+    - clip (float): recorte de la observación al actualizar, en desviaciones
+    - warmup (int): observaciones mínimas antes de puntuar
+
+    Returns:
+    - tuple: (esperado, desviación, zscore, anomalía, nueva media, nueva varianza, nuevas observaciones)
+    """
+    std = baseline_std(mean, var)
+    observed = np.isfinite(x)
+    ready = (n >= warmup) & observed
+    zscore = np.where(ready, (x - mean) / std, np.nan)
+    is_anomaly = ready & (np.abs(np.where(ready, zscore, 0.0)) > threshold)
+
+    # Se recorta la observación para que un pico no desplace la línea base de las semanas siguientes
+    x_update = np.where(ready, np.clip(x, mean - clip * std, mean + clip * std), x)
+    delta = x_update - mean
+    new_mean = np.where(observed, np.where(n == 0, x, mean + alpha * delta), mean)
+    new_var = np.where(observed, np.where(n == 0, 0.0, (1 - alpha) * (var + alpha * delta * delta)), var)
+    new_n = n + observed
+
+    expected = np.where(n > 0, mean, np.nan)
+
+    return expected, std, zscore, is_anomaly, new_mean, new_var, new_n
+
+class HospitalBaseline:
+    """
+    Línea base de un hospital: media, varianza y número de observaciones de cada franja estacional,
+    y el último periodo incorporado
+    """
+
+    __slots__ = ('mean', 'var', 'n', 'last_period')
+
+    def __init__(self, n_slots: int):
+        self.mean = np.zeros(n_slots)
+        self.var = np.zeros(n_slots)
+        self.n = np.zeros(n_slots, dtype=np.int64)
+        self.last_period = None
+
+class OnlineAnomalyDetector:
+    """
+    Detector de anomalías en línea sobre las admisiones de cada periodo cerrado. Mantiene por hospital una media
+    y varianza exponenciales (EWMA) por franja estacional (día de la semana o hora de la semana), y cada periodo
+    se puntúa frente a su franja antes de incorporarlo, con O(1) por observación.
+
+    Se conecta al agregador en streaming como callback de filas:
+        detector = OnlineAnomalyDetector('hour', on_anomaly=print)
+        aggregator = StreamingAggregator('hour', on_row=detector.observe_row)
+
+    o con detect_anomalies, que además avisa de los picos antes de que se cierre el periodo.
+    replay_anomalies da exactamente las mismas marcas sobre datos históricos.
+    """
+
+    def __init__(self, resolution: str = 'day', alpha: float = DEFAULT_ALPHA, threshold: float = DEFAULT_THRESHOLD,
+                 clip: float = DEFAULT_CLIP, warmup: int = DEFAULT_WARMUP, on_anomaly=None):
+        if resolution not in STREAM_RESOLUTIONS:
+            raise ValueError(f"Resolución no soportada: {resolution}")
+
+        self.resolution = resolution
+        self.time_col = 'date' if resolution == 'day' else 'datetime'
+        self.n_slots = SEASONAL_SLOTS[resolution]
+        self.alpha = alpha
+        self.threshold = threshold
+        self.clip = clip
+        self.warmup = warmup
+        self.on_anomaly = on_anomaly
+        self.baselines = {}
+        self.partial_alerts = {}
+
+    def update(self, hospital, period, admissions) -> dict:
+        """
+        Puntúa las admisiones de un periodo cerrado y las incorpora a la línea base de su franja
+
+        Parameters:
+        - hospital: clave del hospital
+        - period: inicio del periodo (datetime, pd.Timestamp o np.datetime64)
+        - admissions: admisiones del periodo (NaN o None si no hay dato: se devuelve zscore NaN y no se actualiza la franja)
+
+        Returns:
+        - dict: fila con 'expected', 'std', 'zscore' e 'is_anomaly'
+        """
+        timestamp = pd.Timestamp(period)
+        instant, wall_clock = period_instants(timestamp)
+        baseline = self.baselines.get(hospital)
+        if baseline is None:
+            baseline = self.baselines[hospital] = HospitalBaseline(self.n_slots)
+
+        if baseline.last_period is not None and instant <= baseline.last_period:
+            raise ValueError(f"El periodo {timestamp} del hospital {hospital} no es posterior al último incorporado")
+
+        slot = int(seasonal_slot(wall_clock, self.resolution))
+        expected, std, zscore, is_anomaly, new_mean, new_var, new_n = baseline_step(
+            baseline.mean[slot], baseline.var[slot], baseline.n[slot], np.nan if pd.isna(admissions) else float(admissions),
+            self.alpha, self.threshold, self.clip, self.warmup
+        )
+        baseline.mean[slot] = new_mean
+        baseline.var[slot] = new_var
+        baseline.n[slot] = new_n
+        baseline.last_period = instant
+
+        result = {
+            'hospital': hospital,
+            self.time_col: timestamp,
+            'admissions': admissions,
+            'expected': float(expected),
+            'std': float(std),
+            'zscore': float(zscore),
+            'is_anomaly': bool(is_anomaly),
+            'partial': False
+        }
+        if result['is_anomaly'] and self.on_anomaly is not None:
+            self.on_anomaly(result)
+
+        return result
+
+    def observe_row(self, row: dict) -> None:
+        """
+        Callback on_row de StreamingAggregator: incorpora cada fila emitida
+        """
+        self.update(row['hospital'], row[self.time_col], row['admissions'])
+
+    def check_partial(self, hospital, period, count) -> dict:
+        """
+        Comprueba si las admisiones acumuladas de un periodo aún abierto ya superan el umbral. Como el recuento
+        solo puede crecer y la línea base de la franja no cambia hasta que se cierre el periodo, un aviso aquí
+        siempre se confirma al cerrarlo. Se avisa una sola vez por periodo.
+
+        Parameters:
+        - hospital: clave del hospital
+        - period: inicio del periodo abierto
+        - count: admisiones acumuladas hasta ahora
+
+        Returns:
+        - dict: fila del aviso con 'partial' = True, o None si no hay aviso
+        """
+        baseline = self.baselines.get(hospital)
+        if baseline is None:
+            return None
+
+        timestamp = pd.Timestamp(period)
+        instant, wall_clock = period_instants(timestamp)
+        slot = int(seasonal_slot(wall_clock, self.resolution))
+        if baseline.n[slot] < self.warmup or self.partial_alerts.get(hospital) == instant:
+            return None
+
+        mean = baseline.mean[slot]
+        std = baseline_std(mean, baseline.var[slot])
+        zscore = (float(count) - mean) / std
+        if not zscore > self.threshold:
+            return None
+
+        self.partial_alerts[hospital] = instant
+        result = {
+            'hospital': hospital,
+            self.time_col: timestamp,
+            'admissions': count,
+            'expected': float(mean),
+            'std': float(std),
+            'zscore': float(zscore),
+            'is_anomaly': True,
+            'partial': True
+        }
+        if self.on_anomaly is not None:
+            self.on_anomaly(result)
+
+        return result
+
+def detect_anomalies(events, detector: OnlineAnomalyDetector = None, aggregator: StreamingAggregator = None):
+    """
+    Agrega eventos de llegada y devuelve las anomalías según se detectan:
+    - avisos parciales ('partial' = True) en cuanto el recuento de un periodo abierto supera el umbral, en el
+      mismo evento que lo cruza
+    - anomalías de periodos cerrados (también caídas), al cerrarse el periodo con el siguiente evento del hospital
+      o con aggregator.advance_watermark
+
+    Uso:
+        for alert in detect_anomalies(tail_csv_events('../datasets/stream/llegadas.csv', follow=True),
+                                      OnlineAnomalyDetector('hour')):
+            ...
+
+    Parameters:
+    - events: iterable de tuplas (hospital, timestamp)
+    - detector (OnlineAnomalyDetector): detector (por defecto diario); puede venir ya inicializado con replay_anomalies
+    - aggregator (StreamingAggregator): agregador (por defecto uno nuevo con la resolución del detector)
+
+    Returns:
+    - generator: filas de anomalías
+    """
+    detector = detector or OnlineAnomalyDetector()
+    aggregator = aggregator or StreamingAggregator(detector.resolution)
+
+    for hospital, timestamp in events:
+        for row in aggregator.add_event(hospital, timestamp):
+            result = detector.update(row['hospital'], row[aggregator.time_col], row['admissions'])
+            if result['is_anomaly']:
+                yield result
+
+        state = aggregator.hospitals[hospital]
+        if state.count > 0:
+            alert = detector.check_partial(hospital, state.period, state.count)
+            if alert is not None:
+                yield alert
+
+    for row in aggregator.flush():
+        result = detector.update(row['hospital'], row[aggregator.time_col], row['admissions'])
+        if result['is_anomaly']:
+            yield result
+
+def replay_anomalies(data, detector: OnlineAnomalyDetector = None) -> pd.DataFrame:
+    """
+    Reproduce el detector en línea sobre datos históricos (p.ej. un parquet procesado) y devuelve las mismas
+    marcas que daría OnlineAnomalyDetector.update fila a fila. Las observaciones de cada (hospital, franja) se
+    procesan en orden temporal, y todas las franjas a la vez con arrays: el bucle solo recorre el número de
+    observaciones de la franja más larga.
+    Al terminar, el detector queda con el estado final de cada hospital, para seguir en línea desde ahí.
+
+    Parameters:
+    - data: DataFrame o ruta de un parquet con columnas ['hospital', 'date' o 'datetime', 'admissions']
+    - detector (OnlineAnomalyDetector): detector vacío con los parámetros a usar (por defecto según la columna de fecha)
+
+    Returns:
+    - pd.DataFrame: filas de entrada, en el mismo orden, con las columnas ['expected', 'std', 'zscore', 'is_anomaly']
+    """
+    df = data if isinstance(data, pd.DataFrame) else pd.read_parquet(data)
+    time_col = 'datetime' if 'datetime' in df.columns else 'date'
+
+    if detector is None:
+        detector = OnlineAnomalyDetector('day' if time_col == 'date' else 'hour')
+    if detector.baselines:
+        raise ValueError("El detector ya tiene estado: la reproducción necesita uno vacío")
+
+    timestamps = pd.to_datetime(df[time_col])
+    times = timestamps.to_numpy(dtype='datetime64[ns]')
+    wall_clock = timestamps.dt.tz_localize(None).to_numpy(dtype='datetime64[ns]') if timestamps.dt.tz is not None else times
+    codes, hospitals = pd.factorize(df['hospital'])
+    x = df['admissions'].to_numpy(dtype=float, na_value=np.nan)
+    group = codes.astype(np.int64) * detector.n_slots + seasonal_slot(wall_clock, detector.resolution)
+
+    # Orden (hospital, franja, tiempo) y posición de cada fila dentro de su franja
+    order = np.lexsort((times, group))
+    sorted_group = group[order]
+    sorted_times = times[order]
+    new_group = np.r_[True, sorted_group[1:] != sorted_group[:-1]]
+    if (~new_group & (sorted_times == np.r_[sorted_times[:1], sorted_times[:-1]])).any():
+        raise ValueError("Hay periodos repetidos para un mismo hospital")
+
+    group_starts = np.flatnonzero(new_group)
+    group_index = np.cumsum(new_group) - 1
+    rank = np.arange(len(order)) - group_starts[group_index]
+
+    n_groups = len(group_starts)
+    mean = np.zeros(n_groups)
+    var = np.zeros(n_groups)
+    n = np.zeros(n_groups, dtype=np.int64)
+    expected = np.full(len(df), np.nan)
+    std = np.full(len(df), np.nan)
+    zscore = np.full(len(df), np.nan)
+    is_anomaly = np.zeros(len(df), dtype=bool)
+
+    by_rank = np.argsort(rank, kind='stable')
+    bounds = np.searchsorted(rank[by_rank], np.arange(rank.max() + 2 if len(rank) else 1))
+    for r in range(len(bounds) - 1):
+        positions = by_rank[bounds[r]:bounds[r + 1]]
+        g = group_index[positions]
+        rows = order[positions]
+
+        step = baseline_step(mean[g], var[g], n[g], x[rows], detector.alpha, detector.threshold,
+                             detector.clip, detector.warmup)
+        expected[rows], std[rows], zscore[rows], is_anomaly[rows], mean[g], var[g], n[g] = step
+
+    # Estado final por hospital, igual al que dejaría el detector en línea
+    # (las franjas están ordenadas por hospital, así que las de cada uno son un tramo contiguo)
+    group_ids = sorted_group[group_starts]
+    hospital_bounds = np.searchsorted(group_ids // detector.n_slots, np.arange(len(hospitals) + 1))
+    last_periods = pd.Series(times).groupby(codes).max()
+    for code, hospital in enumerate(hospitals):
+        start, end = hospital_bounds[code], hospital_bounds[code + 1]
+        slots = group_ids[start:end] % detector.n_slots
+
+        baseline = HospitalBaseline(detector.n_slots)
+        baseline.mean[slots] = mean[start:end]
+        baseline.var[slots] = var[start:end]
+        baseline.n[slots] = n[start:end]
+        baseline.last_period = last_periods[code].to_datetime64()
+        detector.baselines[hospital] = baseline
+
+    df = df.copy()
+    for col, values in zip(ANOMALY_COLUMNS, (expected, std, zscore, is_anomaly)):
+        df[col] = values
+
+    n_anomalies = int(is_anomaly.sum())
+    print(f"Se han marcado {n_anomalies} periodos anómalos en {len(hospitals)} hospitales")
+
+    return df
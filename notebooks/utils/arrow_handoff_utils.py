@@ -0,0 +1,209 @@
+import pandas as pd
+import pyarrow as pa
+import os
+import shutil
+import tempfile
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from utils import data_cleaning_utils
+from utils.data_cleaning_utils import read_raw_data, ARCHIVE_MEMBER_SEP, COMPRESSED_EXTENSIONS
+from utils.stage_cache_utils import run_stage
+from utils.instrumentation_utils import collect_trace_events, merge_trace_events
+
+# Carpeta de los buffers Arrow cuando no hay memoria compartida montada como sistema de ficheros (/dev/shm)
+HANDOFF_DIR = '../datasets/handoff/'
+
+SHARED_MEMORY_DIR = '/dev/shm'
+
+# Margen sobre el tamaño estimado de los resultados: /dev/shm solo se usa si tiene libre al menos este múltiplo
+# (en contenedores suele ser de 64 MB y, si se llena, los workers fallan al escribir)
+SHARED_MEMORY_MARGIN = 2
+
+# Factor de expansión estimado de los ficheros .gz/.bz2/.zst al descomprimirlos
+COMPRESSED_EXPANSION = 5
+
+def estimate_handoff_bytes(paths: list) -> int:
+    """
+    Estima el tamaño de los resultados que los workers dejan en la carpeta de intercambio a partir del tamaño
+    de los ficheros en bruto: tamaño descomprimido para los miembros de un .zip, tamaño en disco multiplicado
+    por COMPRESSED_EXPANSION para los comprimidos y tamaño en disco para el resto
+
+    Parameters:
+    - paths (list): rutas devueltas por read_multi_file_paths
+
+    Returns:
+    - int: tamaño estimado en bytes
+    """
+    total = 0
+    for path in paths:
+        if ARCHIVE_MEMBER_SEP in path:
+            archive_path, member = path.split(ARCHIVE_MEMBER_SEP, 1)
+            with zipfile.ZipFile(archive_path) as archive:
+                total += archive.getinfo(member).file_size
+        elif path.rsplit('.', 1)[-1] in COMPRESSED_EXTENSIONS:
+            total += os.path.getsize(path) * COMPRESSED_EXPANSION
+        else:
+            total += os.path.getsize(path)
+
+    return total
+
+def handoff_base_dir(expected_bytes: int = 0) -> str:
+    """
+    Elige la carpeta base de intercambio: /dev/shm si existe y tiene espacio libre para expected_bytes
+    (con SHARED_MEMORY_MARGIN), y si no HANDOFF_DIR en disco
+
+    Parameters:
+    - expected_bytes (int): tamaño estimado de los resultados (p.ej. de estimate_handoff_bytes)
+
+    Returns:
+    - str: carpeta base
+    """
+    if not os.path.isdir(SHARED_MEMORY_DIR):
+        return HANDOFF_DIR
+
+    free = shutil.disk_usage(SHARED_MEMORY_DIR).free
+    if free < expected_bytes * SHARED_MEMORY_MARGIN:
+        print(f"{SHARED_MEMORY_DIR} solo tiene {free / 2**20:.0f} MB libres para ~{expected_bytes / 2**20:.0f} MB, "
+              f"se usa {HANDOFF_DIR}")
+        return HANDOFF_DIR
+
+    return SHARED_MEMORY_DIR
+
+@contextmanager
+def arrow_handoff_dir(directory: str = None, expected_bytes: int = 0):
+    """
+    Crea la carpeta donde los workers dejan sus resultados como ficheros Arrow IPC y la borra al salir.
+    Por defecto se usa /dev/shm (memoria compartida) si existe y tiene espacio para expected_bytes, y si no
+    HANDOFF_DIR en disco. Las tablas leídas con read_arrow_handoff se deben usar (p.ej. guardar) dentro del bloque with.
+
+    Parameters:
+    - directory (str): carpeta base (por defecto la de handoff_base_dir)
+    - expected_bytes (int): tamaño estimado de los resultados, para comprobar el espacio libre en /dev/shm
+
+    Returns:
+    - Path: carpeta de esta ejecución
+    """
+    base = directory or handoff_base_dir(expected_bytes)
+    Path(base).mkdir(parents=True, exist_ok=True)
+    run_dir = Path(tempfile.mkdtemp(prefix='handoff_', dir=base))
+
+    try:
+        yield run_dir
+    finally:
+        # En Linux los mapeos siguen siendo válidos tras borrar los ficheros; en Windows los que sigan abiertos no se borran
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+def write_arrow_handoff(df: pd.DataFrame, directory: Path) -> str:
+    """
+    Escribe un DataFrame como fichero Arrow IPC sin comprimir y devuelve su ruta, que es lo único que el worker
+    envía al proceso principal
+
+    Parameters:
+    - df (pd.DataFrame): resultado del worker
+    - directory (Path): carpeta de arrow_handoff_dir
+
+    Returns:
+    - str: ruta del fichero
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    path = Path(directory) / f'{uuid.uuid4().hex}.arrow'
+
+    with pa.OSFile(str(path), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    return str(path)
+
+def read_arrow_handoff(path: str) -> pa.Table:
+    """
+    Lee un fichero de write_arrow_handoff mapeándolo en memoria: las columnas de la tabla apuntan
+    directamente al fichero, sin copiar ni deserializar los datos
+
+    Parameters:
+    - path (str): ruta devuelta por el worker
+
+    Returns:
+    - pa.Table: tabla respaldada por el mapeo en memoria
+    """
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).read_all()
+
+def concat_arrow_handoffs(paths: list) -> pa.Table:
+    """
+    Une los resultados de los workers como trozos de una única tabla Arrow, sin copiar las columnas
+    (equivalente a pd.concat(..., ignore_index=True) sobre los DataFrames)
+
+    Parameters:
+    - paths (list): rutas devueltas por los workers, en el orden deseado
+
+    Returns:
+    - pa.Table: tabla con un trozo por worker
+    """
+    tables = [read_arrow_handoff(path) for path in paths]
+    if not tables:
+        return None
+
+    # Si los tipos difieren entre trozos (p.ej. int y float) se unifican, y solo entonces se copia esa columna
+    return pa.concat_tables(tables, promote_options='permissive')
+
+def clean_file_task(task: tuple) -> tuple:
+    """
+    Lee y procesa un fichero en bruto dentro de un worker y deja el resultado en un fichero Arrow. Los eventos de
+    traza del worker (read_raw_data, process_*...) se devuelven para unirlos a la traza del proceso principal.
+
+    Parameters:
+    - task (tuple): (nombre de la fuente, formato, ruta, opciones, large_file, carpeta de intercambio, depends_on)
+
+    Returns:
+    - tuple: (ruta del fichero Arrow con el DataFrame procesado o None si no hay datos, eventos de traza)
+    """
+    name, format, path, options, large_file, directory, depends_on = task
+
+    process_func = getattr(data_cleaning_utils, f'process_{name}', None)
+    if process_func is None:
+        raise ValueError(f"No se encontró la función 'process_{name}'")
+
+    with collect_trace_events() as events:
+        df = read_raw_data(format, path, options, large_file)
+        processed_df = run_stage(process_func, df, depends_on=depends_on)
+
+    if processed_df is None:
+        return None, events
+
+    return write_arrow_handoff(processed_df, directory), events
+
+def clean_files_in_pool(name: str, format: str, paths: list, options: dict, large_file: bool, directory: Path,
+                        max_workers: int = None, depends_on: list = None) -> pa.Table:
+    """
+    Lee y procesa los ficheros de una fuente en un pool de procesos. Cada worker devuelve solo la ruta de su
+    resultado en Arrow (memoria compartida), en lugar de enviar el DataFrame serializado con pickle, y el proceso
+    principal los une sin copias con concat_arrow_handoffs. La tabla se puede pasar directamente a save_clean_data.
+    Los eventos de traza de los workers se añaden a la traza del proceso principal (ver save_trace).
+
+    Parameters:
+    - name (str): nombre de la fuente (se usa process_<name>)
+    - format (str): formato de los ficheros
+    - paths (list): ficheros de read_multi_file_paths
+    - options (dict): opciones de lectura
+    - large_file (bool): lectura por bloques
+    - directory (Path): carpeta de arrow_handoff_dir
+    - max_workers (int): número de procesos (por defecto el número de CPUs)
+    - depends_on (list): ficheros adicionales de los que depende el procesado (para run_stage)
+
+    Returns:
+    - pa.Table: resultado de todos los ficheros en el orden de paths
+    """
+    tasks = [(name, format, path, options, large_file, directory, depends_on) for path in paths]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(clean_file_task, tasks))
+
+    handles = [handle for handle, _ in results if handle is not None]
+    for _, events in results:
+        merge_trace_events(events)
+
+    print(f"Se han procesado {len(handles)} archivos de '{name}' en paralelo")
+
+    return concat_arrow_handoffs(handles)
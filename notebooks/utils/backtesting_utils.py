@@ -0,0 +1,294 @@
+import pandas as pd
+import numpy as np
+import os
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from utils.data_preprocessing_utils import FEATURE_COLUMNS, read_processed_files
+
+# Métricas usadas en los papers de datasets.md
+METRICS = ['mae', 'rmse', 'mape', 'smape', 'r2', 'quantile_bias']
+
+# Desfase mínimo de las admisiones pasadas que usa cada feature de aggregate_data (lag_k = shift(k),
+# rolling_k = shift(1).rolling(k)); las columnas que no aparecen no dependen de las admisiones
+FEATURE_MIN_LAGS = {'lag_7': 7, 'lag_14': 14, 'rolling_7': 1, 'rolling_14': 1}
+
+def compute_metrics(y_true: np.ndarray, y_pred: np.ndarray, quantile: float = 0.5) -> dict:
+    """
+    Calcula las métricas de evaluación de una predicción puntual
+
+    Parameters:
+    - y_true (np.ndarray): valores reales
+    - y_pred (np.ndarray): valores predichos
+    - quantile (float): cuantil que representa la predicción, usado en el sesgo de cuantil
+
+    Returns:
+    - dict: diccionario con MAE, RMSE, MAPE, sMAPE, R² y sesgo de cuantil
+    """
+    y_true = np.asarray(y_true, dtype=float)
+    y_pred = np.asarray(y_pred, dtype=float)
+
+    # Se descartan los puntos sin valor real o sin predicción
+    mask = np.isfinite(y_true) & np.isfinite(y_pred)
+    y_true = y_true[mask]
+    y_pred = y_pred[mask]
+
+    if y_true.size == 0:
+        return {metric: np.nan for metric in METRICS}
+
+    error = y_true - y_pred
+    abs_error = np.abs(error)
+
+    # MAPE solo sobre los valores reales distintos de cero
+    non_zero = y_true != 0
+    mape = np.mean(abs_error[non_zero] / np.abs(y_true[non_zero])) if non_zero.any() else np.nan
+
+    # sMAPE con 0/0 considerado error nulo
+    denom = np.abs(y_true) + np.abs(y_pred)
+    smape = np.mean(np.divide(2 * abs_error, denom, out=np.zeros_like(denom), where=denom != 0))
+
+    ss_tot = np.sum((y_true - y_true.mean()) ** 2)
+    r2 = 1 - np.sum(error ** 2) / ss_tot if ss_tot > 0 else np.nan
+
+    # Sesgo de cuantil: proporción de observaciones por debajo de la predicción menos el cuantil nominal
+    quantile_bias = np.mean(y_true <= y_pred) - quantile
+
+    return {
+        'mae': abs_error.mean(),
+        'rmse': np.sqrt(np.mean(error ** 2)),
+        'mape': mape,
+        'smape': smape,
+        'r2': r2,
+        'quantile_bias': quantile_bias
+    }
+
+def seasonal_naive_model(y_train: np.ndarray, X_train: np.ndarray, X_test: np.ndarray, season: int = 7) -> np.ndarray:
+    """
+    Modelo de referencia Random Walk estacional: repite el último ciclo observado
+
+    Parameters:
+    - y_train (np.ndarray): admisiones de entrenamiento
+    - X_train (np.ndarray): variables exógenas de entrenamiento (no se usan)
+    - X_test (np.ndarray): variables exógenas del periodo a predecir
+    - season (int): longitud del ciclo estacional
+
+    Returns:
+    - np.ndarray: predicciones para cada fila de X_test
+    """
+    last_cycle = y_train[-season:]
+    reps = int(np.ceil(len(X_test) / len(last_cycle)))
+
+    return np.tile(last_cycle, reps)[:len(X_test)]
+
+def historical_mean_model(y_train: np.ndarray, X_train: np.ndarray, X_test: np.ndarray) -> np.ndarray:
+    """
+    Modelo de referencia que predice la media histórica de admisiones
+
+    Parameters:
+    - y_train (np.ndarray): admisiones de entrenamiento
+    - X_train (np.ndarray): variables exógenas de entrenamiento (no se usan)
+    - X_test (np.ndarray): variables exógenas del periodo a predecir
+
+    Returns:
+    - np.ndarray: predicciones para cada fila de X_test
+    """
+    return np.full(len(X_test), np.nanmean(y_train))
+
+def to_naive_ns(values) -> np.ndarray:
+    """
+    Convierte fechas (con o sin zona horaria) a un array datetime64[ns] sin zona horaria en UTC
+    """
+    index = pd.DatetimeIndex(pd.to_datetime(values))
+    if index.tz is not None:
+        index = index.tz_convert(None)
+
+    return index.as_unit('ns').values
+
+def prepare_hospital_arrays(df: pd.DataFrame, feature_columns: list = None, dtype=float) -> tuple:
+    """
+    Ordena el DataFrame una única vez y devuelve los arrays contiguos con los límites de cada hospital.
+    Cualquier fold de cualquier hospital es un slice (vista) de estos arrays.
+
+    Parameters:
+    - df (pd.DataFrame): DataFrame procesado con columnas ['hospital', 'date' o 'datetime', 'admissions', ...]
+    - feature_columns (list): columnas exógenas a extraer (por defecto FEATURE_COLUMNS)
+    - dtype: tipo numérico de las admisiones y de la matriz exógena
+
+    Returns:
+    - tuple: (hospitales, offsets, tiempos, admisiones, matriz exógena)
+    """
+    time_col = 'datetime' if 'datetime' in df.columns else 'date'
+    feature_columns = FEATURE_COLUMNS if feature_columns is None else feature_columns
+    feature_columns = [col for col in feature_columns if col in df.columns]
+
+    df = df.sort_values(['hospital', time_col], kind='stable')
+
+    codes, hospitals = pd.factorize(df['hospital'], sort=True)
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(hospitals)))])
+
+    times = to_naive_ns(df[time_col])
+    y = df['admissions'].to_numpy(dtype=dtype)
+    X = df[feature_columns].to_numpy(dtype=dtype)
+
+    return list(hospitals), offsets, times, y, X
+
+def leak_free_columns(feature_columns: list, horizon: int) -> list:
+    """
+    Devuelve las columnas cuyo valor en cualquier paso del horizonte solo depende de admisiones anteriores
+    al corte: las de calendario y los retardos de al menos 'horizon' periodos. Las medias móviles usan el
+    periodo anterior, así que a partir del segundo paso incluirían admisiones reales del propio test.
+
+    Parameters:
+    - feature_columns (list): columnas candidatas
+    - horizon (int): número de periodos a predecir
+
+    Returns:
+    - list: columnas sin fuga de datos del periodo de test
+    """
+    return [col for col in feature_columns if FEATURE_MIN_LAGS.get(col, horizon) >= horizon]
+
+def check_no_leakage(feature_columns: list, horizon: int) -> None:
+    """
+    Comprueba que ninguna feature de las filas de test depende de las admisiones del propio test
+    """
+    leaking = [col for col in feature_columns if col not in leak_free_columns(feature_columns, horizon)]
+    if leaking:
+        raise ValueError(f"Las columnas {leaking} usan admisiones del periodo de test con horizonte {horizon}")
+
+def generate_cutoffs(df: pd.DataFrame, n_folds: int = 50, horizon: int = 7) -> pd.DatetimeIndex:
+    """
+    Genera un calendario de orígenes para evaluación rolling-origin separados 'horizon' periodos
+    y terminando de modo que el último fold tenga un horizonte completo
+
+    Parameters:
+    - df (pd.DataFrame): DataFrame procesado
+    - n_folds (int): número de folds
+    - horizon (int): número de periodos a predecir en cada fold
+
+    Returns:
+    - pd.DatetimeIndex: fechas de corte ordenadas
+    """
+    time_col = 'datetime' if 'datetime' in df.columns else 'date'
+    unique_times = np.unique(to_naive_ns(df[time_col]))
+
+    positions = len(unique_times) - horizon * np.arange(n_folds, 0, -1)
+    positions = positions[positions > 0]
+
+    return pd.DatetimeIndex(unique_times[positions])
+
+def rolling_origin_folds(times: np.ndarray, cutoffs: np.ndarray, horizon: int) -> list:
+    """
+    Construye los folds rolling-origin de una serie ordenada como pares de slices, sin copiar datos
+
+    Parameters:
+    - times (np.ndarray): tiempos ordenados de la serie (datetime64[ns])
+    - cutoffs (np.ndarray): fechas de corte (datetime64[ns])
+    - horizon (int): número de periodos a predecir
+
+    Returns:
+    - list: lista de tuplas (número de fold, fecha de corte, slice de entrenamiento, slice de test)
+    """
+    positions = np.searchsorted(times, cutoffs, side='left')
+    folds = []
+
+    for fold, (cutoff, pos) in enumerate(zip(cutoffs, positions)):
+        # Se descartan los folds sin entrenamiento o sin horizonte completo
+        if pos == 0 or pos + horizon > len(times):
+            continue
+        folds.append((fold, cutoff, slice(0, pos), slice(pos, pos + horizon)))
+
+    return folds
+
+def backtest_hospital(task: tuple) -> list:
+    """
+    Evalúa todos los modelos sobre todos los folds de un hospital.
+    Los folds son vistas de los arrays del hospital, compartidos por todos los modelos.
+
+    Parameters:
+    - task (tuple): (dataset, hospital, tiempos, admisiones, matriz exógena, cortes, horizonte, modelos)
+
+    Returns:
+    - list: filas en formato largo (dataset, hospital, model, fold, cutoff, metric, value)
+    """
+    dataset, hospital, times, y, X, cutoffs, horizon, models = task
+    rows = []
+
+    for fold, cutoff, train, test in rolling_origin_folds(times, cutoffs, horizon):
+        y_train, X_train = y[train], X[train]
+        y_test, X_test = y[test], X[test]
+
+        for model_name, model in models.items():
+            try:
+                y_pred = model(y_train, X_train, X_test)
+            except Exception as e:
+                print(f"Error en el modelo '{model_name}' para '{hospital}' (fold {fold}): {e}")
+                continue
+
+            metrics = compute_metrics(y_test, y_pred)
+            for metric, value in metrics.items():
+                rows.append((dataset, hospital, model_name, fold, cutoff, metric, value))
+
+    return rows
+
+def run_backtest(models: dict, datasets: list = None, cutoffs=None, n_folds: int = 50, horizon: int = 7, max_workers: int = None,
+                 feature_columns: list = None) -> pd.DataFrame:
+    """
+    Ejecuta una evaluación rolling-origin de varios modelos sobre todos los hospitales de los datasets procesados,
+    repartiendo los hospitales en un pool de procesos
+
+    Parameters:
+    - models (dict): diccionario nombre -> callable(y_train, X_train, X_test) que devuelve las predicciones.
+      Deben ser funciones definidas a nivel de módulo (o functools.partial) para poder enviarse al pool
+    - datasets (list): rutas de los parquet a evaluar (por defecto todos los de processed_datasets)
+    - cutoffs: fechas de corte comunes; si es None se generan n_folds por dataset
+    - n_folds (int): número de folds a generar si no se indican cortes
+    - horizon (int): número de periodos a predecir en cada fold
+    - max_workers (int): número de procesos; con 1 se ejecuta en el proceso actual
+    - feature_columns (list): columnas de la matriz exógena (por defecto las de FEATURE_COLUMNS sin fuga de datos
+      del periodo de test para el horizonte, ver leak_free_columns)
+
+    Returns:
+    - pd.DataFrame: métricas en formato largo con columnas
+      ['dataset', 'hospital', 'model', 'fold', 'cutoff', 'metric', 'value']
+    """
+    datasets = datasets if datasets is not None else read_processed_files()
+    feature_columns = leak_free_columns(FEATURE_COLUMNS, horizon) if feature_columns is None else feature_columns
+    check_no_leakage(feature_columns, horizon)
+    tasks = []
+
+    for path in datasets:
+        name = Path(path).stem
+        df = pd.read_parquet(path)
+
+        dataset_cutoffs = to_naive_ns(cutoffs) if cutoffs is not None else generate_cutoffs(df, n_folds, horizon).values
+
+        # Las características se extraen una única vez por dataset y se reutilizan en todos los folds y modelos
+        hospitals, offsets, times, y, X = prepare_hospital_arrays(df, feature_columns)
+        for i, hospital in enumerate(hospitals):
+            rows = slice(offsets[i], offsets[i + 1])
+            tasks.append((name, hospital, times[rows], y[rows], X[rows], dataset_cutoffs, horizon, models))
+
+    if max_workers == 1:
+        rows = [row for task in tasks for row in backtest_hospital(task)]
+    else:
+        # Se agrupan varios hospitales por envío para reducir la sobrecarga del pool
+        chunksize = max(1, len(tasks) // (4 * (max_workers or os.cpu_count() or 1)))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(backtest_hospital, tasks, chunksize=chunksize)
+            rows = [row for hospital_rows in results for row in hospital_rows]
+
+    df_metrics = pd.DataFrame(rows, columns=['dataset', 'hospital', 'model', 'fold', 'cutoff', 'metric', 'value'])
+
+    print(f"Backtesting completado: {len(tasks)} hospitales, {df_metrics['fold'].nunique()} folds, {len(models)} modelos")
+    return df_metrics
+
+def summarize_backtest(df_metrics: pd.DataFrame) -> pd.DataFrame:
+    """
+    Resume las métricas del backtesting con la media por dataset y modelo
+
+    Parameters:
+    - df_metrics (pd.DataFrame): salida de run_backtest
+
+    Returns:
+    - pd.DataFrame: tabla dataset x modelo con una columna por métrica
+    """
+    return df_metrics.pivot_table(index=['dataset', 'model'], columns='metric', values='value', aggfunc='mean')[METRICS]
@@ -0,0 +1,176 @@
+import pandas as pd
+import numpy as np
+import os
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+import utils.data_cleaning_utils as cleaning
+import utils.data_preprocessing_utils as preprocessing
+from utils.synthetic_data_utils import SYNTHETIC_DATASETS, generate_raw_datasets
+
+BENCHMARK_RESULTS_DIR = '../benchmarks/'
+
+# Tamaños por defecto: (número de hospitales, número de años)
+DEFAULT_SIZES = [(5, 1), (20, 1), (20, 3)]
+
+# Etapas del preprocesado que se miden sobre la salida de cada process_*
+PREPROCESSING_STAGES = ['cast_columns_types', 'group_data', 'process_data', 'aggregate_data']
+
+def measure_stage(func, make_input, repeats: int = 3) -> dict:
+    """
+    Mide el tiempo, la CPU y el pico de memoria de una etapa. La entrada se regenera en cada
+    repetición (fuera de la medición) porque varias etapas modifican el DataFrame recibido.
+
+    Parameters:
+    - func (callable): etapa a medir, recibe el valor devuelto por make_input
+    - make_input (callable): función sin argumentos que devuelve la entrada de la etapa
+    - repeats (int): número de repeticiones para el tiempo
+
+    Returns:
+    - dict: métricas de la etapa y su última salida en 'output'
+    """
+    wall_times = []
+    cpu_times = []
+    output = None
+
+    for _ in range(repeats):
+        data = make_input()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        output = func(data)
+        wall_times.append(time.perf_counter() - wall_start)
+        cpu_times.append(time.process_time() - cpu_start)
+
+    # El pico de memoria se mide en una pasada aparte porque tracemalloc ralentiza la ejecución
+    data = make_input()
+    tracemalloc.start()
+    func(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rows_in = len(data) if hasattr(data, '__len__') and not isinstance(data, str) else np.nan
+
+    return {
+        'rows_in': rows_in,
+        'rows_out': len(output) if isinstance(output, pd.DataFrame) else np.nan,
+        'wall_min': min(wall_times),
+        'wall_median': float(np.median(wall_times)),
+        'cpu_median': float(np.median(cpu_times)),
+        'peak_mem_mb': peak / 1024 ** 2,
+        'output': output
+    }
+
+def get_git_commit() -> str:
+    """
+    Devuelve el commit actual del repositorio, o None si no se puede obtener
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def run_benchmarks(sizes: list = None, sources: list = None, repeats: int = 3, arrivals_per_day: float = 50, save: bool = True) -> pd.DataFrame:
+    """
+    Genera datos sintéticos de varios tamaños y mide cada etapa de limpieza (read_raw_data, process_*)
+    y de preprocesado (cast_columns_types, group_data, process_data, aggregate_data).
+    Se ejecuta en una carpeta temporal con la misma estructura que el repositorio, sin tocar los datasets reales.
+
+    Parameters:
+    - sizes (list): lista de tuplas (hospitales, años); por defecto DEFAULT_SIZES
+    - sources (list): nombres de SYNTHETIC_DATASETS a medir (por defecto todos)
+    - repeats (int): repeticiones por etapa
+    - arrivals_per_day (float): media de admisiones diarias por hospital
+    - save (bool): guarda los resultados en BENCHMARK_RESULTS_DIR
+
+    Returns:
+    - pd.DataFrame: una fila por tamaño, fuente y etapa
+    """
+    sizes = sizes or DEFAULT_SIZES
+    datasets = [d for d in SYNTHETIC_DATASETS if sources is None or d['name'] in sources]
+    results_dir = Path(BENCHMARK_RESULTS_DIR).resolve()
+    commit = get_git_commit()
+    original_cwd = os.getcwd()
+    rows = []
+
+    for n_hospitals, n_years in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / 'notebooks').mkdir()
+            (root / 'datasets' / 'clean_datasets').mkdir(parents=True)
+
+            generate_raw_datasets(root / 'datasets' / 'raw_datasets', n_hospitals=n_hospitals, n_years=n_years,
+                                  arrivals_per_day=arrivals_per_day, sources=[d['name'] for d in datasets])
+
+            # Las funciones de limpieza usan rutas relativas a la carpeta notebooks
+            os.chdir(root / 'notebooks')
+            try:
+                for dataset in datasets:
+                    name = dataset['name']
+                    process_func = getattr(cleaning, f"process_{name}")
+                    processed = []
+
+                    for path in cleaning.read_multi_file_paths(dataset['format'], name):
+                        stage_results = {}
+                        stage_results['read_raw_data'] = measure_stage(
+                            lambda p: cleaning.read_raw_data(dataset['format'], p, dataset['options'], dataset.get('large_file', False)),
+                            lambda: path, repeats)
+                        df_raw = stage_results['read_raw_data']['output']
+
+                        stage_results[f'process_{name}'] = measure_stage(process_func, lambda: df_raw.copy(), repeats)
+                        processed.append(stage_results[f'process_{name}']['output'])
+
+                        for stage, result in stage_results.items():
+                            rows.append({'n_hospitals': n_hospitals, 'n_years': n_years, 'source': name, 'file': Path(path).name, 'stage': stage,
+                                         **{k: v for k, v in result.items() if k != 'output'}})
+
+                    # Las etapas de preprocesado se encadenan sobre la salida de la anterior
+                    df_stage = pd.concat(processed, ignore_index=True)
+                    for stage in PREPROCESSING_STAGES:
+                        stage_func = getattr(preprocessing, stage)
+                        result = measure_stage(stage_func, lambda: df_stage.copy(), repeats)
+                        df_stage = result.pop('output')
+                        rows.append({'n_hospitals': n_hospitals, 'n_years': n_years, 'source': name, 'file': None, 'stage': stage, **result})
+            finally:
+                os.chdir(original_cwd)
+
+    df_results = pd.DataFrame(rows)
+    df_results['commit'] = commit
+    df_results['timestamp'] = datetime.now().isoformat(timespec='seconds')
+
+    if save:
+        results_dir.mkdir(parents=True, exist_ok=True)
+        output_path = results_dir / f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        df_results.to_csv(output_path, index=False)
+        print(f"Resultados de benchmark guardados en: {output_path}")
+
+    return df_results
+
+def compare_benchmarks(baseline, current, threshold: float = 0.1) -> pd.DataFrame:
+    """
+    Compara dos ejecuciones de run_benchmarks y marca las etapas que empeoran más de un umbral
+
+    Parameters:
+    - baseline: DataFrame o ruta CSV de la ejecución de referencia
+    - current: DataFrame o ruta CSV de la ejecución a comparar
+    - threshold (float): empeoramiento relativo a partir del cual se marca una regresión (0.1 = 10%)
+
+    Returns:
+    - pd.DataFrame: ratios de tiempo y memoria por tamaño, fuente y etapa
+    """
+    baseline = pd.read_csv(baseline) if not isinstance(baseline, pd.DataFrame) else baseline
+    current = pd.read_csv(current) if not isinstance(current, pd.DataFrame) else current
+
+    keys = ['n_hospitals', 'n_years', 'source', 'stage']
+    metrics = ['wall_median', 'peak_mem_mb']
+    base = baseline.groupby(keys, dropna=False)[metrics].sum()
+    curr = current.groupby(keys, dropna=False)[metrics].sum()
+
+    df = base.join(curr, lsuffix='_baseline', rsuffix='_current', how='inner')
+    df['time_ratio'] = df['wall_median_current'] / df['wall_median_baseline']
+    df['memory_ratio'] = df['peak_mem_mb_current'] / df['peak_mem_mb_baseline']
+    df['regression'] = (df['time_ratio'] > 1 + threshold) | (df['memory_ratio'] > 1 + threshold)
+
+    print(f"Etapas con regresión: {int(df['regression'].sum())} de {len(df)}")
+    return df.reset_index().sort_values('time_ratio', ascending=False)
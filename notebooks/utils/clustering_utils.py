@@ -0,0 +1,292 @@
+import pandas as pd
+import numpy as np
+import pyarrow.parquet as pq
+from pathlib import Path
+from utils.data_preprocessing_utils import read_processed_files
+from utils.hospital_registry_utils import update_hospital_metadata
+
+# Features del perfil de cada hospital usadas en el clustering
+WEEKLY_COLUMNS = [f'weekly_{d}' for d in range(7)]
+HOURLY_COLUMNS = [f'hourly_{h}' for h in range(24)]
+PROFILE_FEATURES = WEEKLY_COLUMNS + HOURLY_COLUMNS + ['trend', 'volatility', 'intermittency']
+
+def extract_profile_features(path: str, batch_size: int = 1_000_000, decompositions: dict = None) -> pd.DataFrame:
+    """
+    Calcula el perfil de cada hospital de un dataset procesado leyendo el parquet por lotes, de forma que la
+    memoria depende del tamaño del lote y del número de hospitales-día, no del número de filas:
+    - weekly_0..6: admisiones de cada día de la semana respecto a la media (1 = perfil plano)
+    - hourly_0..23: admisiones de cada hora respecto a la media (1 en los datasets diarios)
+    - trend: pendiente de las admisiones diarias en un año, relativa a la media diaria
+    - volatility: coeficiente de variación de las admisiones diarias
+    - intermittency: proporción de días sin admisiones entre el primer y el último día del hospital
+    Si se pasa la salida de analyze_all_hospitals (datos diarios, periodo 7), el perfil semanal de esos
+    hospitales se toma de la componente estacional ya calculada.
+
+    Parameters:
+    - path (str): ruta del parquet procesado
+    - batch_size (int): filas por lote
+    - decompositions (dict): resultados de analyze_all_hospitals por hospital
+
+    Returns:
+    - pd.DataFrame: una fila por hospital con ['dataset', 'hospital', 'mean_daily'] + PROFILE_FEATURES
+    """
+    parquet = pq.ParquetFile(path)
+    time_col = 'datetime' if 'datetime' in parquet.schema_arrow.names else 'date'
+
+    # Los hospitales se van indexando según aparecen en los lotes, sin leer antes la columna completa
+    hospitals = None
+    hour_sums = np.zeros((0, 24))
+    daily_parts = []
+
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=['hospital', time_col, 'admissions']):
+        df = batch.to_pandas()
+        batch_codes, batch_hospitals = pd.factorize(df['hospital'])
+        if hospitals is None:
+            hospitals = pd.Index(batch_hospitals[:0])
+
+        positions = hospitals.get_indexer(batch_hospitals)
+        new = positions < 0
+        if new.any():
+            positions[new] = len(hospitals) + np.arange(new.sum())
+            hospitals = hospitals.append(pd.Index(batch_hospitals[new]))
+            hour_sums = np.vstack([hour_sums, np.zeros((new.sum(), 24))])
+        codes = positions[batch_codes]
+
+        # Hora y día en hora local, como en aggregate_data
+        times = df[time_col].dt.tz_localize(None) if df[time_col].dt.tz is not None else df[time_col]
+        values = times.to_numpy(dtype='datetime64[ns]')
+        days = values.astype('datetime64[D]')
+        hours = (values - days).astype('timedelta64[h]').astype(np.int64)
+        admissions = df['admissions'].to_numpy(dtype=float)
+        admissions = np.where(np.isnan(admissions), 0.0, admissions)
+
+        hour_sums += np.bincount(codes * 24 + hours, weights=admissions, minlength=len(hospitals) * 24).reshape(-1, 24)
+
+        # Cada lote se reduce a sus totales por hospital-día antes de guardarlo (24 o 1440 veces menos filas
+        # que el lote en datos horarios o por minuto)
+        daily_batch = pd.DataFrame({'code': codes, 'day': days.astype(np.int64), 'admissions': admissions})
+        daily_parts.append(daily_batch.groupby(['code', 'day'], sort=False)['admissions'].sum().reset_index())
+
+    n_hospitals = len(hospitals)
+
+    # Un día puede quedar repartido entre dos lotes, así que los totales diarios se vuelven a sumar al final
+    daily = pd.concat(daily_parts, ignore_index=True).groupby(['code', 'day'], sort=False)['admissions'].sum().reset_index()
+    code = daily['code'].to_numpy(dtype=np.int64)
+    day = daily['day'].to_numpy(dtype=np.int64)
+    total = daily['admissions'].to_numpy(dtype=float)
+
+    n_days = np.bincount(code, minlength=n_hospitals).astype(float)
+    sum_y = np.bincount(code, weights=total, minlength=n_hospitals)
+    mean_y = sum_y / np.maximum(n_days, 1)
+
+    first_day = np.full(n_hospitals, np.iinfo(np.int64).max)
+    last_day = np.full(n_hospitals, np.iinfo(np.int64).min)
+    np.minimum.at(first_day, code, day)
+    np.maximum.at(last_day, code, day)
+    span = np.maximum(last_day - first_day + 1, 1)
+    active = np.bincount(code, weights=(total > 0).astype(float), minlength=n_hospitals)
+
+    # Perfil semanal: admisiones por día de la semana sobre las que corresponderían con un perfil plano
+    # (el 1970-01-01 fue jueves)
+    day_of_week = (day + 3) % 7
+    weekly_sums = np.bincount(code * 7 + day_of_week, weights=total, minlength=n_hospitals * 7).reshape(n_hospitals, 7)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weekly = weekly_sums * 7 / sum_y[:, None]
+        hourly = hour_sums * 24 / sum_y[:, None] if time_col == 'datetime' else np.ones((n_hospitals, 24))
+
+        # Pendiente por mínimos cuadrados de las admisiones diarias frente al tiempo en años
+        t = (day - first_day[code]) / 365.25
+        sum_t = np.bincount(code, weights=t, minlength=n_hospitals)
+        sum_tt = np.bincount(code, weights=t * t, minlength=n_hospitals)
+        sum_ty = np.bincount(code, weights=t * total, minlength=n_hospitals)
+        var_t = sum_tt - sum_t ** 2 / n_days
+        slope = (sum_ty - sum_t * sum_y / n_days) / var_t
+        trend = np.where(var_t > 0, slope / mean_y, 0.0)
+
+        sum_yy = np.bincount(code, weights=total * total, minlength=n_hospitals)
+        variance = np.maximum(sum_yy / n_days - mean_y ** 2, 0) * n_days / np.maximum(n_days - 1, 1)
+        volatility = np.sqrt(variance) / mean_y
+
+    features = pd.DataFrame(np.column_stack([weekly, hourly]), columns=WEEKLY_COLUMNS + HOURLY_COLUMNS)
+    features.insert(0, 'dataset', Path(path).stem)
+    features.insert(1, 'hospital', hospitals.to_numpy())
+    features.insert(2, 'mean_daily', mean_y)
+    features['trend'] = trend
+    features['volatility'] = volatility
+    features['intermittency'] = 1 - active / span
+
+    if decompositions and time_col == 'date':
+        apply_decompositions(features, decompositions)
+
+    return features
+
+def apply_decompositions(features: pd.DataFrame, decompositions: dict) -> None:
+    """
+    Sustituye el perfil semanal por el de la descomposición estacional ya calculada (salida de
+    analyze_all_hospitals) en los hospitales que la tienen. La volatilidad no se sustituye para que
+    tenga la misma definición en todos los hospitales.
+
+    Parameters:
+    - features (pd.DataFrame): features de extract_profile_features (se modifica)
+    - decompositions (dict): resultados por hospital con 'trend' y 'seasonal'
+    """
+    positions = pd.Index(features['hospital']).get_indexer(list(decompositions))
+
+    for position, result in zip(positions, decompositions.values()):
+        level = result['trend'].mean()
+        if position < 0 or not level > 0:
+            continue
+
+        seasonal = result['seasonal'].groupby(result['seasonal'].index.dayofweek).mean()
+        features.loc[features.index[position], WEEKLY_COLUMNS] = (1 + seasonal.reindex(range(7), fill_value=0) / level).to_numpy()
+
+def extract_all_profile_features(datasets: list = None, batch_size: int = 1_000_000, decompositions: dict = None) -> pd.DataFrame:
+    """
+    Calcula el perfil de todos los hospitales de los datasets procesados
+
+    Parameters:
+    - datasets (list): rutas de los parquet procesados (por defecto todos)
+    - batch_size (int): filas por lote al leer cada parquet
+    - decompositions (dict): salidas de analyze_all_hospitals por nombre de dataset
+
+    Returns:
+    - pd.DataFrame: una fila por (dataset, hospital)
+    """
+    paths = datasets if datasets is not None else read_processed_files()
+    frames = [extract_profile_features(path, batch_size, (decompositions or {}).get(Path(path).stem)) for path in paths]
+
+    return pd.concat(frames, ignore_index=True)
+
+def squared_distances(X: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """
+    Distancias euclídeas al cuadrado entre cada fila de X y cada centro, de forma (n, k)
+    """
+    distances = (X ** 2).sum(axis=1)[:, None] - 2 * X @ centers.T + (centers ** 2).sum(axis=1)[None, :]
+
+    return np.maximum(distances, 0)
+
+def assign_clusters(X: np.ndarray, centers: np.ndarray, chunk_size: int = 65_536) -> tuple:
+    """
+    Asigna cada fila al centro más cercano, por bloques para acotar la memoria de la matriz de distancias
+
+    Returns:
+    - tuple: (cluster de cada fila, distancia al cuadrado a su centro)
+    """
+    labels = np.empty(len(X), dtype=np.int32)
+    distances = np.empty(len(X))
+
+    for start in range(0, len(X), chunk_size):
+        d = squared_distances(X[start:start + chunk_size], centers)
+        labels[start:start + chunk_size] = d.argmin(axis=1)
+        distances[start:start + chunk_size] = d[np.arange(len(d)), labels[start:start + chunk_size]]
+
+    return labels, distances
+
+def minibatch_kmeans(X: np.ndarray, n_clusters: int = 8, batch_size: int = 1024, max_iter: int = 200,
+                     tol: float = 1e-4, seed: int = 0) -> tuple:
+    """
+    K-means por mini-lotes (Sculley, 2010): en cada iteración solo se usa un lote aleatorio de filas y cada centro
+    se mueve hacia la media de sus filas del lote con un paso 1 / (filas acumuladas del centro).
+    Los centros iniciales se eligen con k-means++ sobre una muestra.
+
+    Parameters:
+    - X (np.ndarray): matriz de features (ya estandarizada), de forma (n, d)
+    - n_clusters (int): número de clusters
+    - batch_size (int): filas por mini-lote
+    - max_iter (int): número máximo de mini-lotes
+    - tol (float): desplazamiento medio de los centros por debajo del cual se para
+    - seed (int): semilla
+
+    Returns:
+    - tuple: (centros (k, d), cluster de cada fila, distancia al cuadrado de cada fila a su centro)
+    """
+    n = len(X)
+    if n < n_clusters:
+        raise ValueError(f"Hay {n} hospitales, menos que clusters ({n_clusters})")
+
+    rng = np.random.default_rng(seed)
+
+    # k-means++ sobre una muestra
+    sample = X[rng.choice(n, size=min(n, max(10 * batch_size, 50 * n_clusters)), replace=False)]
+    centers = np.empty((n_clusters, X.shape[1]))
+    centers[0] = sample[rng.integers(len(sample))]
+    closest = squared_distances(sample, centers[:1])[:, 0]
+    for j in range(1, n_clusters):
+        probabilities = closest / closest.sum() if closest.sum() > 0 else None
+        centers[j] = sample[rng.choice(len(sample), p=probabilities)]
+        closest = np.minimum(closest, squared_distances(sample, centers[j:j + 1])[:, 0])
+
+    counts = np.zeros(n_clusters)
+    for _ in range(max_iter):
+        batch = X[rng.choice(n, size=min(batch_size, n), replace=False)]
+        labels = squared_distances(batch, centers).argmin(axis=1)
+
+        batch_counts = np.bincount(labels, minlength=n_clusters).astype(float)
+        batch_sums = np.zeros_like(centers)
+        np.add.at(batch_sums, labels, batch)
+
+        counts += batch_counts
+        updated = batch_counts > 0
+        previous = centers.copy()
+        centers[updated] += (batch_sums[updated] - batch_counts[updated, None] * centers[updated]) / counts[updated, None]
+
+        if np.sqrt(((centers - previous) ** 2).sum(axis=1)).mean() < tol:
+            break
+
+    labels, distances = assign_clusters(X, centers)
+
+    return centers, labels, distances
+
+def cluster_hospitals(features: pd.DataFrame, n_clusters: int = 8, columns: list = None, batch_size: int = 1024,
+                      max_iter: int = 200, seed: int = 0, save: bool = True) -> pd.DataFrame:
+    """
+    Agrupa los hospitales por su perfil con k-means por mini-lotes sobre las features estandarizadas
+
+    Parameters:
+    - features (pd.DataFrame): salida de extract_all_profile_features
+    - n_clusters (int): número de clusters
+    - columns (list): features a usar (por defecto PROFILE_FEATURES)
+    - batch_size (int): filas por mini-lote
+    - max_iter (int): número máximo de mini-lotes
+    - seed (int): semilla
+    - save (bool): guarda el cluster de cada hospital en el registro de hospitales (columna 'cluster')
+
+    Returns:
+    - pd.DataFrame: ['dataset', 'hospital', 'cluster', 'distance']
+    """
+    columns = columns or PROFILE_FEATURES
+    X = features[columns].to_numpy(dtype=float)
+
+    # Los hospitales sin admisiones tienen perfiles NaN: se colocan en la media de cada feature
+    mean = np.nanmean(X, axis=0)
+    std = np.nanstd(X, axis=0)
+    std[~(std > 0)] = 1.0
+    X = np.where(np.isnan(X), mean, X)
+    X = (X - mean) / std
+
+    _, labels, distances = minibatch_kmeans(X, n_clusters, batch_size, max_iter, seed=seed)
+
+    assignments = features[['dataset', 'hospital']].copy()
+    assignments['cluster'] = labels
+    assignments['distance'] = np.sqrt(distances)
+
+    print(f"Se han agrupado {len(assignments)} hospitales en {n_clusters} clusters")
+    if save:
+        save_cluster_assignments(assignments)
+
+    return assignments
+
+def save_cluster_assignments(assignments: pd.DataFrame, column: str = 'cluster') -> None:
+    """
+    Guarda el cluster de cada hospital como metadato del registro global. El hospital debe ser ya
+    el identificador entero del registro (asignado en la limpieza con encode_hospitals).
+
+    Parameters:
+    - assignments (pd.DataFrame): salida de cluster_hospitals
+    - column (str): nombre de la columna de metadatos
+    """
+    if not pd.api.types.is_integer_dtype(assignments['hospital']):
+        datasets = assignments.loc[assignments['hospital'].map(type) == str, 'dataset'].unique().tolist()
+        raise ValueError(f"Los hospitales de {datasets} no son identificadores del registro: vuelve a ejecutar la limpieza")
+
+    update_hospital_metadata(assignments['hospital'].to_numpy(), {column: assignments['cluster'].to_numpy()})
@@ -0,0 +1,309 @@
+import pandas as pd
+import numpy as np
+from utils.backtesting_utils import prepare_hospital_arrays
+from utils.rollup_utils import native_resolution
+
+# Familias de conteo soportadas (la binomial negativa es la NB2: Var = mu + alpha mu^2)
+COUNT_FAMILIES = ['poisson', 'negbin']
+
+# Columnas de aggregate_data que entran en el modelo como log(1 + x)
+LAG_COLUMNS = ['lag_7', 'lag_14', 'rolling_7', 'rolling_14']
+
+DEFAULT_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+# Tamaño máximo (en bytes) de la matriz de diseño de cada lote de hospitales en el IRLS
+MAX_BATCH_BYTES = 256 * 1024 ** 2
+
+def calendar_arrays(times: np.ndarray) -> tuple:
+    """
+    Calcula día de la semana, estación y hora de un array de fechas, con los mismos cortes que aggregate_data
+
+    Parameters:
+    - times (np.ndarray): fechas datetime64 en hora local (sin zona horaria)
+
+    Returns:
+    - tuple: (día de la semana 0-6, estación 1-4, hora 0-23) como arrays enteros
+    """
+    times = np.asarray(times, dtype='datetime64[ns]')
+    days = times.astype('datetime64[D]')
+
+    # El 1970-01-01 fue jueves
+    day_of_week = (days.astype(np.int64) + 3) % 7
+    hour = (times - days).astype('timedelta64[h]').astype(np.int64)
+
+    months = days.astype('datetime64[M]')
+    md = (months.astype(np.int64) % 12 + 1) * 100 + (days - months).astype(np.int64) + 1
+    season = np.select([(md >= 321) & (md <= 620), (md >= 621) & (md <= 922), (md >= 923) & (md <= 1220)], [1, 2, 3], 4)
+
+    return day_of_week, season, hour
+
+def count_design_matrix(day_of_week: np.ndarray, season: np.ndarray, hour: np.ndarray, lags: np.ndarray,
+                        hourly: bool) -> np.ndarray:
+    """
+    Construye la matriz de diseño del GLM: intercepto, dummies de día de la semana y estación (y de hora en
+    series horarias o por minuto) y log(1 + x) de los lags y medias móviles. is_weekend no se incluye porque
+    es combinación lineal de las dummies de día de la semana. Las columnas de LAG_COLUMNS van al final.
+
+    Parameters:
+    - day_of_week (np.ndarray): día de la semana (0-6)
+    - season (np.ndarray): estación (1-4)
+    - hour (np.ndarray): hora (0-23)
+    - lags (np.ndarray): valores de LAG_COLUMNS, de forma (n, 4)
+    - hourly (bool): añade las dummies de hora
+
+    Returns:
+    - np.ndarray: matriz de diseño de forma (n, p)
+    """
+    blocks = [np.ones((len(day_of_week), 1)),
+              day_of_week[:, None] == np.arange(1, 7),
+              season[:, None] == np.arange(2, 5)]
+    if hourly:
+        blocks.append(hour[:, None] == np.arange(1, 24))
+    blocks.append(np.log1p(np.maximum(lags, 0)))
+
+    return np.hstack(blocks).astype(np.float64)
+
+def irls_batch(X: np.ndarray, y: np.ndarray, mask: np.ndarray, alpha: np.ndarray, beta: np.ndarray = None,
+               max_iter: int = 25, tol: float = 1e-6, ridge: float = 1e-4) -> np.ndarray:
+    """
+    IRLS con enlace logarítmico para un lote de hospitales a la vez. Cada hospital es un bloque independiente
+    del sistema diagonal por bloques: en cada iteración se forman las matrices X'WX de todos los hospitales
+    con un único producto matricial por lotes y se resuelven juntas con np.linalg.solve.
+
+    Parameters:
+    - X (np.ndarray): matrices de diseño rellenadas hasta la serie más larga del lote, de forma (B, T, p)
+    - y (np.ndarray): admisiones, de forma (B, T)
+    - mask (np.ndarray): filas válidas (las de relleno y las que tienen lags NaN no cuentan), de forma (B, T)
+    - alpha (np.ndarray): dispersión de cada hospital (0 para Poisson), de forma (B,)
+    - beta (np.ndarray): coeficientes iniciales (por defecto se inicializa desde los datos)
+    - max_iter (int): número máximo de iteraciones
+    - tol (float): cambio máximo de los coeficientes para considerar la convergencia
+    - ridge (float): penalización L2 que mantiene resolubles los bloques con columnas vacías
+
+    Returns:
+    - np.ndarray: coeficientes de forma (B, p)
+    """
+    B, T, p = X.shape
+    penalty = ridge * np.eye(p)
+    alpha = alpha[:, None]
+
+    if beta is None:
+        # Arranque estándar de los GLM: mu inicial entre la observación y la media del hospital
+        counts = np.maximum(mask.sum(axis=1, keepdims=True), 1)
+        mean = (y * mask).sum(axis=1, keepdims=True) / counts
+        mu = (y + mean) / 2 + 0.1
+        eta = np.log(mu)
+    else:
+        eta = np.einsum('btp,bp->bt', X, beta)
+        mu = np.exp(eta)
+
+    for _ in range(max_iter):
+        w = mu / (1 + alpha * mu) * mask
+        z = eta + (y - mu) / mu
+
+        Xw = X * w[:, :, None]
+        A = np.matmul(Xw.transpose(0, 2, 1), X) + penalty
+        b = np.einsum('btp,bt->bp', Xw, z)
+        new_beta = np.linalg.solve(A, b[:, :, None])[:, :, 0]
+
+        converged = beta is not None and np.abs(new_beta - beta).max() < tol
+        beta = new_beta
+        eta = np.clip(np.einsum('btp,bp->bt', X, beta), -30, 30)
+        mu = np.exp(eta)
+        if converged:
+            break
+
+    return beta
+
+def fit_count_glm(X: np.ndarray, y: np.ndarray, offsets: np.ndarray, family: str = 'poisson', max_iter: int = 25,
+                  tol: float = 1e-6, ridge: float = 1e-4, max_batch_bytes: int = MAX_BATCH_BYTES) -> tuple:
+    """
+    Ajusta un GLM Poisson o binomial negativo por hospital sobre los arrays apilados de todos los hospitales
+    (formato de prepare_hospital_arrays). Los hospitales se procesan en lotes cuya matriz rellenada ocupa como
+    mucho max_batch_bytes. En la binomial negativa la dispersión se estima por momentos
+    (regresión de (y - mu)^2 - y sobre mu^2) a partir del ajuste Poisson y se vuelve a ajustar con esos pesos.
+
+    Parameters:
+    - X (np.ndarray): matriz de diseño de todas las filas, de forma (n, p)
+    - y (np.ndarray): admisiones de todas las filas
+    - offsets (np.ndarray): límites de las filas de cada hospital
+    - family (str): 'poisson' o 'negbin'
+    - max_iter (int): iteraciones máximas del IRLS
+    - tol (float): tolerancia de convergencia de los coeficientes
+    - ridge (float): penalización L2
+    - max_batch_bytes (int): tamaño máximo de la matriz de diseño de cada lote
+
+    Returns:
+    - tuple: (coeficientes de forma (H, p), dispersión de forma (H,)); los hospitales sin filas válidas tienen NaN
+    """
+    if family not in COUNT_FAMILIES:
+        raise ValueError(f"Familia no soportada: {family}")
+
+    n_hospitals = len(offsets) - 1
+    p = X.shape[1]
+    lengths = np.diff(offsets)
+    valid = np.isfinite(X).all(axis=1) & np.isfinite(y)
+    X = np.where(valid[:, None], X, 0.0)
+    y = np.where(valid, y, 0.0)
+
+    betas = np.full((n_hospitals, p), np.nan)
+    alphas = np.zeros(n_hospitals)
+
+    start = 0
+    while start < n_hospitals:
+        # Se añaden hospitales al lote mientras la matriz rellenada (B, T, p) quepa en el presupuesto
+        end = start + 1
+        while end < n_hospitals and (end + 1 - start) * lengths[start:end + 1].max() * p * 8 <= max_batch_bytes:
+            end += 1
+
+        T = max(int(lengths[start:end].max()), 1)
+        positions = offsets[start:end, None] + np.arange(T)
+        padded = np.arange(T) < lengths[start:end, None]
+        positions = np.where(padded, positions, 0)
+
+        Xb = X[positions] * padded[:, :, None]
+        yb = y[positions] * padded
+        mask = valid[positions] & padded
+
+        alpha = np.zeros(end - start)
+        beta = irls_batch(Xb, yb, mask, alpha, max_iter=max_iter, tol=tol, ridge=ridge)
+
+        if family == 'negbin':
+            for _ in range(2):
+                mu = np.exp(np.clip(np.einsum('btp,bp->bt', Xb, beta), -30, 30))
+                numerator = (((yb - mu) ** 2 - yb) * mask).sum(axis=1)
+                denominator = ((mu ** 2) * mask).sum(axis=1)
+                alpha = np.maximum(numerator / np.maximum(denominator, 1e-12), 1e-8)
+                beta = irls_batch(Xb, yb, mask, alpha, beta, max_iter=max_iter, tol=tol, ridge=ridge)
+
+        has_rows = mask.any(axis=1)
+        betas[start:end][has_rows] = beta[has_rows]
+        alphas[start:end] = alpha
+
+        start = end
+
+    return betas, alphas
+
+def fit_count_models(df: pd.DataFrame, family: str = 'poisson', **kwargs) -> dict:
+    """
+    Ajusta el GLM de conteo de todos los hospitales de un DataFrame procesado con las features de calendario
+    y de lags de aggregate_data, en una única llamada vectorizada
+
+    Parameters:
+    - df (pd.DataFrame): DataFrame procesado (salida de aggregate_data)
+    - family (str): 'poisson' o 'negbin'
+    - kwargs: parámetros de fit_count_glm
+
+    Returns:
+    - dict: modelos de todos los hospitales (coeficientes, dispersión y el estado necesario para predecir)
+    """
+    time_col = 'datetime' if 'datetime' in df.columns else 'date'
+    missing = [col for col in ['day_of_week', 'season'] + LAG_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"Faltan las columnas de aggregate_data: {missing}")
+
+    resolution = native_resolution(df[time_col])
+    hourly = resolution != 'day'
+    tz = df[time_col].dt.tz
+
+    hospitals, offsets, times, y, X = prepare_hospital_arrays(df, ['day_of_week', 'season'] + LAG_COLUMNS)
+
+    # Las horas (y los días en las series con zona horaria) se calculan en hora local, igual que aggregate_data
+    local_times = pd.DatetimeIndex(times).tz_localize('UTC').tz_convert(tz).tz_localize(None).values if tz is not None else times
+    _, _, hour = calendar_arrays(local_times)
+
+    design = count_design_matrix(X[:, 0].astype(np.int64), X[:, 1].astype(np.int64), hour, X[:, 2:], hourly)
+    betas, alphas = fit_count_glm(design, y, offsets, family, **kwargs)
+
+    # Para la predicción recursiva basta con los últimos 14 periodos de cada hospital
+    last_rows = offsets[1:] - 1
+    history_positions = np.clip(last_rows[:, None] - np.arange(13, -1, -1), 0, None)
+    history = np.where(history_positions >= offsets[:-1, None], y[history_positions], np.nan)
+
+    print(f"Se han ajustado {len(hospitals)} modelos {family}")
+
+    return {
+        'hospitals': hospitals,
+        'family': family,
+        'beta': betas,
+        'alpha': alphas,
+        'hourly': hourly,
+        'resolution': resolution,
+        'time_col': time_col,
+        'tz': tz,
+        'last_times': local_times[last_rows],
+        'history': history
+    }
+
+def forecast_counts(models: dict, horizon: int = 24, quantiles: list = None, n_samples: int = 500,
+                    seed: int = 0) -> pd.DataFrame:
+    """
+    Predice los próximos 'horizon' periodos de todos los hospitales a la vez simulando trayectorias:
+    en cada paso las features de lags y medias móviles se calculan con los valores simulados de cada trayectoria,
+    así que los cuantiles incluyen la incertidumbre que se propaga por los lags
+
+    Parameters:
+    - models (dict): salida de fit_count_models
+    - horizon (int): número de periodos a predecir
+    - quantiles (list): cuantiles a devolver (por defecto DEFAULT_QUANTILES)
+    - n_samples (int): número de trayectorias simuladas por hospital
+    - seed (int): semilla
+
+    Returns:
+    - pd.DataFrame: una fila por hospital y periodo con el horizonte, la media y una columna por cuantil
+    """
+    quantiles = DEFAULT_QUANTILES if quantiles is None else quantiles
+    rng = np.random.default_rng(seed)
+
+    beta = models['beta']
+    alpha = models['alpha'][:, None]
+    n_lags = len(LAG_COLUMNS)
+    n_hospitals = len(models['hospitals'])
+
+    # Los hospitales sin modelo o con menos de 14 periodos de historia no se pueden predecir
+    usable = np.isfinite(beta).all(axis=1) & np.isfinite(models['history']).all(axis=1)
+    beta = np.where(usable[:, None], beta, 0.0)
+    history = np.repeat(np.nan_to_num(models['history'])[:, None, :], n_samples, axis=1)    # (H, S, 14)
+
+    step = np.timedelta64(1, {'day': 'D', 'hour': 'h', 'minute': 'm'}[models['resolution']]).astype('timedelta64[ns]')
+    last_times = np.asarray(models['last_times'], dtype='datetime64[ns]')
+
+    means = np.empty((horizon, n_hospitals))
+    values = np.empty((horizon, n_hospitals, len(quantiles)))
+    times = np.empty((horizon, n_hospitals), dtype='datetime64[ns]')
+
+    for k in range(horizon):
+        times[k] = last_times + step * (k + 1)
+        day_of_week, season, hour = calendar_arrays(times[k])
+        calendar = count_design_matrix(day_of_week, season, hour, np.zeros((n_hospitals, n_lags)), models['hourly'])
+        calendar_eta = np.einsum('hp,hp->h', calendar[:, :-n_lags], beta[:, :-n_lags])
+
+        lags = np.stack([history[:, :, -7], history[:, :, -14], history[:, :, -7:].mean(axis=2), history.mean(axis=2)], axis=2)
+        eta = calendar_eta[:, None] + np.einsum('hsk,hk->hs', np.log1p(lags), beta[:, -n_lags:])
+        mu = np.exp(np.clip(eta, -30, 30))
+
+        if models['family'] == 'negbin':
+            # Binomial negativa como mezcla gamma-Poisson
+            samples = rng.poisson(rng.gamma(1 / alpha, alpha * mu))
+        else:
+            samples = rng.poisson(mu)
+
+        means[k] = mu.mean(axis=1)
+        values[k] = np.quantile(samples, quantiles, axis=1).T
+        history = np.concatenate([history[:, :, 1:], samples[:, :, None]], axis=2)
+
+    means[:, ~usable] = np.nan
+    values[:, ~usable] = np.nan
+
+    result = pd.DataFrame({
+        'hospital': np.tile(np.asarray(models['hospitals'], dtype=object), horizon),
+        models['time_col']: times.ravel(),
+        'horizon': np.repeat(np.arange(1, horizon + 1), n_hospitals),
+        'mean': means.ravel()
+    })
+    if models['tz'] is not None:
+        result[models['time_col']] = result[models['time_col']].dt.tz_localize(models['tz'], ambiguous='NaT', nonexistent='NaT')
+    for j, q in enumerate(quantiles):
+        result[f'q_{q}'] = values[:, :, j].ravel()
+
+    return result.sort_values(['hospital', 'horizon']).reset_index(drop=True)
@@ -1,7 +1,26 @@
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 import glob
 import os
+import zipfile
+import fnmatch
+import queue
+import threading
+from contextlib import contextmanager
+from utils.instrumentation_utils import instrument_stage
+from utils.hospital_registry_utils import encode_hospitals
 
+# Extensiones de compresión de un solo fichero que pandas descomprime en streaming (.zst requiere zstandard)
+COMPRESSED_EXTENSIONS = ['gz', 'bz2', 'zst']
+
+# Separador entre el archivo .zip y el miembro a leer en las rutas devueltas por read_multi_file_paths
+ARCHIVE_MEMBER_SEP = '::'
+
+CLEAN_DATA_DIR = '../datasets/clean_datasets/'
+
+@instrument_stage
 def read_raw_data(format: str, file_path: str, options: dict, large_file: bool) -> pd.DataFrame:
     """
     Lee datos dado una ruta de archivo y un formato
@@ -17,30 +36,52 @@ def read_raw_data(format: str, file_path: str, options: dict, large_file: bool)
     """
 
     print(f"Leyendo archivo: {file_path}")
-    if large_file:
-        df= read_large_file(format, file_path, options)
+    with open_raw_input(file_path) as source:
+        if large_file:
+            df= read_large_file(format, source, options)
 
-    else:
-        if format == 'csv':
-            if options:
-                df = pd.read_csv(file_path, **options)
-            else:
-                df = pd.read_csv(file_path)
-        elif format == 'txt':
-            if options:
-                df = pd.read_csv(file_path, **options)
-            else:
-                df = pd.read_csv(file_path)
-        elif format in ['xls', 'xlsx']:
-            if options:
-                df = pd.read_excel(file_path, **options)
-            else:
-                df = pd.read_excel(file_path)
         else:
-            raise ValueError(f"Formato no soportado: {format}")
+            if format == 'csv':
+                if options:
+                    df = pd.read_csv(source, **options)
+                else:
+                    df = pd.read_csv(source)
+            elif format == 'txt':
+                if options:
+                    df = pd.read_csv(source, **options)
+                else:
+                    df = pd.read_csv(source)
+            elif format in ['xls', 'xlsx']:
+                if options:
+                    df = pd.read_excel(source, **options)
+                else:
+                    df = pd.read_excel(source)
+            else:
+                raise ValueError(f"Formato no soportado: {format}")
     
     return df
 
+@contextmanager
+def open_raw_input(file_path: str):
+    """
+    Abre una ruta devuelta por read_multi_file_paths. Los miembros de un .zip ('archivo.zip::miembro') se abren
+    como un flujo que se descomprime según se lee, sin extraerlos a disco. El resto de rutas (incluidas
+    .gz, .bz2 y .zst) se devuelven tal cual y pandas las descomprime en streaming al leerlas.
+
+    Parameters:
+    - file_path (str): ruta del archivo o del miembro del archivo comprimido
+
+    Returns:
+    - str o file-like: objeto que se puede pasar a pd.read_csv o pd.read_excel
+    """
+    if ARCHIVE_MEMBER_SEP not in file_path:
+        yield file_path
+        return
+
+    archive_path, member = file_path.split(ARCHIVE_MEMBER_SEP, 1)
+    with zipfile.ZipFile(archive_path) as archive, archive.open(member) as source:
+        yield source
+
 def read_large_file(format: str, file_path: str, options: dict) -> pd.DataFrame:
     """
     Lee archivos grandes en chunks y los concatena
@@ -66,40 +107,166 @@ def read_large_file(format: str, file_path: str, options: dict) -> pd.DataFrame:
 
 
 def read_multi_file_paths(format: str, name: str) -> list:
+    """
+    Busca los archivos de un dataset en ../datasets/raw_datasets/: archivos planos '*{name}*.{format}',
+    comprimidos '*{name}*.{format}.gz|bz2|zst' y miembros '.{format}' de archivos .zip. De un .zip se toman
+    todos sus miembros del formato si el nombre del .zip coincide con el patrón, o solo los miembros cuyo
+    nombre coincide en caso contrario.
+
+    Parameters:
+    - format (str): formato del archivo.
+    - name (str): nombre del dataset.
+
+    Returns:
+    - list: rutas de los archivos; los miembros de un .zip se devuelven como 'archivo.zip::miembro'
+    """
     ruta_entrada = f'../datasets/raw_datasets/*{name}*.{format}'
 
     matching_files = glob.glob(ruta_entrada)
+    for extension in COMPRESSED_EXTENSIONS:
+        matching_files += glob.glob(f'{ruta_entrada}.{extension}')
+
+    # Solo se lee el índice del .zip, sin descomprimir los miembros
+    for archive_path in sorted(glob.glob('../datasets/raw_datasets/*.zip')):
+        archive_matches = fnmatch.fnmatch(os.path.basename(archive_path), f'*{name}*.zip')
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.namelist():
+                member_name = os.path.basename(member)
+                if not member_name.endswith(f'.{format}'):
+                    continue
+                if archive_matches or fnmatch.fnmatch(member_name, f'*{name}*.{format}'):
+                    matching_files.append(f'{archive_path}{ARCHIVE_MEMBER_SEP}{member}')
 
     if not matching_files:
         raise FileNotFoundError(f"No se encontraron archivos para el patrón: {ruta_entrada}")
     
     return matching_files
 
-def save_clean_data(df: pd.DataFrame, name: str) -> None:
+def prefetch_iter(iterable, buffer_size: int = 1):
+    """
+    Recorre un iterable en un hilo en segundo plano, dejando preparados como máximo buffer_size elementos
+    mientras se procesa el actual. Cuando la cola está llena el hilo se bloquea (backpressure), así que en
+    memoria hay como mucho buffer_size + 2 elementos: el que se procesa, los de la cola y el que se está leyendo.
+    Sirve tanto para archivos completos como para los chunks de pd.read_csv(chunksize=...).
+
+    Parameters:
+    - iterable: iterable a recorrer (la lectura se hace en el hilo)
+    - buffer_size (int): número de elementos que se pueden adelantar (1 = doble buffer)
+
+    Returns:
+    - generator: los mismos elementos, en el mismo orden
+    """
+    buffer = queue.Queue(maxsize=buffer_size)
+    stop = threading.Event()
+    fin = object()
+
+    def put(item) -> bool:
+        # Se reintenta con timeout para que el hilo termine si el consumidor deja de leer
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producer():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((None, e))
+            return
+        put((fin, None))
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is fin:
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+def prefetch_raw_data(format: str, paths: list, options: dict, large_file: bool, buffer_size: int = 1):
+    """
+    Lee los archivos de un dataset con read_raw_data adelantando la lectura del siguiente archivo
+    en segundo plano mientras se procesa el actual
+
+    Parameters:
+    - format (str): formato del archivo.
+    - paths (list): rutas devueltas por read_multi_file_paths
+    - options (dict): Diccionario con las opciones de lectura
+    - large_file (bool): Indica si el archivo es grande
+    - buffer_size (int): número de archivos leídos por adelantado
+
+    Returns:
+    - generator: tuplas (ruta, DataFrame) en el orden de paths
+    """
+    return prefetch_iter(((path, read_raw_data(format, path, options, large_file)) for path in paths), buffer_size)
+
+@instrument_stage
+def save_clean_data(df: pd.DataFrame, name: str, append: bool = False) -> None:
     """
         Guarda un DataFrame en un archivo parquet
 
         Parameters:
-        - df (pd.DataFrame): formato del archivo.
+        - df (pd.DataFrame o pa.Table): formato del archivo.
         - name (str): nombre del archivo.
+        - append (bool): añade las filas a las del archivo existente (datasets con varias fuentes, p.ej. spain_data)
         Returns:
         - None
         """
     
-    ruta_salida = f'../datasets/clean_datasets/{name}.parquet'
+    ruta_salida = f'{CLEAN_DATA_DIR}{name}.parquet'
     
     try:
-        # Guardar el DataFrame como un archivo Parquet
-        df.to_parquet(
-            ruta_salida,
-            index=False,
-        )
+        if append and os.path.exists(ruta_salida):
+            df_nuevo = df.to_pandas() if isinstance(df, pa.Table) else df
+            df = pd.concat([pd.read_parquet(ruta_salida), df_nuevo], ignore_index=True).drop_duplicates()
+
+        # Guardar el DataFrame como un archivo Parquet (las tablas Arrow del pool se escriben sin pasar por pandas)
+        if isinstance(df, pa.Table):
+            pq.write_table(df, ruta_salida)
+        else:
+            df.to_parquet(
+                ruta_salida,
+                index=False,
+            )
 
         print(f"Archivo guardado exitosamente en: {ruta_salida}")
         
     except Exception as e:
         print(f"Error al guardar el archivo '{name}': {e}")
 
+def save_clean_source(df, final_name: str, source: str, append: bool = False):
+    """
+    Sustituye la clave nativa del hospital por su identificador del registro y guarda las filas de una fuente.
+    Se codifican solo las filas que ha producido la fuente, antes de unirlas con las que ya tenga el dataset
+    final, de forma que los identificadores de otras fuentes nunca se registran como claves nativas.
+
+    Parameters:
+    - df (pd.DataFrame o pa.Table): filas de la fuente devueltas por process_*
+    - final_name (str): nombre del dataset final (p.ej. 'spain_data')
+    - source (str): fuente del registro de hospitales (p.ej. 'esp_castilla_y_leon', 'mexico')
+    - append (bool): añade las filas al dataset final en lugar de sobrescribirlo
+
+    Returns:
+    - pd.DataFrame o pa.Table: filas de la fuente ya codificadas
+    """
+    df = encode_hospitals(df, source)
+    save_clean_data(df, final_name, append=append)
+
+    return df
+
+@instrument_stage
 def process_australia(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de Australia
@@ -110,71 +277,29 @@ def process_australia(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
     - pd.DataFrame: DataFrame procesado
     """
-    columns = df.columns.to_list()
-    new_columns = []
-    last_hospital = None
-
-    for col in columns:
-        # Si las columnas no son tuplas aún, crea las tuplas desde filas 0 y 1
-        if not isinstance(col, tuple):
-            raise ValueError("Las columnas deben tener dos niveles (usa header=[0,1] al leer el CSV)")
-            
-        hospital, campo = col  # hospital name (o 'Unnamed'), campo (como 'Tri_1')
-
-        # Si hospital no es Unnamed, lo recordamos
-        if not str(hospital).startswith("Unnamed"):
-            last_hospital = hospital
-
-        # Usamos el último hospital válido
-        new_columns.append(f"{last_hospital}_{campo}" if campo != "Date" else "Date")
-
-    # Asignar los nuevos nombres de columna
-    df.columns = new_columns
-
-    hospitales = set()
-    for col in df.columns:
-        if col != "Date":
-            partes = col.split("_")
-            hospital = "_".join(partes[:-1])  
-            hospitales.add(hospital)
-
-    # Filtro para quedarte solo con los nombres correctos
-    hospitales = sorted([
-                h for h in hospitales 
-                if not h.endswith("_Tri")
-            ])
-    
-    # Se crea un diccionario de DataFrames por hospital
-    dfs_por_hospital = {}
+    if not isinstance(df.columns, pd.MultiIndex) or df.columns.nlevels != 2:
+        raise ValueError("Las columnas deben tener dos niveles (usa header=[0,1] al leer el CSV)")
 
-    for hospital in hospitales:
-        cols_hospital = [col for col in df.columns if col.startswith(hospital + "_")]
-        df_hospital = df[["Date"] + cols_hospital].copy()
-        
-        new_names = {
-                col: col.replace(hospital + "_", "") for col in cols_hospital
-            }
-        df_hospital = df_hospital.rename(columns=new_names)
-                
-        # Se agrega la columna de hospital
-        df_hospital["Hospital"] = hospital
-                
-        dfs_por_hospital[hospital] = df_hospital
-
-    # Se concatenan todos los DataFrames verticalmente
-    df_final = pd.concat(dfs_por_hospital.values(), ignore_index=True)
-    columnas_deseadas = ['Date', 'Admissions', 'Hospital']
-    df_filtrado = df_final[columnas_deseadas]
-
-    df_filtrado = df_filtrado.rename(columns={
-    'Date': 'date',
-    'Admissions': 'admissions',
-    'Hospital': 'hospital'
-    })
+    # El nombre del hospital solo aparece en la primera columna de su bloque: se rellena hacia adelante
+    hospitales = df.columns.get_level_values(0).to_series(index=range(df.shape[1])).astype(str)
+    hospitales = hospitales.mask(hospitales.str.startswith("Unnamed")).ffill()
+    campos = df.columns.get_level_values(1)
+
+    fechas = df.iloc[:, campos.tolist().index("Date")].to_numpy()
+
+    # Se seleccionan las columnas de admisiones de cada hospital ordenadas por nombre de hospital
+    posiciones = hospitales[(campos == "Admissions") & hospitales.notna()].sort_values(kind="stable").index.to_list()
+    df_admisiones = df.iloc[:, posiciones].set_axis(hospitales[posiciones].to_list(), axis=1)
+
+    # Un único melt construye el formato largo (hospital a hospital) en una sola reserva de memoria
+    df_filtrado = df_admisiones.melt(var_name="hospital", value_name="admissions")
+    df_filtrado.insert(0, "date", np.tile(fechas, len(posiciones)))
+    df_filtrado.insert(1, "admissions", df_filtrado.pop("admissions"))
 
     print(f"DataFrame procesado con {len(df_filtrado)} filas y {len(df_filtrado.columns)} columnas.")
     return df_filtrado
 
+@instrument_stage
 def process_cardiff(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de Cardiff
@@ -193,6 +318,7 @@ def process_cardiff(df: pd.DataFrame) -> pd.DataFrame:
     
     return df
 
+@instrument_stage
 def process_chile(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de Chile
@@ -203,28 +329,35 @@ def process_chile(df: pd.DataFrame) -> pd.DataFrame:
     - pd.DataFrame: DataFrame procesado
     """
 
-    # Se convierte la columna fecha a tipo datetime
-    df['fecha'] = pd.to_datetime(df['fecha'], dayfirst=True, errors='coerce')
+    # Las fechas solo se parsean una vez por valor distinto y se sustituyen por el código de la fecha parseada
+    # (-1 para fechas nulas o no válidas, que el groupby original descartaba)
+    fecha_codes, fechas = pd.factorize(df['fecha'])
+    fechas = pd.to_datetime(pd.Series(fechas, dtype=object), dayfirst=True, errors='coerce')
+    date_codes, dates = pd.factorize(fechas)
+    fecha_codes = np.append(date_codes, -1)[fecha_codes]
 
-    # Se crea una nueva columna que concatena ID y nombre
-    df['Establecimiento'] = df['IdEstablecimiento'].astype(str) + " - " + df['NEstablecimiento'].astype(str)
+    # Se agrupa por el id numérico del establecimiento y el código de fecha, sin construir cadenas por fila
+    df_agrupado = df['Total'].groupby([df['IdEstablecimiento'], fecha_codes]).sum()
+    df_agrupado = df_agrupado[df_agrupado.index.get_level_values(1) >= 0]
 
-    # Agrupar por Establecimiento y fecha, y sumar el total
-    df_agrupado = df.groupby(['Establecimiento', 'fecha'])['Total'].sum().reset_index()
+    # El hospital se identifica por su IdEstablecimiento (clave del registro) y el nombre se guarda aparte
+    nombres = df.drop_duplicates('IdEstablecimiento', keep='last').set_index('IdEstablecimiento')['NEstablecimiento']
+    ids = df_agrupado.index.get_level_values(0)
 
-    # Se ordena el resultado
-    df_agrupado = df_agrupado.sort_values(by=['Establecimiento', 'fecha'])
-
-    df_agrupado = df_agrupado.rename(columns={
-    'fecha': 'date',
-    'Total': 'admissions',
-    'Establecimiento': 'hospital'
+    df_ordenado = pd.DataFrame({
+        'date': dates[df_agrupado.index.get_level_values(1)],
+        'admissions': df_agrupado.to_numpy(),
+        'hospital': ids.astype(str),
+        'hospital_name': nombres.reindex(ids).astype(str).to_numpy()
     })
-    df_ordenado = df_agrupado[['date', 'admissions', 'hospital']]
+
+    # Se ordena el resultado
+    df_ordenado = df_ordenado.sort_values(by=['hospital', 'date']).reset_index(drop=True)
 
     print(f"DataFrame procesado con {len(df_ordenado)} filas y {len(df_ordenado.columns)} columnas.")
     return df_ordenado
 
+@instrument_stage
 def process_colombia(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de Colombia
@@ -260,6 +393,7 @@ def process_colombia(df: pd.DataFrame) -> pd.DataFrame:
 
     return df_ordenado
 
+@instrument_stage
 def process_col_betania(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de Betania
@@ -278,6 +412,7 @@ def process_col_betania(df: pd.DataFrame) -> pd.DataFrame:
     
     return df_ordenado
 
+@instrument_stage
 def process_esp_canarias(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de Canarias
@@ -287,7 +422,14 @@ def process_esp_canarias(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
     - pd.DataFrame: DataFrame procesado
     """
-    df_agrupado = df.groupby(['fecha', 'codigo'])['valor'].sum().reset_index()
+    # Se parsea cada fecha distinta una sola vez y se agrupa por el código numérico del hospital y el código de fecha
+    fecha_codes, fechas = pd.factorize(df['fecha'])
+    fechas = pd.to_datetime(pd.Series(fechas, dtype=object), dayfirst=True, errors='coerce')
+    date_codes, dates = pd.factorize(fechas)
+    fecha_codes = np.append(date_codes, -1)[fecha_codes]
+
+    df_agrupado = df['valor'].groupby([df['codigo'], fecha_codes]).sum()
+    df_agrupado = df_agrupado[df_agrupado.index.get_level_values(1) >= 0]
   
     diccionario_hospitales = {
     '380201': 'Hospital Quironsalud Vida',
@@ -334,21 +476,23 @@ def process_esp_canarias(df: pd.DataFrame) -> pd.DataFrame:
     '350402': 'Hospital Polivalente Anexo Juan Carlos I'
     }
 
-    df_agrupado['codigo'] = df_agrupado['codigo'].astype(str).str.strip()
-    df_agrupado['hospital'] = df_agrupado['codigo'].map(diccionario_hospitales).fillna(df_agrupado['codigo'])
-    
-    df_agrupado = df_agrupado.rename(columns={
-        'fecha': 'date',
-        'valor': 'admissions'
+    # Los nombres solo se resuelven para los códigos distintos y se asignan al resultado agregado
+    codigos = df_agrupado.index.get_level_values(0)
+    hospital_codes, codigos_unicos = pd.factorize(codigos)
+    codigos_unicos = pd.Series(codigos_unicos).astype(str).str.strip()
+    nombres = codigos_unicos.map(diccionario_hospitales).fillna(codigos_unicos).to_numpy()
+
+    # El código es la clave del registro y el nombre se guarda aparte
+    df_ordenado = pd.DataFrame({
+        'date': dates[df_agrupado.index.get_level_values(1)],
+        'admissions': df_agrupado.to_numpy(),
+        'hospital': codigos_unicos.to_numpy()[hospital_codes],
+        'hospital_name': nombres[hospital_codes]
     })
-    df_ordenado = df_agrupado[['date', 'admissions', 'hospital']].copy()
-
 
-    df_ordenado['date'] = pd.to_datetime(df_ordenado['date'], dayfirst=True, errors='coerce')
-    df_ordenado['date'] = df_ordenado['date'].dt.strftime('%Y-%m-%d')
-                        
     return df_ordenado
 
+@instrument_stage
 def process_esp_castilla_y_leon(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de Castilla y León
@@ -365,15 +509,14 @@ def process_esp_castilla_y_leon(df: pd.DataFrame) -> pd.DataFrame:
         'Hospital': 'hospital'
     })
     df_ordenado = df_agrupado[['date', 'admissions', 'hospital']].copy() 
-  
-    #Se lee el archivo del path destino y se hace el merge, debido a que existen dos fuentes de datos de españa
-    target_path = f'../datasets/clean_datasets/spain_data.parquet'
-    df_target = pd.read_parquet(target_path)
-    
-    df_final = pd.concat([df_target, df_ordenado], ignore_index=True).drop_duplicates()
 
-    return df_final
+    # Se parsean las fechas sobre el resultado agregado para que coincidan con las de Canarias (datetime64)
+    df_ordenado['date'] = pd.to_datetime(df_ordenado['date'], errors='coerce')
 
+    # Solo se devuelven las filas de esta fuente: el notebook las codifica y las añade a spain_data (save_clean_data con append)
+    return df_ordenado
+
+@instrument_stage
 def process_iowa(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de Iowa
@@ -409,18 +552,43 @@ def process_iowa(df: pd.DataFrame) -> pd.DataFrame:
     df_filtrado = df_filtrado.drop(columns=['year-hour'])
 
     df_filtrado = df_filtrado.dropna(subset=['hour'])
-    df_filtrado = df_filtrado.melt(id_vars=['year', 'hour'], var_name='month_day', value_name='value')
 
-    df_filtrado['month_day_clean'] = df_filtrado['month_day'].str.replace('.', ' ', regex=False)
+    columnas_dias = [col for col in df_filtrado.columns if col not in ('year', 'hour')]
+    n_filas, n_dias = len(df_filtrado), len(columnas_dias)
+
+    # Cada etiqueta de día ('Jan.1') y de hora ('1 PM') se interpreta una sola vez
+    etiquetas_dias = pd.Series(columnas_dias, dtype=str).str.replace('.', ' ', regex=False)
+    fechas_ref = pd.to_datetime('2000 ' + etiquetas_dias, format='%Y %b %d', errors='coerce')
+    dia_valido = fechas_ref.notna().to_numpy()
+    meses = np.where(dia_valido, fechas_ref.dt.month, 1).astype(int)
+    dias = np.where(dia_valido, fechas_ref.dt.day, 1).astype(int)
+
+    codigos_hora, horas_unicas = pd.factorize(df_filtrado['hour'])
+    horas = pd.to_datetime(pd.Series(horas_unicas, dtype=str), format='%I %p', errors='coerce')
+    offsets_hora = (horas - pd.Timestamp('1900-01-01')).to_numpy()
+
+    codigos_anio, anios_unicos = pd.factorize(df_filtrado['year'])
+    anios = np.asarray(anios_unicos, dtype=int)
 
-    # Combina year, month_day_clean y hour en un string
-    datetime_str = df_filtrado['year'].astype(str) + ' ' + df_filtrado['month_day_clean'] + ' ' + df_filtrado['hour']
+    # Tabla (año x día) construida con aritmética de datetime64 en lugar de strptime por celda
+    inicio_mes = ((anios[:, None] - 1970) * 12 + (meses[None, :] - 1)).astype('datetime64[M]')
+    tabla = inicio_mes.astype('datetime64[D]') + (dias[None, :] - 1)
 
-    # Convierte el string a datetime
-    df_filtrado['datetime'] = pd.to_datetime(datetime_str, format='%Y %b %d %I %p', errors='coerce')
+    # Las fechas inexistentes (p.ej. 29 de febrero en años no bisiestos) se desbordan al mes siguiente y se anulan
+    valido = dia_valido[None, :] & (tabla.astype('datetime64[M]') == inicio_mes)
+    tabla = np.where(valido, tabla.astype('datetime64[ns]'), np.datetime64('NaT', 'ns'))
 
+    # Fila adicional de NaT para las horas sin año (código -1 de factorize)
+    tabla = np.vstack([tabla, np.full((1, n_dias), np.datetime64('NaT', 'ns'))])
 
-    df_final = df_filtrado[['datetime', 'value']].copy()
+    # Mismo orden que melt: columna a columna
+    fechas = tabla[np.tile(codigos_anio, n_dias), np.repeat(np.arange(n_dias), n_filas)]
+    fechas = fechas + np.tile(offsets_hora[codigos_hora], n_dias)
+
+    df_final = pd.DataFrame({
+        'datetime': fechas,
+        'value': df_filtrado[columnas_dias].to_numpy().ravel('F')
+    })
     df_final['hospital'] = 'Iowa Hospital'
     df_final = df_final.rename(columns={
             'value': 'admissions'
@@ -429,6 +597,7 @@ def process_iowa(df: pd.DataFrame) -> pd.DataFrame:
     
     return df_ordenado
 
+@instrument_stage
 def process_iran(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de Iran
@@ -454,6 +623,7 @@ def process_iran(df: pd.DataFrame) -> pd.DataFrame:
     return df_ordenado
 
 
+@instrument_stage
 def process_mexico_2009(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de México de 2009
@@ -472,6 +642,7 @@ def process_mexico_2009(df: pd.DataFrame) -> pd.DataFrame:
 
     return df_ordenado
 
+@instrument_stage
 def process_mexico_2010(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de México de 2010
@@ -485,10 +656,11 @@ def process_mexico_2010(df: pd.DataFrame) -> pd.DataFrame:
     df_filtrado.columns = ["CLUES", "FECHAINGRESO", "HORA_INGRESO", "MINUTO_INGRESO"]
 
     df_filtrado= mexico_convert_date_hour_minute(df_filtrado)
-    df_final= generic_mexico_append(df_filtrado)
+    df_final= generic_mexico_aggregate(df_filtrado)
 
     return df_final
 
+@instrument_stage
 def process_mexico_2011(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de México de 2011
@@ -502,10 +674,11 @@ def process_mexico_2011(df: pd.DataFrame) -> pd.DataFrame:
     df_filtrado.columns = ["CLUES", "FECHAINGRESO", "HORA_INGRESO", "MINUTO_INGRESO"]
 
     df_filtrado= mexico_convert_date_hour_minute(df_filtrado)
-    df_final= generic_mexico_append(df_filtrado)
+    df_final= generic_mexico_aggregate(df_filtrado)
 
     return df_final
 
+@instrument_stage
 def process_mexico_2012(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de México de 2012
@@ -519,10 +692,11 @@ def process_mexico_2012(df: pd.DataFrame) -> pd.DataFrame:
     df_filtrado.columns = ["CLUES", "FECHAINGRESO", "HORA_INGRESO", "MINUTO_INGRESO"]
 
     df_filtrado= mexico_convert_date_hour_minute(df_filtrado)
-    df_final= generic_mexico_append(df_filtrado)
+    df_final= generic_mexico_aggregate(df_filtrado)
 
     return df_final
 
+@instrument_stage
 def process_mexico_2013(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de México de 2013
@@ -536,7 +710,7 @@ def process_mexico_2013(df: pd.DataFrame) -> pd.DataFrame:
     df_filtrado.columns = ["CLUES", "FECHAINGRESO", "HORA_INGRESO", "MINUTO_INGRESO"]
     
     df_filtrado= mexico_convert_date_hour_minute(df_filtrado)
-    df_final= generic_mexico_append(df_filtrado)
+    df_final= generic_mexico_aggregate(df_filtrado)
 
     # df_agrupado = df_filtrado.groupby(['hospital', 'date']).size().reset_index(name='admissions')
     # df_ordenado = df_agrupado[['date', 'admissions', 'hospital']]
@@ -549,6 +723,7 @@ def process_mexico_2013(df: pd.DataFrame) -> pd.DataFrame:
 
     return df_final
 
+@instrument_stage
 def process_mexico_2014(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de México de 2014
@@ -562,10 +737,11 @@ def process_mexico_2014(df: pd.DataFrame) -> pd.DataFrame:
     df_filtrado.columns = ["CLUES", "FECHAINGRESO", "HORA_INGRESO", "MINUTO_INGRESO"]
 
     df= mexico_convert_date_hour_minute(df_filtrado)
-    df_final= generic_mexico_append(df)
+    df_final= generic_mexico_aggregate(df)
 
     return df_final
 
+@instrument_stage
 def process_mexico_2015(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de México de 2015
@@ -578,10 +754,11 @@ def process_mexico_2015(df: pd.DataFrame) -> pd.DataFrame:
     df.columns = ["CLUES", "FECHAINGRESO", "HORA_INGRESO", "MINUTO_INGRESO"]
 
     df= mexico_convert_date_hour_minute(df)
-    df_final= generic_mexico_append(df)
+    df_final= generic_mexico_aggregate(df)
 
     return df_final
 
+@instrument_stage
 def process_mexico_2016(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de México de 2016
@@ -594,10 +771,11 @@ def process_mexico_2016(df: pd.DataFrame) -> pd.DataFrame:
     df.columns = ["CLUES", "FECHAINGRESO", "HORA_INGRESO", "MINUTO_INGRESO"]
 
     df= mexico_convert_date_hour_minute(df)
-    df_final= generic_mexico_append(df)
+    df_final= generic_mexico_aggregate(df)
 
     return df_final
 
+@instrument_stage
 def process_mexico_2017(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de México de 2017
@@ -610,10 +788,11 @@ def process_mexico_2017(df: pd.DataFrame) -> pd.DataFrame:
     df.columns = ["CLUES", "FECHAINGRESO", "HORA_INGRESO", "MINUTO_INGRESO"]
 
     df= mexico_convert_date_hour_minute(df)
-    df_final= generic_mexico_append(df)
+    df_final= generic_mexico_aggregate(df)
 
     return df_final
 
+@instrument_stage
 def process_mexico_2018(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de México de 2018
@@ -626,10 +805,11 @@ def process_mexico_2018(df: pd.DataFrame) -> pd.DataFrame:
     df.columns = ["CLUES", "FECHAINGRESO", "HORA_INGRESO", "MINUTO_INGRESO"]
 
     df= mexico_convert_date_hour_minute(df)
-    df_final= generic_mexico_append(df)
+    df_final= generic_mexico_aggregate(df)
 
     return df_final
 
+@instrument_stage
 def process_mexico_2019(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de México de 2019
@@ -642,10 +822,11 @@ def process_mexico_2019(df: pd.DataFrame) -> pd.DataFrame:
     df.columns = ["CLUES", "FECHAINGRESO", "HORA_INGRESO", "MINUTO_INGRESO"]
     
     df= mexico_convert_date_hour_minute(df)
-    df_final= generic_mexico_append(df)
+    df_final= generic_mexico_aggregate(df)
 
     return df_final
 
+@instrument_stage
 def process_mexico_2020(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de México de 2020
@@ -658,10 +839,11 @@ def process_mexico_2020(df: pd.DataFrame) -> pd.DataFrame:
     df = df.rename(columns={"fechaingreso": "FECHAINGRESO", "hora_ingreso": "HORA_INGRESO"})
 
     df= mexico_convert_date_hour(df)
-    df_final= generic_mexico_append(df)
+    df_final= generic_mexico_aggregate(df)
 
     return df_final
 
+@instrument_stage
 def process_mexico_2021(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de México de 2021
@@ -672,10 +854,11 @@ def process_mexico_2021(df: pd.DataFrame) -> pd.DataFrame:
     - pd.DataFrame: DataFrame procesado
     """
     df= mexico_convert_date_hour(df)
-    df_final= generic_mexico_append(df)
+    df_final= generic_mexico_aggregate(df)
 
     return df_final
 
+@instrument_stage
 def process_mexico_2022(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de México de 2022
@@ -688,10 +871,11 @@ def process_mexico_2022(df: pd.DataFrame) -> pd.DataFrame:
     df = df.rename(columns={"fechaingreso": "FECHAINGRESO", "hora_ingreso": "HORA_INGRESO"})
 
     df= mexico_convert_date_hour(df)
-    df_final= generic_mexico_append(df)
+    df_final= generic_mexico_aggregate(df)
 
     return df_final
 
+@instrument_stage
 def process_mexico_2023(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de México de 2023
@@ -704,25 +888,20 @@ def process_mexico_2023(df: pd.DataFrame) -> pd.DataFrame:
     df = df.rename(columns={"fechaingreso": "FECHAINGRESO", "hora_ingreso": "HORA_INGRESO"})
 
     df= mexico_convert_date_hour(df)
-    df_final= generic_mexico_append(df)
+    df_final= generic_mexico_aggregate(df)
 
     return df_final
 
-def generic_mexico_append(df: pd.DataFrame) -> pd.DataFrame:
+def generic_mexico_aggregate(df: pd.DataFrame) -> pd.DataFrame:
 
     df_filtrado = df[["FECHAINGRESO", "CLUES"]]
     df_filtrado.columns = ["datetime", "hospital"]
 
     df_agrupado = df_filtrado.groupby(['hospital', 'datetime']).size().reset_index(name='admissions')
     df_ordenado = df_agrupado[['datetime', 'admissions', 'hospital']]
-  
-    #Se lee el archivo del path destino y se hace el merge, debido a que existen dos fuentes de datos de mexico
-    target_path = f'../datasets/clean_datasets/mexico_data.parquet'
-    df_target = pd.read_parquet(target_path)
-    
-    df_final = pd.concat([df_target, df_ordenado], ignore_index=True).drop_duplicates()
 
-    return df_final
+    # Solo se devuelven las filas de este año: el notebook las codifica y las añade a mexico_data (save_clean_data con append)
+    return df_ordenado
 
 def mexico_convert_date_hour_minute(df):
     df= df.copy()
@@ -744,6 +923,7 @@ def mexico_convert_date_hour(df):
     )
     return df
 
+@instrument_stage
 def process_pak_(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de Pakistan
@@ -763,6 +943,7 @@ def process_pak_(df: pd.DataFrame) -> pd.DataFrame:
 
     return df_final
 
+@instrument_stage
 def process_usa_(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de USA
@@ -782,6 +963,7 @@ def process_usa_(df: pd.DataFrame) -> pd.DataFrame:
 
     return df_ordenado
 
+@instrument_stage
 def process_nl_(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de Netherlands
@@ -801,6 +983,7 @@ def process_nl_(df: pd.DataFrame) -> pd.DataFrame:
 
     return df_final
 
+@instrument_stage
 def process_bwa_(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de Botswana
@@ -820,6 +1003,7 @@ def process_bwa_(df: pd.DataFrame) -> pd.DataFrame:
 
     return df_final
 
+@instrument_stage
 def process_aus_(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de Australia
@@ -837,14 +1021,10 @@ def process_aus_(df: pd.DataFrame) -> pd.DataFrame:
             })
     df_ordenado = df_final[['date', 'admissions', 'hospital']]
 
-    #Se lee el archivo del path destino y se hace el merge, debido a que existen dos fuentes de datos de usa
-    target_path = f'../datasets/clean_datasets/australia_data.parquet'
-    df_target = pd.read_parquet(target_path)
-    
-    df_final = pd.concat([df_target, df_ordenado], ignore_index=True).drop_duplicates()
-
-    return df_final
+    # Solo se devuelven las filas de esta fuente: el notebook las codifica y las añade a australia_data (save_clean_data con append)
+    return df_ordenado
 
+@instrument_stage
 def process_wales(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa los datos de Gales
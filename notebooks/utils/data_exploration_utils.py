@@ -1,11 +1,8 @@
 import pandas as pd
 import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import matplotlib.gridspec as gridspec
-from statsmodels.tsa.seasonal import seasonal_decompose
-from scipy.stats import zscore, mode
+
+# matplotlib, statsmodels y scipy se importan dentro de las funciones que los usan para que importar
+# este módulo (p.ej. solo para summarize_series) sea rápido en los procesos del pool
 
 def summarize_series(s, name):
     print(f"\nResumen de {name}:")
@@ -27,6 +24,12 @@ def analyze_all_hospitals(df, period=7, z_thresh=3, plot=True):
         dict con resultados por hospital.
     """
 
+    from statsmodels.tsa.seasonal import seasonal_decompose
+    from scipy.stats import zscore
+    if plot:
+        import matplotlib.pyplot as plt
+        import matplotlib.dates as mdates
+
     # Verifica columnas disponibles
     datetime_col = None
     if 'datetime' in df.columns:
@@ -154,6 +157,9 @@ def plot_decomposition(result, ax, locator, formatter):
     """
     Grafica las 4 componentes de la descomposición en sub-ejes verticales dentro de ax.
     """
+    import matplotlib.pyplot as plt
+    import matplotlib.gridspec as gridspec
+
     gs = gridspec.GridSpecFromSubplotSpec(4, 1, subplot_spec=ax.get_subplotspec(), hspace=0.1)
     components = ['observed', 'trend', 'seasonal', 'resid']
 
@@ -199,6 +205,8 @@ def print_graph(df: pd.DataFrame) -> None:
     Parameters:
     - df (pd.DataFrame): DataFrame a estudiar
     """
+    import matplotlib.pyplot as plt
+
     # Se crea el gráfico
     plt.figure(figsize=(14, 6))
     df.plot(kind='line', ax=plt.gca())
@@ -212,6 +220,7 @@ def print_graph(df: pd.DataFrame) -> None:
 
 
 def print_top10_graph(df: pd.DataFrame) -> None:
+    import matplotlib.pyplot as plt
 
     top_hospitals = df.groupby('hospital')['admissions'].sum().sort_values(ascending=False).head(10).index
 
@@ -1,5 +1,14 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
+from utils.instrumentation_utils import instrument_stage
+
+# Columnas exógenas generadas por aggregate_data para los modelos
+FEATURE_COLUMNS = ['day_of_week', 'is_weekend', 'season', 'lag_7', 'lag_14', 'rolling_7', 'rolling_14']
+
+# Columnas de calendario generadas por aggregate_data
+CALENDAR_COLUMNS = ['day_of_week', 'is_weekend', 'season']
 
 def read_clean_files() -> list:
     """"
@@ -10,6 +19,16 @@ def read_clean_files() -> list:
 
     return parquet_files
 
+def read_processed_files() -> list:
+    """"
+    Lee los archivos parquet de la carpeta ../datasets/processed_datasets/ y devuelve una lista ordenada
+    """
+    folder = Path('../datasets/processed_datasets/')
+    parquet_files = sorted(folder.glob('*.parquet'))
+
+    return parquet_files
+
+@instrument_stage
 def cast_columns_types(df: pd.DataFrame) -> pd.DataFrame:
     """
     Se castea los tipos de datos de las columnas
@@ -20,7 +39,7 @@ def cast_columns_types(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
     - pd.DataFrame: DataFrame con las columnas de fecha casteadas
     """
-    if 'date' in df.columns:
+    if 'date' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['date']):
     # Limpiar y convertir la columna a string
         df['date'] = df['date'].astype(str).str.strip()
         date_sample = df['date'].dropna()
@@ -38,19 +57,21 @@ def cast_columns_types(df: pd.DataFrame) -> pd.DataFrame:
     # Se convierte la columna 'admissions' a numérico
     df['admissions'] = pd.to_numeric(df['admissions'], errors='coerce')
 
-    # Se convierte la columna 'hospital' a string
-    df['hospital'] = df['hospital'].astype(str)
+    # Se convierte la columna 'hospital' a string, salvo si ya es el identificador entero del registro
+    if not pd.api.types.is_integer_dtype(df['hospital']):
+        df['hospital'] = df['hospital'].astype(str)
 
     print(f"Columnas casteadas")
 
     return df
 
+@instrument_stage
 def save_processed_df(df: pd.DataFrame, name: str) -> None:
     """
         Guarda un DataFrame en un archivo parquet
 
         Parameters:
-        - df (pd.DataFrame): formato del archivo.
+        - df (pd.DataFrame o pa.Table): formato del archivo.
         - name (str): nombre del archivo.
         Returns:
         - None
@@ -59,17 +80,21 @@ def save_processed_df(df: pd.DataFrame, name: str) -> None:
     ruta_salida = f'../datasets/processed_datasets/{name}.parquet'
     
     try:
-        # Guardar el DataFrame como un archivo Parquet
-        df.to_parquet(
-            ruta_salida,
-            index=False,
-        )
+        # Guardar el DataFrame como un archivo Parquet (las tablas Arrow del pool se escriben sin pasar por pandas)
+        if isinstance(df, pa.Table):
+            pq.write_table(df, ruta_salida)
+        else:
+            df.to_parquet(
+                ruta_salida,
+                index=False,
+            )
 
         print(f"Archivo guardado exitosamente en: {ruta_salida}")
         
     except Exception as e:
         print(f"Error al guardar el archivo '{name}': {e}")
 
+@instrument_stage
 def group_data(df: pd.DataFrame) -> pd.DataFrame:
     """
     Agrupa los datos por hospital y por fecha (puede ser 'date' o 'datetime'), sumando las admisiones.
@@ -92,6 +117,7 @@ def group_data(df: pd.DataFrame) -> pd.DataFrame:
     print(f"Datos agrupados y ordenados por hospital y fecha. Total de filas: {len(df_ordered)}")
     return df_ordered
 
+@instrument_stage
 def process_data(df: pd.DataFrame) -> pd.DataFrame:
     """"
     Procesa el DataFrame borrando eliminando duplicados, rellenando valores nulos y tratando los outliers
@@ -146,6 +172,7 @@ def remove_outliers(df: pd.DataFrame, column: str, factor: float = 1.5) -> pd.Da
 
     return df
 
+@instrument_stage
 def aggregate_data(df: pd.DataFrame) -> pd.DataFrame:
     """
     Procesa el DataFrame agregando características temporales útiles para modelado ARIMAX:
@@ -0,0 +1,315 @@
+import pandas as pd
+import numpy as np
+from pathlib import Path
+from utils.hospital_registry_utils import load_hospital_registry, update_hospital_metadata
+
+EXOGENOUS_DIR = '../datasets/exogenous/'
+
+# País (código ISO de la librería holidays) y subdivisión por defecto de cada dataset procesado. Los datasets que
+# mezclan regiones (p.ej. spain_data) toman la subdivisión de cada hospital de la columna 'subdiv' del registro
+DATASET_COUNTRIES = {
+    'australia_data': ('AU', None),
+    'betania_data': ('CO', None),
+    'botswana_data': ('BW', None),
+    'cardiff_data': ('GB', 'WLS'),
+    'chile_data': ('CL', None),
+    'colombia_data': ('CO', None),
+    'iowa_data': ('US', 'IA'),
+    'iran_data': ('IR', None),
+    'mexico_data': ('MX', None),
+    'netherlands_data': ('NL', None),
+    'pakistan_data': ('PK', None),
+    'spain_data': ('ES', None),
+    'usa_data': ('US', None),
+    'wales_data': ('GB', 'WLS')
+}
+
+# Código de país del libro multipaís de cada fuente, igual que el filtro de process_pak_, process_usa_...
+MULTICOUNTRY_CODES = {'pak_': 'pak', 'usa_': 'usa', 'nl_': 'nl', 'bwa_': 'bot', 'aus_': 'aus'}
+
+# Festivos ya calculados por (país, subdivisión, año)
+HOLIDAY_CACHE = {}
+
+EXOGENOUS_COLUMNS = ['is_holiday', 'days_to_holiday', 'days_since_holiday', 'temperature', 'is_school_term']
+
+def get_holidays(country: str, year: int, subdiv: str = None) -> np.ndarray:
+    """
+    Devuelve los festivos nacionales (y regionales si se indica la subdivisión) de un país y año.
+    Cada (país, subdivisión, año) se calcula una sola vez y queda en HOLIDAY_CACHE.
+
+    Parameters:
+    - country (str): código ISO del país (p.ej. 'ES', 'MX')
+    - year (int): año
+    - subdiv (str): subdivisión (p.ej. 'CN' para Canarias, 'IA' para Iowa)
+
+    Returns:
+    - np.ndarray: fechas datetime64[D] ordenadas
+    """
+    key = (country, subdiv, int(year))
+    if key not in HOLIDAY_CACHE:
+        import holidays
+
+        calendar = holidays.country_holidays(country, subdiv=subdiv, years=int(year))
+        HOLIDAY_CACHE[key] = np.array(sorted(calendar.keys()), dtype='datetime64[D]')
+
+    return HOLIDAY_CACHE[key]
+
+def holiday_features(days: np.ndarray, country: str, subdiv: str = None) -> tuple:
+    """
+    Calcula si cada día es festivo y los días hasta el siguiente festivo y desde el anterior.
+    Solo se buscan los días únicos, así que el coste no depende del número de filas por día.
+
+    Parameters:
+    - days (np.ndarray): días datetime64[D]
+    - country (str): código ISO del país
+    - subdiv (str): subdivisión
+
+    Returns:
+    - tuple: (is_holiday, days_to_holiday, days_since_holiday) alineados con days
+    """
+    unique_days, inverse = np.unique(days, return_inverse=True)
+    valid = ~np.isnat(unique_days)
+    if not valid.any():
+        empty = np.full(len(days), np.nan)
+        return np.zeros(len(days), dtype=np.int8), empty, empty.copy()
+
+    # Se incluyen el año anterior y el siguiente para que los días de los extremos tengan festivo a ambos lados
+    years = unique_days[valid].astype('datetime64[Y]').astype(np.int64) + 1970
+    calendar = np.concatenate([get_holidays(country, year, subdiv) for year in range(years.min() - 1, years.max() + 2)])
+    calendar = np.unique(calendar)
+
+    position = np.searchsorted(calendar, unique_days, side='left')
+    next_holiday = calendar[np.minimum(position, len(calendar) - 1)]
+    previous_holiday = calendar[np.maximum(np.searchsorted(calendar, unique_days, side='right') - 1, 0)]
+
+    is_holiday = (next_holiday == unique_days).astype(np.int8)
+    days_to = (next_holiday - unique_days).astype(np.int64).astype(float)
+    days_since = (unique_days - previous_holiday).astype(np.int64).astype(float)
+    days_to[~valid | (days_to < 0)] = np.nan
+    days_since[~valid | (days_since < 0)] = np.nan
+
+    return is_holiday[inverse], days_to[inverse], days_since[inverse]
+
+def save_hospital_subdivisions(hospital_ids, subdiv: str) -> None:
+    """
+    Guarda la subdivisión (región de la librería holidays) de los hospitales en la columna 'subdiv' del registro,
+    para que add_exogenous_features aplique sus festivos regionales
+
+    Parameters:
+    - hospital_ids: identificadores del registro (se admiten repetidos, p.ej. la columna 'hospital' de los datos)
+    - subdiv (str): subdivisión (p.ej. 'CN' para Canarias, 'CL' para Castilla y León)
+    """
+    hospital_ids = np.unique(np.asarray(hospital_ids))
+    update_hospital_metadata(hospital_ids, {'subdiv': np.full(len(hospital_ids), subdiv, dtype=object)})
+
+def hospital_subdivisions(hospitals: pd.Series, default: str = None) -> np.ndarray:
+    """
+    Subdivisión de cada fila según la columna 'subdiv' del registro de hospitales; los hospitales sin
+    subdivisión registrada (o con claves que no son del registro) usan la subdivisión por defecto
+
+    Parameters:
+    - hospitals (pd.Series): identificadores del registro de cada fila
+    - default (str): subdivisión por defecto del dataset
+
+    Returns:
+    - np.ndarray: subdivisión de cada fila (None si no hay)
+    """
+    codes, uniques = pd.factorize(hospitals, use_na_sentinel=False)
+    subdivs = np.full(len(uniques), default, dtype=object)
+
+    registry = load_hospital_registry()
+    if 'subdiv' in registry.columns and pd.api.types.is_integer_dtype(hospitals):
+        registered = pd.Series(registry['subdiv'].to_numpy(dtype=object), index=registry['hospital_id'].to_numpy())
+        registered = registered.reindex(uniques).to_numpy(dtype=object)
+        known = ~pd.isna(registered)
+        subdivs[known] = registered[known]
+
+    return subdivs[codes]
+
+def asof_positions(left_keys: np.ndarray, left_times: np.ndarray, right_keys: np.ndarray, right_times: np.ndarray,
+                   tolerance: np.timedelta64 = None) -> np.ndarray:
+    """
+    Para cada fila de la izquierda devuelve la fila de la derecha con la misma clave y el último tiempo
+    menor o igual (como pd.merge_asof con by y direction='backward'), sin reordenar la izquierda.
+    Clave y tiempo se combinan en un único entero para hacer una sola búsqueda binaria vectorizada.
+
+    Parameters:
+    - left_keys (np.ndarray): códigos enteros de la clave de cada fila (p.ej. hospital factorizado)
+    - left_times (np.ndarray): tiempos datetime64 de cada fila
+    - right_keys (np.ndarray): códigos enteros de la clave de la tabla de covariables
+    - right_times (np.ndarray): tiempos datetime64 de la tabla de covariables
+    - tolerance (np.timedelta64): distancia máxima entre tiempos (por defecto sin límite)
+
+    Returns:
+    - np.ndarray: posición en la tabla de la derecha, o -1 si no hay coincidencia
+    """
+    nat = np.iinfo(np.int64).min
+    left_seconds = np.asarray(left_times, dtype='datetime64[s]').astype(np.int64)
+    right_seconds = np.asarray(right_times, dtype='datetime64[s]').astype(np.int64)
+
+    # Las filas sin tiempo no participan en el cruce
+    left_missing = left_seconds == nat
+    right_rows = np.flatnonzero(right_seconds != nat)
+    if len(right_rows) == 0 or left_missing.all():
+        return np.full(len(left_seconds), -1, dtype=np.int64)
+
+    right_keys = np.asarray(right_keys, dtype=np.int64)[right_rows]
+    right_seconds = right_seconds[right_rows]
+    left_seconds = np.where(left_missing, right_seconds.min(), left_seconds)
+
+    origin = min(right_seconds.min(), left_seconds.min())
+    stride = max(right_seconds.max(), left_seconds.max()) - origin + 1
+
+    order = np.lexsort((right_seconds, right_keys))
+    right_keys, right_seconds, right_rows = right_keys[order], right_seconds[order], right_rows[order]
+    right_combined = right_keys * stride + (right_seconds - origin)
+    left_combined = np.asarray(left_keys, dtype=np.int64) * stride + (left_seconds - origin)
+
+    position = np.searchsorted(right_combined, left_combined, side='right') - 1
+    clipped = np.maximum(position, 0)
+    valid = (position >= 0) & ~left_missing & (right_keys[clipped] == left_keys)
+    if tolerance is not None:
+        valid &= left_seconds - right_seconds[clipped] <= np.timedelta64(tolerance, 's').astype(np.int64)
+
+    return np.where(valid, right_rows[clipped], -1)
+
+def join_keys(df: pd.DataFrame, table: pd.DataFrame) -> tuple:
+    """
+    Códigos comunes del hospital para el DataFrame y una tabla de covariables; si la tabla no tiene
+    columna 'hospital' se aplica a todos los hospitales (p.ej. una tabla por país)
+    """
+    if 'hospital' not in table.columns:
+        return np.zeros(len(df), dtype=np.int64), np.zeros(len(table), dtype=np.int64)
+
+    codes, _ = pd.factorize(pd.concat([df['hospital'], table['hospital']], ignore_index=True))
+
+    return codes[:len(df)], codes[len(df):]
+
+def local_times(times: pd.Series) -> np.ndarray:
+    """
+    Hora local sin zona horaria (los días y festivos se calculan en hora local, como en aggregate_data)
+    """
+    if times.dt.tz is not None:
+        times = times.dt.tz_localize(None)
+
+    return times.to_numpy(dtype='datetime64[ns]')
+
+def add_exogenous_features(df: pd.DataFrame, dataset: str = None, country: str = None, subdiv: str = None,
+                           covariates: list = None, school_terms: pd.DataFrame = None, tolerance: str = '1D') -> pd.DataFrame:
+    """
+    Añade covariables exógenas a la rejilla hospital-tiempo con búsquedas binarias vectorizadas sobre
+    tablas ordenadas, sin apply por fila:
+    - is_holiday, days_to_holiday, days_since_holiday: festivos del país del dataset y de la subdivisión
+      de cada hospital (la del registro, o la del dataset si no tiene)
+    - columnas de cada tabla de covariables (p.ej. temperature), con el último valor disponible por hospital
+    - is_school_term: si la fecha cae dentro de algún periodo lectivo
+
+    Parameters:
+    - df (pd.DataFrame): DataFrame con columnas ['hospital', 'date' o 'datetime', ...]
+    - dataset (str): nombre del dataset, para tomar país y subdivisión de DATASET_COUNTRIES
+    - country (str): código ISO del país (sustituye al del dataset)
+    - subdiv (str): subdivisión (sustituye a la del dataset y a la de cada hospital)
+    - covariates (list): tablas con columnas [('hospital'), 'date' o 'datetime', valores...]
+    - school_terms (pd.DataFrame): periodos lectivos con columnas [('hospital'), 'start', 'end']
+    - tolerance (str): antigüedad máxima del valor de una covariable (p.ej. '1D' para la temperatura diaria)
+
+    Returns:
+    - pd.DataFrame: DataFrame con las columnas exógenas añadidas, en el mismo orden de filas
+    """
+    time_col = 'datetime' if 'datetime' in df.columns else 'date'
+    times = local_times(df[time_col])
+    df = df.copy()
+
+    default_subdiv = None
+    if country is None and dataset in DATASET_COUNTRIES:
+        country, default_subdiv = DATASET_COUNTRIES[dataset]
+    if country is not None:
+        days = times.astype('datetime64[D]')
+        subdivs = np.full(len(df), subdiv, dtype=object) if subdiv is not None else hospital_subdivisions(df['hospital'], default_subdiv)
+
+        # Se calculan los festivos una vez por subdivisión con las filas de sus hospitales
+        is_holiday = np.zeros(len(df), dtype=np.int8)
+        days_to, days_since = np.full(len(df), np.nan), np.full(len(df), np.nan)
+        codes, groups = pd.factorize(subdivs, use_na_sentinel=False)
+        for code, group in enumerate(groups):
+            rows = codes == code
+            is_holiday[rows], days_to[rows], days_since[rows] = holiday_features(days[rows], country, None if pd.isna(group) else group)
+
+        df['is_holiday'], df['days_to_holiday'], df['days_since_holiday'] = is_holiday, days_to, days_since
+
+    tolerance = pd.Timedelta(tolerance).to_timedelta64() if tolerance is not None else None
+    for table in covariates or []:
+        table_time_col = 'datetime' if 'datetime' in table.columns else 'date'
+        left_keys, right_keys = join_keys(df, table)
+        position = asof_positions(left_keys, times, right_keys, local_times(table[table_time_col]), tolerance)
+
+        for col in [c for c in table.columns if c not in ('hospital', table_time_col)]:
+            values = table[col].to_numpy(dtype=float)
+            df[col] = np.where(position >= 0, values[np.maximum(position, 0)], np.nan)
+
+    if school_terms is not None:
+        left_keys, right_keys = join_keys(df, school_terms)
+        starts = pd.to_datetime(school_terms['start']).to_numpy(dtype='datetime64[ns]')
+        ends = pd.to_datetime(school_terms['end']).to_numpy(dtype='datetime64[ns]')
+
+        # Periodo que empezó más recientemente y, si existe, si la fecha no ha superado su fin (inclusive)
+        position = asof_positions(left_keys, times.astype('datetime64[D]'), right_keys, starts)
+        inside = (position >= 0) & (times.astype('datetime64[D]') <= ends[np.maximum(position, 0)])
+        df['is_school_term'] = inside.astype(np.int8)
+
+    return df
+
+def temperature_from_multicountry(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    """
+    Extrae la temperatura diaria por hospital del libro multipaís (que la limpieza descarta),
+    filtrando el país de la fuente igual que process_pak_, process_usa_...
+
+    Parameters:
+    - df (pd.DataFrame): libro en bruto con columnas ['country', 'date', 'hospital', 'temperature']
+    - name (str): nombre de la fuente ('pak_', 'usa_', 'nl_', 'bwa_' o 'aus_')
+
+    Returns:
+    - pd.DataFrame: ['hospital', 'date', 'temperature'] ordenado por hospital y fecha
+    """
+    if name not in MULTICOUNTRY_CODES:
+        raise ValueError(f"La fuente '{name}' no es del libro multipaís")
+
+    df = df[df['country'].str.contains(MULTICOUNTRY_CODES[name], na=False)]
+    temperature = pd.DataFrame({
+        'hospital': df['hospital'].astype(str),
+        'date': pd.to_datetime(df['date'].astype(str), format='%Y%m%d', errors='coerce'),
+        'temperature': pd.to_numeric(df['temperature'], errors='coerce')
+    })
+    temperature = temperature.dropna(subset=['date']).groupby(['hospital', 'date'], as_index=False)['temperature'].mean()
+
+    return temperature.sort_values(['hospital', 'date']).reset_index(drop=True)
+
+def save_exogenous(df: pd.DataFrame, name: str) -> None:
+    """
+    Guarda una tabla de covariables en EXOGENOUS_DIR
+
+    Parameters:
+    - df (pd.DataFrame): tabla de covariables
+    - name (str): nombre del fichero (p.ej. 'pakistan_data_temperature' o 'spain_data_school_terms')
+    """
+    path = Path(EXOGENOUS_DIR) / f'{name}.parquet'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(path, index=False)
+
+    print(f"Covariables guardadas en: {path}")
+
+def load_exogenous(name: str) -> pd.DataFrame:
+    """
+    Lee una tabla de covariables de EXOGENOUS_DIR
+
+    Parameters:
+    - name (str): nombre del fichero sin extensión
+
+    Returns:
+    - pd.DataFrame: tabla de covariables, o None si no existe
+    """
+    path = Path(EXOGENOUS_DIR) / f'{name}.parquet'
+    if not path.exists():
+        return None
+
+    return pd.read_parquet(path)
@@ -0,0 +1,256 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from utils.data_preprocessing_utils import read_processed_files
+from utils.backtesting_utils import to_naive_ns
+
+FEATURE_STORE_DIR = '../datasets/feature_store/'
+
+# Definición de las columnas que genera el preprocesado
+FEATURE_DEFINITIONS = {
+    'time': 'Marca temporal en nanosegundos desde epoch (UTC); la zona horaria original está en time_zone del manifiesto',
+    'admissions': 'Admisiones del periodo',
+    'day_of_week': 'Día de la semana (0=lunes, 6=domingo)',
+    'is_weekend': 'Indicador de fin de semana (sábado o domingo)',
+    'season': 'Estación del año en hemisferio norte (1=primavera, 4=invierno)',
+    'lag_7': 'Admisiones 7 periodos antes',
+    'lag_14': 'Admisiones 14 periodos antes',
+    'rolling_7': 'Media de los 7 periodos anteriores, excluyendo el actual',
+    'rolling_14': 'Media de los 14 periodos anteriores, excluyendo el actual'
+}
+
+# Columnas enteras pequeñas; el resto de columnas numéricas se guardan como float32
+INT_COLUMNS = {'day_of_week': np.int8, 'is_weekend': np.int8, 'season': np.int8}
+
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    """
+    Calcula el hash sha256 de un fichero leyéndolo por bloques
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+
+    return h.hexdigest()
+
+def read_manifest(name: str) -> dict:
+    """
+    Lee el manifiesto de un dataset del feature store
+
+    Parameters:
+    - name (str): nombre del dataset (p.ej. 'cardiff_data')
+
+    Returns:
+    - dict: manifiesto, o None si el dataset no existe en el store
+    """
+    path = Path(FEATURE_STORE_DIR) / name / 'manifest.json'
+    if not path.exists():
+        return None
+
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def build_feature_store(path: str, definitions: dict = None, force: bool = False) -> dict:
+    """
+    Guarda las columnas de un parquet procesado como arrays contiguos por columna (.npy) que se pueden
+    abrir con memmap, junto con el índice de offsets por hospital y un manifiesto
+
+    Parameters:
+    - path (str): ruta del parquet procesado
+    - definitions (dict): definiciones de columnas nuevas que se añaden a FEATURE_DEFINITIONS
+    - force (bool): reconstruye aunque el parquet no haya cambiado
+
+    Returns:
+    - dict: manifiesto del dataset
+    """
+    name = Path(path).stem
+    source_hash = hash_file(path)
+
+    manifest = read_manifest(name)
+    if manifest is not None and manifest['source_hash'] == source_hash and not force:
+        print(f"Feature store de '{name}' actualizado, no se reconstruye")
+        return manifest
+
+    df = pd.read_parquet(path)
+    time_col = 'datetime' if 'datetime' in df.columns else 'date'
+
+    df = df.sort_values(['hospital', time_col], kind='stable')
+    codes, hospitals = pd.factorize(df['hospital'], sort=True)
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(hospitals)))]).astype(np.int64)
+
+    definitions = {**FEATURE_DEFINITIONS, **(definitions or {})}
+
+    columns = {'time': to_naive_ns(df[time_col]).view(np.int64)}
+    for col in df.columns:
+        if col in ('hospital', time_col) or not pd.api.types.is_numeric_dtype(df[col]):
+            continue
+        columns[col] = df[col].to_numpy(dtype=INT_COLUMNS.get(col, np.float32))
+
+    # Se escribe en un directorio temporal y se sustituye al final para no dejar el store a medias
+    store_dir = Path(FEATURE_STORE_DIR) / name
+    tmp_dir = store_dir.with_name(name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    np.save(tmp_dir / 'hospital_offsets.npy', offsets)
+    for col, values in columns.items():
+        np.save(tmp_dir / f'{col}.npy', np.ascontiguousarray(values))
+
+    manifest = {
+        'dataset': name,
+        'source': str(path),
+        'source_hash': source_hash,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'n_rows': int(len(df)),
+        'time_column': time_col,
+        'time_zone': str(df[time_col].dt.tz) if df[time_col].dt.tz is not None else None,
+        'hospitals': [hospital_key(h) for h in hospitals],
+        'hospital_dtype': str(df['hospital'].dtype),
+        'columns': {
+            col: {'file': f'{col}.npy', 'dtype': str(values.dtype), 'definition': definitions.get(col, '')}
+            for col, values in columns.items()
+        }
+    }
+    with open(tmp_dir / 'manifest.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(store_dir, ignore_errors=True)
+    tmp_dir.rename(store_dir)
+
+    print(f"Feature store de '{name}' guardado en: {store_dir}")
+    return manifest
+
+def build_all_feature_stores(force: bool = False) -> list:
+    """
+    Construye el feature store de todos los datasets procesados
+
+    Parameters:
+    - force (bool): reconstruye aunque los parquet no hayan cambiado
+
+    Returns:
+    - list: manifiestos de los datasets
+    """
+    return [build_feature_store(path, force=force) for path in read_processed_files()]
+
+def hospital_key(hospital):
+    """
+    Clave del hospital tal como se guarda en el manifiesto: entero JSON para los identificadores del registro
+    y cadena para las claves nativas, de forma que las búsquedas comparan siempre con el mismo tipo
+    """
+    if isinstance(hospital, (int, np.integer)) and not isinstance(hospital, (bool, np.bool_)):
+        return int(hospital)
+
+    return str(hospital)
+
+def store_times(manifest: dict, values: np.ndarray) -> pd.DatetimeIndex:
+    """
+    Convierte la columna 'time' del store (nanosegundos UTC) a fechas con la zona horaria original del dataset,
+    de forma que el calendario (día, hora, fin de semana...) se calcula en hora local como en aggregate_data
+
+    Parameters:
+    - manifest (dict): manifiesto del dataset
+    - values (np.ndarray): valores de la columna 'time'
+
+    Returns:
+    - pd.DatetimeIndex: fechas sin zona horaria, o en la zona time_zone si el dataset la tenía
+    """
+    times = pd.DatetimeIndex(np.asarray(values).astype('datetime64[ns]'))
+    if manifest.get('time_zone'):
+        times = times.tz_localize('UTC').tz_convert(manifest['time_zone'])
+
+    return times
+
+def read_hospital_offsets(name: str) -> tuple:
+    """
+    Devuelve los hospitales y sus offsets de filas en el store
+
+    Parameters:
+    - name (str): nombre del dataset
+
+    Returns:
+    - tuple: (lista de hospitales, array de offsets de longitud n_hospitales + 1)
+    """
+    manifest = read_manifest(name)
+    if manifest is None:
+        raise FileNotFoundError(f"No existe el feature store de '{name}'")
+
+    offsets = np.load(Path(FEATURE_STORE_DIR) / name / 'hospital_offsets.npy')
+
+    return manifest['hospitals'], offsets
+
+def read_feature_columns(name: str, columns: list = None, hospital: str = None) -> dict:
+    """
+    Abre columnas del store como memmap de solo lectura, sin deserializar. Varios procesos que abren
+    las mismas columnas comparten las páginas a través de la caché del sistema operativo. La columna 'time' está
+    en nanosegundos UTC: store_times la pasa a la zona horaria del dataset.
+
+    Parameters:
+    - name (str): nombre del dataset
+    - columns (list): columnas a abrir (por defecto todas)
+    - hospital: si se indica (identificador del registro o clave), se devuelve solo el tramo (vista) de ese hospital
+
+    Returns:
+    - dict: columna -> np.memmap
+    """
+    manifest = read_manifest(name)
+    if manifest is None:
+        raise FileNotFoundError(f"No existe el feature store de '{name}'")
+
+    columns = columns or list(manifest['columns'])
+    missing = [col for col in columns if col not in manifest['columns']]
+    if missing:
+        raise ValueError(f"Columnas no disponibles en '{name}': {missing}")
+
+    rows = slice(None)
+    if hospital is not None:
+        hospitals, offsets = read_hospital_offsets(name)
+        hospital = hospital_key(hospital)
+        if hospital not in hospitals:
+            raise ValueError(f"El hospital '{hospital}' no existe en '{name}'")
+        i = hospitals.index(hospital)
+        rows = slice(offsets[i], offsets[i + 1])
+
+    store_dir = Path(FEATURE_STORE_DIR) / name
+
+    return {
+        col: np.load(store_dir / manifest['columns'][col]['file'], mmap_mode='r')[rows]
+        for col in columns
+    }
+
+def feature_store_to_df(name: str, columns: list = None, hospitals: list = None) -> pd.DataFrame:
+    """
+    Reconstruye un DataFrame largo a partir del store, con las columnas y hospitales pedidos
+
+    Parameters:
+    - name (str): nombre del dataset
+    - columns (list): columnas a incluir (por defecto todas)
+    - hospitals (list): hospitales a incluir (por defecto todos)
+
+    Returns:
+    - pd.DataFrame: DataFrame con columnas ['hospital', 'date' o 'datetime', ...]
+    """
+    manifest = read_manifest(name)
+    all_hospitals, offsets = read_hospital_offsets(name)
+    columns = [col for col in (columns or list(manifest['columns'])) if col != 'time']
+    data = read_feature_columns(name, ['time'] + columns)
+
+    selected = range(len(all_hospitals)) if hospitals is None else [all_hospitals.index(hospital_key(h)) for h in hospitals]
+    rows = np.concatenate([np.arange(offsets[i], offsets[i + 1]) for i in selected]) if selected else np.empty(0, dtype=np.int64)
+    lengths = np.diff(offsets)[list(selected)]
+
+    df = pd.DataFrame({
+        'hospital': np.repeat([all_hospitals[i] for i in selected], lengths),
+        manifest['time_column']: store_times(manifest, data['time'][rows])
+    })
+    for col in columns:
+        df[col] = data[col][rows]
+
+    # Los identificadores del registro recuperan su tipo (int32) para cruzarse con el resto del pipeline
+    if pd.api.types.is_integer_dtype(manifest.get('hospital_dtype')):
+        df['hospital'] = df['hospital'].astype(manifest['hospital_dtype'])
+
+    return df
@@ -0,0 +1,174 @@
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+from pathlib import Path
+
+HOSPITAL_REGISTRY_PATH = '../datasets/hospital_registry.parquet'
+
+REGISTRY_COLUMNS = ['hospital_id', 'source', 'native_key', 'name']
+
+def load_hospital_registry() -> pd.DataFrame:
+    """
+    Lee el registro global de hospitales
+
+    Returns:
+    - pd.DataFrame: registro con columnas ['hospital_id', 'source', 'native_key', 'name', ...metadatos]
+    """
+    path = Path(HOSPITAL_REGISTRY_PATH)
+    if not path.exists():
+        return pd.DataFrame({
+            'hospital_id': pd.Series(dtype='int32'),
+            'source': pd.Series(dtype='str'),
+            'native_key': pd.Series(dtype='str'),
+            'name': pd.Series(dtype='str')
+        })
+
+    return pd.read_parquet(path)
+
+def save_hospital_registry(registry: pd.DataFrame) -> None:
+    """
+    Guarda el registro global de hospitales de forma atómica
+
+    Parameters:
+    - registry (pd.DataFrame): registro a guardar
+    """
+    path = Path(HOSPITAL_REGISTRY_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = path.with_suffix('.tmp')
+    registry.to_parquet(tmp_path, index=False)
+    tmp_path.replace(path)
+
+def register_hospitals(source: str, native_keys, names=None, metadata: dict = None) -> np.ndarray:
+    """
+    Asigna un identificador entero estable (int32) a cada (fuente, clave nativa). Las claves ya registradas
+    conservan su identificador; las nuevas reciben el siguiente libre. Nombres y metadatos se guardan una sola vez.
+
+    Parameters:
+    - source (str): fuente de datos (p.ej. 'chile', 'mexico', 'esp_canarias')
+    - native_keys: claves nativas (IdEstablecimiento, CLUES, código, Ips...), una por fila
+    - names: nombres legibles alineados con native_keys (por defecto la propia clave)
+    - metadata (dict): columnas adicionales alineadas con native_keys (región, país...)
+
+    Returns:
+    - np.ndarray: identificadores int32 alineados con native_keys
+    """
+    native_keys = pd.Series(np.asarray(native_keys)).astype(str)
+    codes, uniques = pd.factorize(native_keys)
+
+    # Primer nombre y metadatos de cada clave, calculados sobre las claves únicas
+    first = pd.Series(np.arange(len(codes))).groupby(codes).first().to_numpy() if len(codes) else np.empty(0, dtype=int)
+    keys = pd.DataFrame({'source': source, 'native_key': uniques})
+    keys['name'] = pd.Series(np.asarray(names)).astype(str).to_numpy()[first] if names is not None else keys['native_key']
+    for col, values in (metadata or {}).items():
+        keys[col] = np.asarray(values)[first]
+
+    registry = load_hospital_registry()
+    merged = keys.merge(registry[['source', 'native_key', 'hospital_id']], on=['source', 'native_key'], how='left')
+
+    nuevos = merged['hospital_id'].isna().to_numpy()
+    if nuevos.any():
+        next_id = int(registry['hospital_id'].max()) + 1 if len(registry) else 0
+        new_ids = np.arange(next_id, next_id + nuevos.sum())
+        merged.loc[nuevos, 'hospital_id'] = new_ids
+
+        new_rows = keys[nuevos].assign(hospital_id=new_ids)
+        registry = pd.concat([registry, new_rows], ignore_index=True)
+        registry['hospital_id'] = registry['hospital_id'].astype('int32')
+        save_hospital_registry(registry[REGISTRY_COLUMNS + [c for c in registry.columns if c not in REGISTRY_COLUMNS]])
+
+        print(f"Se han registrado {int(nuevos.sum())} hospitales nuevos de '{source}'")
+
+    ids = merged['hospital_id'].to_numpy().astype('int32')
+
+    return ids[codes]
+
+def update_hospital_metadata(hospital_ids, metadata: dict) -> pd.DataFrame:
+    """
+    Añade o actualiza columnas de metadatos (región, cluster...) de hospitales ya registrados.
+    Los hospitales no incluidos conservan su valor (vacío si la columna es nueva).
+
+    Parameters:
+    - hospital_ids: identificadores del registro
+    - metadata (dict): columnas a guardar, alineadas con hospital_ids
+
+    Returns:
+    - pd.DataFrame: registro actualizado
+    """
+    registry = load_hospital_registry()
+    positions = pd.Index(registry['hospital_id']).get_indexer(np.asarray(hospital_ids))
+    if (positions < 0).any():
+        raise ValueError(f"Hay {int((positions < 0).sum())} hospitales que no están en el registro")
+
+    for col, values in metadata.items():
+        if col in REGISTRY_COLUMNS:
+            raise ValueError(f"La columna '{col}' no se puede modificar")
+
+        values = pd.Series(np.asarray(values)).convert_dtypes()
+        if col not in registry.columns:
+            registry[col] = pd.Series(pd.NA, index=registry.index, dtype=values.dtype)
+        registry.loc[registry.index[positions], col] = values.to_numpy()
+
+    save_hospital_registry(registry)
+
+    return registry
+
+def encode_hospitals(df, source: str, key_col: str = 'hospital', name_col: str = 'hospital_name', id_col: str = 'hospital'):
+    """
+    Sustituye la clave nativa del hospital (IdEstablecimiento, CLUES, código...) por su identificador entero
+    del registro, de forma que las etapas posteriores agrupan, ordenan y cruzan por un int32 en lugar de por
+    cadenas. El nombre legible no forma parte de la clave: se guarda en el registro y se recupera con
+    decode_hospitals, así que los identificadores no cambian aunque cambie el nombre.
+
+    Parameters:
+    - df (pd.DataFrame o pa.Table): datos con una columna de clave de hospital
+    - source (str): fuente de datos real (p.ej. 'chile', 'esp_canarias', 'mexico'), no el dataset final
+    - key_col (str): columna con la clave nativa
+    - name_col (str): columna con el nombre legible, si existe (por defecto la propia clave); se elimina tras registrarla
+    - id_col (str): columna de salida con el identificador (por defecto sustituye a 'hospital')
+
+    Returns:
+    - pd.DataFrame o pa.Table: datos con la columna id_col de tipo int32
+    """
+    is_table = isinstance(df, pa.Table)
+    columns = df.column_names if is_table else df.columns
+    name_col = name_col if name_col in columns else None
+
+    # Se registran solo las claves únicas para no tratar cadenas fila a fila
+    keys = df.column(key_col).to_pandas() if is_table else df[key_col]
+    codes, uniques = pd.factorize(keys, use_na_sentinel=False)
+    names = None
+    if name_col is not None:
+        names = (df.column(name_col).to_pandas() if is_table else df[name_col]).groupby(codes).first().to_numpy()
+
+    unique_ids = register_hospitals(source, uniques, names)
+    ids = unique_ids[codes] if len(codes) else np.empty(0, dtype='int32')
+
+    drop = [c for c in (key_col, name_col) if c is not None and (c != id_col or is_table)]
+    if is_table:
+        return df.drop_columns(drop).append_column(id_col, pa.array(ids, type=pa.int32()))
+
+    df = df.drop(columns=drop)
+    df[id_col] = ids
+
+    return df
+
+def decode_hospitals(df: pd.DataFrame, id_col: str = 'hospital', name_col: str = 'hospital_name') -> pd.DataFrame:
+    """
+    Añade el nombre legible de cada hospital a partir de su identificador (solo para mostrar resultados)
+
+    Parameters:
+    - df (pd.DataFrame): DataFrame con la columna de identificador
+    - id_col (str): columna con el identificador entero
+    - name_col (str): columna de salida con el nombre
+
+    Returns:
+    - pd.DataFrame: DataFrame con la columna de nombre añadida
+    """
+    registry = load_hospital_registry()
+    names = pd.Series(registry['name'].to_numpy(), index=registry['hospital_id'].to_numpy())
+
+    df = df.copy()
+    df[name_col] = df[id_col].map(names)
+
+    return df
@@ -0,0 +1,280 @@
+import pandas as pd
+import pyarrow as pa
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+TRACES_DIR = '../datasets/traces/'
+
+# Estado global de la traza del proceso actual (se conservan como máximo los últimos MAX_TRACE_EVENTS eventos)
+MAX_TRACE_EVENTS = 100_000
+TRACE_EVENTS = deque(maxlen=MAX_TRACE_EVENTS)
+TRACE_STATE = {'memory': False, 'origin': time.perf_counter()}
+
+# Listas abiertas con collect_trace_events que reciben también cada evento nuevo
+TRACE_COLLECTORS = []
+_local = threading.local()
+
+def get_peak_rss() -> int:
+    """
+    Devuelve el pico de memoria residente del proceso en bytes, o None si no se puede obtener.
+    Es el máximo desde que arrancó el proceso (ru_maxrss), no el de una etapa: solo crece cuando una
+    etapa supera el máximo anterior. Para medir la memoria de cada etapa se usa start_trace(trace_memory=True).
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # En Linux ru_maxrss está en KB y en macOS en bytes
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        pass
+
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss)
+    except ImportError:
+        return None
+
+def describe_data(data) -> tuple:
+    """
+    Devuelve (filas, bytes) de un DataFrame, Series o tabla Arrow, o (None, None) para otros objetos
+    """
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        return len(data), int(data.memory_usage(index=True, deep=False).sum())
+    if isinstance(data, pa.Table):
+        return data.num_rows, int(data.nbytes)
+
+    return None, None
+
+def start_trace(trace_memory: bool = False) -> None:
+    """
+    Empieza una traza nueva descartando los eventos anteriores
+
+    Parameters:
+    - trace_memory (bool): activa tracemalloc para medir el incremento de memoria de Python por etapa
+      (más preciso que el RSS pero ralentiza la ejecución)
+    """
+    TRACE_EVENTS.clear()
+    TRACE_STATE['origin'] = time.perf_counter()
+    TRACE_STATE['memory'] = trace_memory
+
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def stop_trace() -> list:
+    """
+    Detiene la medición de memoria y devuelve los eventos registrados
+    """
+    if TRACE_STATE['memory'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    TRACE_STATE['memory'] = False
+
+    return list(TRACE_EVENTS)
+
+class stage_trace:
+    """
+    Context manager que registra una etapa del pipeline: tiempo real y de CPU, pico de RSS,
+    incremento de memoria con tracemalloc (si está activo) y filas/bytes de entrada y salida.
+
+    Uso:
+        with stage_trace('group_data', df) as stage:
+            df = group_data(df)
+            stage.set_output(df)
+    """
+
+    def __init__(self, name: str, data_in=None, **metadata):
+        self.name = name
+        self.rows_in, self.bytes_in = describe_data(data_in)
+        self.rows_out, self.bytes_out = None, None
+        self.metadata = metadata
+
+    def set_output(self, data_out) -> None:
+        self.rows_out, self.bytes_out = describe_data(data_out)
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.depth = len(stack)
+        stack.append(self)
+
+        self.memory = TRACE_STATE['memory'] and tracemalloc.is_tracing()
+        if self.memory:
+            self.mem_start = tracemalloc.get_traced_memory()[0]
+            self.mem_peak = self.mem_start
+            tracemalloc.reset_peak()
+
+        self.start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.start
+        cpu = time.process_time() - self.cpu_start
+        rss_end = get_peak_rss()
+
+        event = {
+            'name': self.name,
+            'start': self.start - TRACE_STATE['origin'],
+            'wall_s': wall,
+            'cpu_s': cpu,
+            'peak_rss_bytes': rss_end,
+            'tracemalloc_peak_delta_bytes': None,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'depth': self.depth,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'error': repr(exc) if exc is not None else None,
+            **self.metadata
+        }
+
+        stack = _local.stack
+        stack.pop()
+
+        if self.memory and tracemalloc.is_tracing():
+            # El pico se reinicia en cada etapa anidada, así que se acumula el máximo en la etapa padre
+            peak = max(tracemalloc.get_traced_memory()[1], self.mem_peak)
+            event['tracemalloc_peak_delta_bytes'] = peak - self.mem_start
+            if stack and getattr(stack[-1], 'memory', False):
+                stack[-1].mem_peak = max(stack[-1].mem_peak, peak)
+
+        TRACE_EVENTS.append(event)
+        for collector in TRACE_COLLECTORS:
+            collector.append({**event, 'start': self.start})
+
+        return False
+
+@contextmanager
+def collect_trace_events():
+    """
+    Recoge en una lista, además de en la traza del proceso, los eventos registrados dentro del bloque, p.ej. en un
+    worker del pool para devolverlos al proceso principal. Su 'start' es el valor absoluto de time.perf_counter,
+    que es un reloj del sistema compartido por todos los procesos, para unirlos con merge_trace_events.
+
+    Uso:
+        with collect_trace_events() as events:
+            df = process_func(df)
+    """
+    events = []
+    TRACE_COLLECTORS.append(events)
+    try:
+        yield events
+    finally:
+        TRACE_COLLECTORS.remove(events)
+
+def merge_trace_events(events: list) -> None:
+    """
+    Añade a la traza del proceso actual los eventos de collect_trace_events de otro proceso,
+    pasando su 'start' a tiempo relativo al inicio de esta traza
+    """
+    TRACE_EVENTS.extend({**event, 'start': event['start'] - TRACE_STATE['origin']} for event in events)
+
+def instrument_stage(func):
+    """
+    Decorador que registra cada llamada a una etapa del pipeline con stage_trace.
+    Las filas y bytes de entrada se toman del primer DataFrame recibido y los de salida del valor devuelto.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        data_in = next((a for a in list(args) + list(kwargs.values()) if isinstance(a, (pd.DataFrame, pd.Series, pa.Table))), None)
+
+        with stage_trace(func.__name__, data_in) as stage:
+            result = func(*args, **kwargs)
+            stage.set_output(result)
+
+        return result
+
+    return wrapper
+
+def trace_to_df(events: list = None) -> pd.DataFrame:
+    """
+    Devuelve los eventos de la traza como DataFrame
+
+    Parameters:
+    - events (list): eventos a convertir (por defecto los de la traza actual)
+
+    Returns:
+    - pd.DataFrame: una fila por llamada a una etapa
+    """
+    return pd.DataFrame(list(TRACE_EVENTS) if events is None else events)
+
+def summarize_trace(events: list = None) -> pd.DataFrame:
+    """
+    Agrega la traza por etapa, ordenando por tiempo total para ver las etapas más costosas
+
+    Parameters:
+    - events (list): eventos a resumir (por defecto los de la traza actual)
+
+    Returns:
+    - pd.DataFrame: llamadas, tiempo total, CPU total, pico de memoria y filas por etapa
+    """
+    df = trace_to_df(events)
+    if df.empty:
+        return df
+
+    return df.groupby('name').agg(
+        calls=('wall_s', 'size'),
+        wall_s=('wall_s', 'sum'),
+        cpu_s=('cpu_s', 'sum'),
+        peak_rss_bytes=('peak_rss_bytes', 'max'),
+        tracemalloc_peak_delta_bytes=('tracemalloc_peak_delta_bytes', 'max'),
+        rows_in=('rows_in', 'sum'),
+        rows_out=('rows_out', 'sum')
+    ).sort_values('wall_s', ascending=False)
+
+def save_trace(path: str = None, chrome: bool = False, events: list = None) -> Path:
+    """
+    Guarda la traza en JSON, en formato propio o en formato Chrome trace (chrome://tracing, Perfetto)
+
+    Parameters:
+    - path (str): ruta de salida (por defecto una ruta con fecha en TRACES_DIR)
+    - chrome (bool): guarda en formato Chrome trace
+    - events (list): eventos a guardar (por defecto los de la traza actual)
+
+    Returns:
+    - Path: ruta del fichero guardado
+    """
+    events = list(TRACE_EVENTS) if events is None else events
+
+    if path is None:
+        suffix = '_chrome' if chrome else ''
+        path = Path(TRACES_DIR) / f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}.json"
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if chrome:
+        payload = {
+            'traceEvents': [
+                {
+                    'name': e['name'],
+                    'ph': 'X',
+                    'ts': e['start'] * 1e6,
+                    'dur': e['wall_s'] * 1e6,
+                    'pid': e['pid'],
+                    'tid': e['tid'],
+                    'args': {k: v for k, v in e.items() if k not in ('name', 'start', 'wall_s', 'pid', 'tid')}
+                }
+                for e in events
+            ],
+            'displayTimeUnit': 'ms'
+        }
+    else:
+        payload = {'created': datetime.now().isoformat(timespec='seconds'), 'events': events}
+
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=1, default=str)
+
+    print(f"Traza guardada en: {path}")
+    return path
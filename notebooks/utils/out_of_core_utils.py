@@ -0,0 +1,232 @@
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from utils.data_preprocessing_utils import group_data
+
+SPILL_DIR = '../datasets/spill/'
+
+# Memoria máxima por defecto para agrupar un dataset que no cabe en RAM
+MEMORY_BUDGET_BYTES = 2 * 1024 ** 3
+
+# Tamaño del parquet limpio a partir del cual el notebook de preprocesado agrupa fuera de memoria
+OUT_OF_CORE_MIN_BYTES = 512 * 1024 ** 2
+
+# Memoria que necesitan groupby + sort_values respecto al tamaño en memoria de los datos de entrada
+GROUPBY_MEMORY_FACTOR = 4
+
+def estimate_row_bytes(path: str, transform=None, sample_rows: int = 10_000) -> float:
+    """
+    Estima los bytes en memoria de una fila del dataset (ya transformada) a partir de una muestra
+    """
+    sample = next(pq.ParquetFile(path).iter_batches(batch_size=sample_rows), None)
+    if sample is None or sample.num_rows == 0:
+        return 1.0
+
+    df = sample.to_pandas()
+    if transform is not None:
+        df = transform(df)
+
+    return df.memory_usage(deep=True).sum() / max(len(df), 1)
+
+def hash_partition(values, n_partitions: int) -> np.ndarray:
+    """
+    Asigna cada hospital a una partición con un hash estable, de forma que todas las filas de un hospital
+    van a la misma partición sea cual sea el lote en el que aparezcan
+    """
+    return (pd.util.hash_array(np.asarray(values)) % np.uint64(n_partitions)).astype(np.int64)
+
+def spill_partitions(path: str, n_partitions: int, batch_rows: int, spill_dir: Path, transform=None) -> dict:
+    """
+    Lee el parquet por lotes y escribe las filas de cada partición en sus propios ficheros parquet de desborde.
+    Si los tipos de un lote cambian respecto a los anteriores (p.ej. admisiones enteras y luego con NaN) se
+    empieza un fichero nuevo de la partición, y al leerlos pd.concat unifica los tipos igual que en memoria.
+
+    Parameters:
+    - path (str): parquet de entrada
+    - n_partitions (int): número de particiones
+    - batch_rows (int): filas por lote de lectura
+    - spill_dir (Path): carpeta de los ficheros de desborde
+    - transform (callable): función aplicada a cada lote antes de particionar (p.ej. cast_columns_types)
+
+    Returns:
+    - dict: ficheros de desborde de cada partición
+    """
+    writers = {}
+    parts = {}
+
+    try:
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows):
+            df = batch.to_pandas()
+            if transform is not None:
+                df = transform(df)
+
+            partitions = hash_partition(df['hospital'], n_partitions)
+            order = np.argsort(partitions, kind='stable')
+            bounds = np.searchsorted(partitions[order], np.arange(n_partitions + 1))
+
+            for p in range(n_partitions):
+                if bounds[p] == bounds[p + 1]:
+                    continue
+
+                # Se mantiene el orden original de las filas para que las sumas coincidan con las de group_data
+                table = pa.Table.from_pandas(df.iloc[order[bounds[p]:bounds[p + 1]]], preserve_index=False)
+
+                writer = writers.get(p)
+                if writer is not None and not writer.schema.equals(table.schema):
+                    writer.close()
+                    writer = None
+                if writer is None:
+                    part_path = spill_dir / f'partition_{p}_{len(parts.get(p, []))}.parquet'
+                    writer = writers[p] = pq.ParquetWriter(part_path, table.schema)
+                    parts.setdefault(p, []).append(part_path)
+
+                writer.write_table(table)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return parts
+
+def aggregate_partition(task: tuple) -> tuple:
+    """
+    Agrupa y ordena una partición con group_data y guarda el resultado ordenado
+
+    Parameters:
+    - task (tuple): (ficheros de desborde de la partición, ruta de salida)
+
+    Returns:
+    - tuple: (ruta de salida, DataFrame con las filas de salida de cada hospital, tipo de las admisiones)
+    """
+    parts, output_path = task
+    df = pd.concat([pd.read_parquet(part) for part in parts], ignore_index=True)
+    grouped = group_data(df)
+    del df
+
+    grouped.to_parquet(output_path, index=False)
+    counts = grouped['hospital'].value_counts(sort=False).rename_axis('hospital').reset_index(name='rows')
+
+    return output_path, counts, grouped['admissions'].dtype
+
+class SortedPartitionReader:
+    """
+    Lee secuencialmente el resultado ordenado de una partición, entregando el número de filas que se pida
+    """
+
+    def __init__(self, path: Path, batch_rows: int):
+        self.batches = pq.ParquetFile(path).iter_batches(batch_size=batch_rows)
+        self.buffer = None
+
+    def take(self, n: int) -> pa.Table:
+        pieces = []
+        while n > 0:
+            if self.buffer is None or self.buffer.num_rows == 0:
+                self.buffer = pa.Table.from_batches([next(self.batches)])
+            piece = self.buffer.slice(0, n)
+            self.buffer = self.buffer.slice(piece.num_rows)
+            pieces.append(piece)
+            n -= piece.num_rows
+
+        return pa.concat_tables(pieces)
+
+def build_chunk(pieces: list, admissions_dtype, start: int) -> pd.DataFrame:
+    """
+    Une los tramos leídos de las particiones en un bloque de salida con el tipo de admisiones común
+    y el índice que le corresponde en la salida completa
+    """
+    chunk = pa.concat_tables(pieces, promote_options='permissive').to_pandas()
+    chunk['admissions'] = chunk['admissions'].astype(admissions_dtype)
+    chunk.index = pd.RangeIndex(start, start + len(chunk))
+
+    return chunk
+
+def group_data_out_of_core(path: str, memory_budget: int = MEMORY_BUDGET_BYTES, n_partitions: int = None,
+                           max_workers: int = 1, transform=None, spill_dir: str = SPILL_DIR, chunk_rows: int = 1_000_000):
+    """
+    Versión fuera de memoria de group_data para datasets que no caben en RAM (p.ej. Colombia o México por minuto):
+    1. Lee el parquet por lotes y reparte las filas por hash del hospital en ficheros parquet de desborde.
+    2. Agrupa y ordena cada partición por separado con group_data (en paralelo si max_workers > 1).
+    3. Devuelve la salida por bloques en el orden global (hospital, fecha), leyendo las particiones ordenadas
+       a la vez, ya que cada hospital está entero en una única partición.
+    Concatenar los bloques da exactamente el mismo DataFrame que group_data sobre el dataset completo.
+    El número de particiones se calcula para que cada una (por proceso) quepa en memory_budget; un único
+    hospital no se puede repartir entre particiones, así que su volumen debe caber en el presupuesto.
+
+    Uso:
+        grouped_df = pd.concat(group_data_out_of_core(path, transform=cast_columns_types))
+
+    Parameters:
+    - path (str): parquet limpio de entrada
+    - memory_budget (int): memoria máxima en bytes para los lotes de lectura y cada partición en memoria
+    - n_partitions (int): número de particiones (por defecto se calcula con el presupuesto)
+    - max_workers (int): procesos que agrupan particiones en paralelo
+    - transform (callable): función aplicada a cada lote antes de agrupar (p.ej. cast_columns_types)
+    - spill_dir (str): carpeta de los ficheros temporales, que se borran al terminar
+    - chunk_rows (int): filas aproximadas de cada bloque devuelto
+
+    Returns:
+    - generator: DataFrames con las filas agrupadas y ordenadas, con índice continuo entre bloques
+    """
+    row_bytes = estimate_row_bytes(path, transform)
+    num_rows = pq.ParquetFile(path).metadata.num_rows
+    workers = max(1, max_workers or 1)
+
+    batch_rows = max(1_000, int(memory_budget / (row_bytes * GROUPBY_MEMORY_FACTOR)))
+    if n_partitions is None:
+        n_partitions = max(1, int(np.ceil(num_rows * row_bytes * GROUPBY_MEMORY_FACTOR * workers / memory_budget)))
+
+    Path(spill_dir).mkdir(parents=True, exist_ok=True)
+    run_dir = Path(tempfile.mkdtemp(prefix='group_', dir=spill_dir))
+    print(f"Agrupando fuera de memoria en {n_partitions} particiones: {path}")
+
+    try:
+        parts = spill_partitions(path, n_partitions, batch_rows, run_dir, transform)
+        tasks = [(parts[p], run_dir / f'grouped_{p}.parquet') for p in sorted(parts)]
+
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(aggregate_partition, tasks))
+        else:
+            results = [aggregate_partition(task) for task in tasks]
+
+        for part_paths in parts.values():
+            for part_path in part_paths:
+                part_path.unlink(missing_ok=True)
+
+        if not results:
+            return
+
+        # En memoria la columna tiene un único tipo para todo el dataset (p.ej. float si algún lote tenía NaN)
+        admissions_dtype = np.result_type(*[dtype for _, _, dtype in results])
+
+        # Orden global de hospitales y partición en la que está cada uno
+        index = pd.concat([counts.assign(partition=i) for i, (_, counts, _) in enumerate(results)], ignore_index=True)
+        index = index.sort_values('hospital', kind='stable')
+        readers = [SortedPartitionReader(output_path, chunk_rows) for output_path, _, _ in results]
+
+        # Tramos consecutivos de hospitales de la misma partición se leen de una vez
+        partitions = index['partition'].to_numpy()
+        rows = index['rows'].to_numpy()
+        run_starts = np.flatnonzero(np.r_[True, partitions[1:] != partitions[:-1]])
+        run_rows = np.add.reduceat(rows, run_starts) if len(rows) else np.empty(0, dtype=np.int64)
+
+        start = 0
+        pieces = []
+        pending = 0
+        for run_start, n in zip(run_starts, run_rows):
+            pieces.append(readers[partitions[run_start]].take(int(n)))
+            pending += int(n)
+            if pending >= chunk_rows:
+                chunk = build_chunk(pieces, admissions_dtype, start)
+                start += len(chunk)
+                pieces, pending = [], 0
+                yield chunk
+
+        if pieces:
+            yield build_chunk(pieces, admissions_dtype, start)
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
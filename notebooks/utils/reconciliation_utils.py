@@ -0,0 +1,202 @@
+import pandas as pd
+import numpy as np
+import scipy.sparse as sp
+from utils.hospital_registry_utils import load_hospital_registry
+
+RECONCILIATION_METHODS = ['bottom_up', 'ols', 'wls_struct', 'mint_shrink']
+
+def build_summing_matrix(hierarchy: pd.DataFrame, levels: list, bottom_col: str = 'hospital') -> tuple:
+    """
+    Construye la matriz de agregación S (dispersa) de una jerarquía hospital -> región -> país a partir
+    de los metadatos de los hospitales. Las filas de S son primero los nodos agregados (de la lista levels,
+    en ese orden) y después los hospitales; las columnas son los hospitales.
+
+    Parameters:
+    - hierarchy (pd.DataFrame): una fila por hospital con la columna bottom_col y una columna por nivel
+    - levels (list): columnas de los niveles agregados (p.ej. ['country', 'region'])
+    - bottom_col (str): columna con el hospital
+
+    Returns:
+    - tuple: (S como scipy.sparse.csr_matrix de forma (n, m), DataFrame de nodos con columnas ['level', 'key'])
+    """
+    if hierarchy[bottom_col].duplicated().any():
+        raise ValueError(f"La columna '{bottom_col}' tiene hospitales repetidos")
+
+    m = len(hierarchy)
+    blocks = []
+    nodes = []
+
+    for level in levels:
+        codes, uniques = pd.factorize(hierarchy[level])
+        if (codes < 0).any():
+            raise ValueError(f"Hay hospitales sin valor en el nivel '{level}'")
+        blocks.append(sp.csr_matrix((np.ones(m), (codes, np.arange(m))), shape=(len(uniques), m)))
+        nodes.append(pd.DataFrame({'level': level, 'key': uniques}))
+
+    blocks.append(sp.identity(m, format='csr'))
+    nodes.append(pd.DataFrame({'level': bottom_col, 'key': hierarchy[bottom_col].to_numpy()}))
+
+    S = sp.vstack(blocks, format='csr')
+    nodes = pd.concat(nodes, ignore_index=True)
+
+    return S, nodes
+
+def hierarchy_from_registry(source: str, levels: list) -> pd.DataFrame:
+    """
+    Devuelve la jerarquía de los hospitales de una fuente a partir de los metadatos del registro global
+    (p.ej. 'region' y 'country' registrados con register_hospitals)
+
+    Parameters:
+    - source (str): fuente del registro
+    - levels (list): columnas de metadatos que forman los niveles agregados
+
+    Returns:
+    - pd.DataFrame: columnas ['hospital'] + levels, con el hospital como identificador del registro
+    """
+    registry = load_hospital_registry()
+    missing = [level for level in levels if level not in registry.columns]
+    if missing:
+        raise ValueError(f"El registro no tiene los metadatos: {missing}")
+
+    hierarchy = registry.loc[registry['source'] == source, ['hospital_id'] + levels]
+
+    return hierarchy.rename(columns={'hospital_id': 'hospital'}).reset_index(drop=True)
+
+def aggregate_hierarchy(S: sp.csr_matrix, bottom: np.ndarray) -> np.ndarray:
+    """
+    Calcula las series de todos los nodos a partir de las de los hospitales (S @ bottom)
+
+    Parameters:
+    - S (sp.csr_matrix): matriz de agregación (n, m)
+    - bottom (np.ndarray): valores de los hospitales, de forma (m, T)
+
+    Returns:
+    - np.ndarray: valores de todos los nodos, de forma (n, T)
+    """
+    return np.asarray(S @ bottom)
+
+def shrinkage_lambda(residuals: np.ndarray) -> float:
+    """
+    Intensidad de shrinkage de Schäfer-Strimmer de la covarianza de los residuos hacia su diagonal.
+    Las sumas sobre todos los pares (i, j) se calculan con la matriz T x T de los residuos estandarizados,
+    sin formar la matriz n x n de correlaciones.
+
+    Parameters:
+    - residuals (np.ndarray): residuos dentro de muestra, de forma (T, n)
+
+    Returns:
+    - float: lambda entre 0 y 1
+    """
+    T = residuals.shape[0]
+    std = residuals.std(axis=0, ddof=1)
+    std[std == 0] = 1.0
+    X = (residuals - residuals.mean(axis=0)) / std
+
+    gram = X @ X.T                                  # (T, T)
+    squares = (X ** 2).sum(axis=1)                  # sum_i x_ti^2 para cada t
+
+    # Suma de r_ij^2 y de Var(r_ij) para i != j
+    sum_w_bar_sq = (gram ** 2).sum() / T ** 2       # sum_ij (media_t x_ti x_tj)^2
+    diag_w_bar_sq = (((X ** 2).mean(axis=0)) ** 2).sum()
+    sum_w_sq = (squares ** 2).sum()                 # sum_ij sum_t (x_ti x_tj)^2
+    diag_w_sq = (X ** 4).sum()
+
+    off_r_sq = (sum_w_bar_sq - diag_w_bar_sq) * (T / (T - 1)) ** 2
+    off_var = ((sum_w_sq - diag_w_sq) - T * (sum_w_bar_sq - diag_w_bar_sq)) * T / (T - 1) ** 3
+
+    if off_r_sq <= 0:
+        return 1.0
+
+    return float(np.clip(off_var / off_r_sq, 0.0, 1.0))
+
+def reconcile_forecasts(base: np.ndarray, S: sp.csr_matrix, method: str = 'mint_shrink', residuals: np.ndarray = None) -> np.ndarray:
+    """
+    Reconcilia las predicciones base de todos los nodos de la jerarquía a la vez, para todos los horizontes.
+    Se usa la proyección y - W C' (C W C')^-1 C y con C = [I, -A] (restricciones de suma), equivalente a
+    S (S' W^-1 S)^-1 S' W^-1 y; solo se resuelve un sistema del tamaño del número de nodos agregados y
+    W nunca se forma como matriz densa n x n.
+
+    Parameters:
+    - base (np.ndarray): predicciones base de todos los nodos (filas en el orden de S), de forma (n, h)
+    - S (sp.csr_matrix): matriz de agregación de build_summing_matrix
+    - method (str): 'bottom_up', 'ols', 'wls_struct' (W = nº de hospitales por nodo) o 'mint_shrink'
+    - residuals (np.ndarray): residuos dentro de muestra de todos los nodos, de forma (T, n) (solo 'mint_shrink')
+
+    Returns:
+    - np.ndarray: predicciones coherentes de todos los nodos, de forma (n, h)
+    """
+    if method not in RECONCILIATION_METHODS:
+        raise ValueError(f"Método no soportado: {method}")
+
+    base = np.asarray(base, dtype=float)
+    squeeze = base.ndim == 1
+    if squeeze:
+        base = base[:, None]
+
+    n, m = S.shape
+    na = n - m
+    if base.shape[0] != n:
+        raise ValueError(f"Las predicciones base tienen {base.shape[0]} filas y la jerarquía {n} nodos")
+
+    if method == 'bottom_up' or na == 0:
+        reconciled = np.asarray(S @ base[na:])
+        return reconciled[:, 0] if squeeze else reconciled
+
+    A = S[:na]
+    C = sp.hstack([sp.identity(na, format='csr'), -A], format='csr')     # (na, n)
+    Cy = np.asarray(C @ base)                                            # (na, h)
+
+    if method == 'ols':
+        WCt = C.T.tocsr()
+        CWCt = (C @ C.T).toarray()
+    elif method == 'wls_struct':
+        w = np.asarray(S.sum(axis=1)).ravel()
+        WCt = sp.diags(w) @ C.T
+        CWCt = (C @ WCt).toarray()
+    else:
+        if residuals is None or residuals.shape[1] != n:
+            raise ValueError("'mint_shrink' necesita los residuos de todos los nodos, de forma (T, n)")
+
+        # W = lambda diag(Sigma) + (1 - lambda) Sigma, con Sigma = R'R / T; W C' se calcula como D C' + R'(R C')
+        T = residuals.shape[0]
+        R = residuals - residuals.mean(axis=0)
+        lam = shrinkage_lambda(residuals)
+        variances = (R ** 2).sum(axis=0) / T
+
+        RCt = np.asarray((C @ R.T).T)                                   # (T, na)
+        DCt = sp.diags(variances) @ C.T
+        WCt = lam * DCt.toarray() + (1 - lam) / T * (R.T @ RCt)             # (n, na)
+        CWCt = lam * (C @ DCt).toarray() + (1 - lam) / T * (RCt.T @ RCt)
+
+    correction = np.linalg.solve(CWCt, Cy)                              # (na, h)
+    reconciled = base - np.asarray(WCt @ correction)
+
+    return reconciled[:, 0] if squeeze else reconciled
+
+def reconcile_frame(base: pd.DataFrame, hierarchy: pd.DataFrame, levels: list, method: str = 'mint_shrink',
+                    residuals: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Versión con DataFrames de reconcile_forecasts: las predicciones base tienen una fila por nodo
+    (índice (level, key), como el DataFrame de nodos de build_summing_matrix) y una columna por horizonte
+
+    Parameters:
+    - base (pd.DataFrame): predicciones base con índice (level, key)
+    - hierarchy (pd.DataFrame): metadatos de los hospitales (columna 'hospital' y una columna por nivel)
+    - levels (list): niveles agregados
+    - method (str): método de reconciliación
+    - residuals (pd.DataFrame): residuos con una columna por nodo (columnas (level, key)) y una fila por periodo
+
+    Returns:
+    - pd.DataFrame: predicciones coherentes con el mismo índice y columnas que base
+    """
+    S, nodes = build_summing_matrix(hierarchy, levels)
+    index = pd.MultiIndex.from_frame(nodes)
+
+    base_values = base.reindex(index).to_numpy(dtype=float)
+    if np.isnan(base_values).any():
+        raise ValueError("Faltan predicciones base para algunos nodos de la jerarquía")
+
+    residual_values = residuals.reindex(columns=index).to_numpy(dtype=float) if residuals is not None else None
+    reconciled = reconcile_forecasts(base_values, S, method, residual_values)
+
+    return pd.DataFrame(reconciled, index=index, columns=base.columns)
@@ -0,0 +1,153 @@
+import pandas as pd
+import numpy as np
+from pathlib import Path
+
+ROLLUP_DIR = '../datasets/processed_datasets/rollups/'
+
+# Resoluciones de la más fina a la más gruesa y resolución de la que se agrega cada una
+ROLLUP_RESOLUTIONS = ['minute', 'hour', 'day', 'week', 'month']
+ROLLUP_PARENTS = {'hour': 'minute', 'day': 'hour', 'week': 'day', 'month': 'day'}
+
+def floor_times(times: pd.Series, resolution: str) -> pd.Series:
+    """
+    Trunca una serie de fechas al inicio de su periodo (las semanas empiezan en lunes). Con zona horaria se
+    trunca la hora local, igual que aggregate_data, de forma que los días empiezan a medianoche local y no UTC.
+
+    Parameters:
+    - times (pd.Series): fechas, con o sin zona horaria
+    - resolution (str): 'minute', 'hour', 'day', 'week' o 'month'
+
+    Returns:
+    - pd.Series: fechas truncadas, con la misma zona horaria que la entrada
+    """
+    if resolution not in ROLLUP_RESOLUTIONS:
+        raise ValueError(f"Resolución no soportada: {resolution}")
+
+    tz = times.dt.tz
+    values = (times.dt.tz_localize(None) if tz is not None else times).to_numpy(dtype='datetime64[ns]')
+
+    if resolution == 'minute':
+        floored = values.astype('datetime64[m]')
+    elif resolution == 'hour':
+        floored = values.astype('datetime64[h]')
+    elif resolution == 'day':
+        floored = values.astype('datetime64[D]')
+    elif resolution == 'week':
+        # El 1970-01-01 fue jueves: se desplaza 3 días para que las semanas empiecen en lunes
+        days = values.astype('datetime64[D]').astype(np.int64)
+        floored = (days - (days + 3) % 7).astype('datetime64[D]')
+    else:
+        floored = values.astype('datetime64[M]')
+
+    # La aritmética de semanas convierte NaT en una fecha: se restauran los nulos
+    floored = floored.astype('datetime64[ns]')
+    floored[np.isnat(values)] = np.datetime64('NaT')
+    floored = pd.Series(floored, index=times.index)
+    if tz is not None:
+        # En el cambio de hora de otoño la hora local repetida se resuelve con el desfase UTC de la fecha original;
+        # una hora local que no existe por el cambio de primavera pasa a la primera hora válida
+        offset = (times.dt.tz_localize(None) - times.dt.tz_convert(None)).to_numpy()
+        as_dst = floored.dt.tz_localize(tz, ambiguous=np.ones(len(floored), dtype=bool), nonexistent='shift_forward')
+        as_std = floored.dt.tz_localize(tz, ambiguous=np.zeros(len(floored), dtype=bool), nonexistent='shift_forward')
+        std_offset = (as_std.dt.tz_localize(None) - as_std.dt.tz_convert(None)).to_numpy()
+        floored = as_std.where(std_offset == offset, as_dst)
+
+    return floored
+
+def native_resolution(times: pd.Series) -> str:
+    """
+    Devuelve la resolución más gruesa que no pierde información de la serie de fechas
+    ('minute' para Colombia o México, 'hour' para Cardiff o Iowa, 'day' para el resto)
+
+    Parameters:
+    - times (pd.Series): fechas
+
+    Returns:
+    - str: resolución nativa
+    """
+    times = times.dropna()
+    for resolution in ['day', 'hour']:
+        if (floor_times(times, resolution) == times).all():
+            return resolution
+
+    return 'minute'
+
+def build_rollups(df: pd.DataFrame, name: str, resolutions: list = None, save: bool = True) -> dict:
+    """
+    Materializa las admisiones por hospital en varias resoluciones, además del total del dataset (país),
+    a partir de la salida de group_data. Cada resolución se agrega de la anterior (minuto -> hora -> día,
+    y semana y mes desde el día), así que los millones de filas por minuto solo se recorren una vez.
+
+    Parameters:
+    - df (pd.DataFrame): DataFrame con columnas ['hospital', 'date' o 'datetime', 'admissions']
+    - name (str): nombre del dataset
+    - resolutions (list): resoluciones a materializar (por defecto todas las que no son más finas que la nativa)
+    - save (bool): guarda cada resolución en ROLLUP_DIR/{name}/
+
+    Returns:
+    - dict: resolución -> DataFrame por hospital; las claves '{resolución}_country' tienen los totales
+    """
+    time_col = 'datetime' if 'datetime' in df.columns else 'date'
+    times = df[time_col]
+
+    native = native_resolution(times)
+    available = ROLLUP_RESOLUTIONS[ROLLUP_RESOLUTIONS.index(native):]
+    resolutions = [r for r in (resolutions or available) if r in available]
+
+    # Se materializan también las resoluciones intermedias necesarias para agregar las pedidas
+    needed = set(resolutions)
+    for resolution in list(needed):
+        while resolution in ROLLUP_PARENTS and ROLLUP_PARENTS[resolution] in available:
+            resolution = ROLLUP_PARENTS[resolution]
+            needed.add(resolution)
+
+    base = pd.DataFrame({'hospital': df['hospital'].to_numpy(), 'period': times, 'admissions': df['admissions'].to_numpy()})
+    base = base.dropna(subset=['period'])
+
+    cubes = {}
+    for resolution in [r for r in available if r in needed]:
+        parent = ROLLUP_PARENTS.get(resolution)
+        source = cubes[parent] if parent in cubes else base
+
+        grouped = source.assign(period=floor_times(source['period'], resolution))
+        cubes[resolution] = grouped.groupby(['hospital', 'period'], as_index=False, sort=True)['admissions'].sum()
+
+    rollups = {}
+    for resolution in resolutions:
+        out_col = 'datetime' if resolution in ('minute', 'hour') else 'date'
+        df_hospital = cubes[resolution].rename(columns={'period': out_col})
+        df_country = df_hospital.groupby(out_col, as_index=False, sort=True)['admissions'].sum()
+        df_country.insert(0, 'country', name)
+
+        rollups[resolution] = df_hospital
+        rollups[f'{resolution}_country'] = df_country
+
+    if save:
+        output_dir = Path(ROLLUP_DIR) / name
+        output_dir.mkdir(parents=True, exist_ok=True)
+        for key, df_rollup in rollups.items():
+            df_rollup.to_parquet(output_dir / f'{key}.parquet', index=False)
+
+        print(f"Rollups de '{name}' guardados en: {output_dir} ({', '.join(resolutions)})")
+
+    return rollups
+
+def read_rollup(name: str, resolution: str, country: bool = False, columns: list = None) -> pd.DataFrame:
+    """
+    Lee una resolución materializada por build_rollups
+
+    Parameters:
+    - name (str): nombre del dataset
+    - resolution (str): 'minute', 'hour', 'day', 'week' o 'month'
+    - country (bool): devuelve el total del dataset en lugar del detalle por hospital
+    - columns (list): columnas a leer (por defecto todas)
+
+    Returns:
+    - pd.DataFrame: admisiones agregadas en la resolución pedida
+    """
+    key = f'{resolution}_country' if country else resolution
+    path = Path(ROLLUP_DIR) / name / f'{key}.parquet'
+    if not path.exists():
+        raise FileNotFoundError(f"No existe el rollup '{key}' de '{name}'")
+
+    return pd.read_parquet(path, columns=columns)
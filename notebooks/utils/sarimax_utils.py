@@ -0,0 +1,262 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import pickle
+import time
+import warnings
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+from utils.data_preprocessing_utils import FEATURE_COLUMNS, read_processed_files
+from utils.backtesting_utils import prepare_hospital_arrays
+
+MODEL_CACHE_DIR = '../datasets/model_cache/'
+
+def hash_arrays(*arrays: np.ndarray) -> str:
+    """
+    Calcula un hash del contenido de los arrays para detectar cambios en los datos
+
+    Parameters:
+    - arrays (np.ndarray): arrays a incluir en el hash
+
+    Returns:
+    - str: hash hexadecimal
+    """
+    h = hashlib.sha256()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        h.update(str(array.shape).encode())
+        h.update(array.tobytes())
+
+    return h.hexdigest()
+
+def get_cache_path(dataset: str, hospital: str, order: tuple, seasonal_order: tuple) -> Path:
+    """
+    Devuelve la ruta del fichero de caché de un modelo. Cada fichero guarda el último ajuste de
+    (dataset, hospital, orden) junto al hash de los datos con los que se ajustó.
+
+    Parameters:
+    - dataset (str): nombre del dataset
+    - hospital (str): nombre del hospital
+    - order (tuple): orden (p, d, q)
+    - seasonal_order (tuple): orden estacional (P, D, Q, s)
+
+    Returns:
+    - Path: ruta del fichero pickle
+    """
+    hospital_key = hashlib.md5(str(hospital).encode()).hexdigest()
+    order_key = '_'.join(map(str, tuple(order) + tuple(seasonal_order)))
+
+    return Path(MODEL_CACHE_DIR) / dataset / f"{hospital_key}_{order_key}.pkl"
+
+def load_fitted_model(dataset: str, hospital: str, order: tuple = (1, 0, 1), seasonal_order: tuple = (1, 0, 1, 7)) -> dict:
+    """
+    Lee de la caché el último ajuste de un hospital
+
+    Parameters:
+    - dataset (str): nombre del dataset
+    - hospital (str): nombre del hospital
+    - order (tuple): orden (p, d, q)
+    - seasonal_order (tuple): orden estacional (P, D, Q, s)
+
+    Returns:
+    - dict: parámetros y metadatos del ajuste, o None si no existe
+    """
+    path = get_cache_path(dataset, hospital, order, seasonal_order)
+    if not path.exists():
+        return None
+
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def save_fitted_model(entry: dict) -> None:
+    """
+    Guarda en la caché el ajuste de un hospital
+
+    Parameters:
+    - entry (dict): diccionario devuelto por fit_sarimax
+    """
+    path = get_cache_path(entry['dataset'], entry['hospital'], entry['order'], entry['seasonal_order'])
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Se escribe a un fichero temporal y se renombra para no dejar entradas corruptas
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp_path.replace(path)
+
+def drop_missing_rows(y: np.ndarray, X: np.ndarray) -> tuple:
+    """
+    Elimina las filas iniciales sin lags (NaN) que SARIMAX no admite en las exógenas
+    """
+    mask = np.isfinite(y) & np.isfinite(X).all(axis=1)
+
+    return y[mask], X[mask]
+
+def fit_sarimax(y: np.ndarray, X: np.ndarray, order: tuple, seasonal_order: tuple, start_params: np.ndarray = None, maxiter: int = 50) -> dict:
+    """
+    Ajusta un modelo SARIMAX con variables exógenas, opcionalmente partiendo de parámetros previos
+
+    Parameters:
+    - y (np.ndarray): admisiones
+    - X (np.ndarray): matriz de variables exógenas
+    - order (tuple): orden (p, d, q)
+    - seasonal_order (tuple): orden estacional (P, D, Q, s)
+    - start_params (np.ndarray): parámetros iniciales (warm start)
+    - maxiter (int): número máximo de iteraciones del optimizador
+
+    Returns:
+    - dict: parámetros y métricas del ajuste
+    """
+    model = SARIMAX(y, exog=X, order=order, seasonal_order=seasonal_order,
+                    enforce_stationarity=False, enforce_invertibility=False)
+
+    # Si los parámetros previos no encajan con el modelo se hace un ajuste desde cero
+    if start_params is not None and len(start_params) != len(model.start_params):
+        start_params = None
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        results = model.fit(start_params=start_params, disp=False, maxiter=maxiter)
+
+    return {
+        'params': np.asarray(results.params),
+        'param_names': list(model.param_names),
+        'aic': results.aic,
+        'nobs': int(results.nobs)
+    }
+
+def is_extension(previous: dict, y: np.ndarray, X: np.ndarray) -> bool:
+    """
+    Comprueba si la serie actual es la del ajuste anterior con observaciones añadidas al final,
+    comparando el hash de sus primeras filas con el guardado en la caché
+    """
+    nobs = previous['nobs']
+
+    return len(y) >= nobs and hash_arrays(y[:nobs], X[:nobs]) == previous['data_hash']
+
+def fit_hospital(task: tuple) -> dict:
+    """
+    Ajusta (o reutiliza de la caché) el modelo SARIMAX de un hospital
+
+    Parameters:
+    - task (tuple): (dataset, hospital, tiempos, admisiones, matriz exógena, orden, orden estacional, forzar)
+
+    Returns:
+    - dict: resumen del ajuste con su estado ('cache', 'warm' o 'cold')
+    """
+    dataset, hospital, times, y, X, order, seasonal_order, force = task
+    y, X = drop_missing_rows(y, X)
+    data_hash = hash_arrays(y, X)
+
+    summary = {'dataset': dataset, 'hospital': hospital, 'nobs': len(y)}
+    previous = load_fitted_model(dataset, hospital, order, seasonal_order)
+
+    # Los datos no han cambiado desde el último ajuste
+    if previous is not None and previous['data_hash'] == data_hash and not force:
+        return {**summary, 'status': 'cache', 'aic': previous['aic'], 'fit_time': 0.0}
+
+    if len(y) < 2 * seasonal_order[3] + X.shape[1]:
+        return {**summary, 'status': 'skipped', 'aic': np.nan, 'fit_time': 0.0}
+
+    # Solo se parte de los parámetros anteriores si los datos nuevos amplían la serie ya ajustada; si han
+    # cambiado filas anteriores (correcciones, otro preprocesado...) se ajusta desde cero
+    start_params = None
+    if previous is not None and is_extension(previous, y, X):
+        start_params = previous['params']
+
+    start = time.perf_counter()
+    try:
+        fit = fit_sarimax(y, X, order, seasonal_order, start_params=start_params)
+    except Exception as e:
+        print(f"Error al ajustar '{hospital}' ({dataset}): {e}")
+        return {**summary, 'status': 'error', 'aic': np.nan, 'fit_time': time.perf_counter() - start}
+    fit_time = time.perf_counter() - start
+
+    entry = {
+        **fit,
+        'dataset': dataset,
+        'hospital': hospital,
+        'order': tuple(order),
+        'seasonal_order': tuple(seasonal_order),
+        'data_hash': data_hash,
+        'nobs': len(y),
+        'last_time': times[-1] if len(times) else None
+    }
+    save_fitted_model(entry)
+
+    return {**summary, 'status': 'warm' if start_params is not None else 'cold', 'aic': fit['aic'], 'fit_time': fit_time}
+
+def fit_all_hospitals(datasets: list = None, order: tuple = (1, 0, 1), seasonal_order: tuple = (1, 0, 1, 7), max_workers: int = None, force: bool = False) -> pd.DataFrame:
+    """
+    Ajusta un SARIMAX por hospital para todos los datasets procesados en un pool de procesos.
+    Solo se reajustan los hospitales cuyos datos han cambiado, partiendo de los parámetros anteriores
+    si solo se han añadido observaciones nuevas.
+
+    Parameters:
+    - datasets (list): rutas de los parquet (por defecto todos los de processed_datasets)
+    - order (tuple): orden (p, d, q)
+    - seasonal_order (tuple): orden estacional (P, D, Q, s)
+    - max_workers (int): número de procesos; con 1 se ejecuta en el proceso actual
+    - force (bool): reajusta aunque los datos no hayan cambiado
+
+    Returns:
+    - pd.DataFrame: resumen por hospital con columnas ['dataset', 'hospital', 'nobs', 'status', 'aic', 'fit_time']
+    """
+    datasets = datasets if datasets is not None else read_processed_files()
+    tasks = []
+
+    for path in datasets:
+        name = Path(path).stem
+        df = pd.read_parquet(path)
+
+        hospitals, offsets, times, y, X = prepare_hospital_arrays(df, FEATURE_COLUMNS)
+        for i, hospital in enumerate(hospitals):
+            rows = slice(offsets[i], offsets[i + 1])
+            tasks.append((name, hospital, times[rows], y[rows], X[rows], order, seasonal_order, force))
+
+    if max_workers == 1:
+        summaries = [fit_hospital(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            summaries = list(executor.map(fit_hospital, tasks))
+
+    df_summary = pd.DataFrame(summaries)
+
+    print(f"Modelos ajustados: {df_summary['status'].value_counts().to_dict()}")
+    return df_summary
+
+def filter_sarimax(entry: dict, y: np.ndarray, X: np.ndarray):
+    """
+    Filtra la serie con los parámetros guardados de un modelo, sin volver a optimizar
+
+    Parameters:
+    - entry (dict): ajuste devuelto por load_fitted_model
+    - y (np.ndarray): admisiones históricas
+    - X (np.ndarray): variables exógenas históricas
+
+    Returns:
+    - resultados de statsmodels listos para forecast o extend
+    """
+    y, X = drop_missing_rows(y, X)
+    model = SARIMAX(y, exog=X, order=entry['order'], seasonal_order=entry['seasonal_order'],
+                    enforce_stationarity=False, enforce_invertibility=False)
+
+    return model.filter(entry['params'])
+
+def forecast_sarimax(entry: dict, y: np.ndarray, X: np.ndarray, X_future: np.ndarray) -> np.ndarray:
+    """
+    Predice con un modelo de la caché filtrando la serie con los parámetros guardados, sin volver a optimizar
+
+    Parameters:
+    - entry (dict): ajuste devuelto por load_fitted_model
+    - y (np.ndarray): admisiones históricas
+    - X (np.ndarray): variables exógenas históricas
+    - X_future (np.ndarray): variables exógenas del horizonte a predecir
+
+    Returns:
+    - np.ndarray: predicciones para cada fila de X_future
+    """
+    results = filter_sarimax(entry, y, X)
+
+    return np.asarray(results.forecast(steps=len(X_future), exog=X_future))
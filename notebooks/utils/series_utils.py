@@ -0,0 +1,217 @@
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+class HospitalSeries:
+    """
+    Series temporales de todos los hospitales de un dataset en formato CSR: los tiempos y cada columna
+    de valores son arrays contiguos ordenados por hospital y fecha, y offsets[i]:offsets[i + 1] delimita
+    las filas del hospital i. Acceder a un hospital devuelve vistas (O(1)) y las reducciones entre
+    hospitales se hacen con reduceat sobre los arrays completos, sin crear un objeto pandas por hospital.
+    """
+
+    __slots__ = ('hospitals', 'offsets', 'times', 'columns', 'time_col', 'tz', '_positions')
+
+    def __init__(self, hospitals: np.ndarray, offsets: np.ndarray, times: np.ndarray, columns: dict,
+                 time_col: str = 'date', tz=None):
+        if len(offsets) != len(hospitals) + 1 or offsets[-1] != len(times):
+            raise ValueError("Los offsets no coinciden con el número de hospitales y de filas")
+        for col, values in columns.items():
+            if len(values) != len(times):
+                raise ValueError(f"La columna '{col}' no tiene la misma longitud que los tiempos")
+
+        self.hospitals = np.asarray(hospitals)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.times = np.asarray(times, dtype='datetime64[ns]')
+        self.columns = columns
+        self.time_col = time_col
+        self.tz = tz
+        self._positions = {h: i for i, h in enumerate(self.hospitals.tolist())}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, columns: list = None) -> 'HospitalSeries':
+        """
+        Construye el contenedor desde el DataFrame largo ['hospital', 'date' o 'datetime', ...]
+
+        Parameters:
+        - df (pd.DataFrame): DataFrame largo
+        - columns (list): columnas numéricas a incluir (por defecto todas)
+
+        Returns:
+        - HospitalSeries: contenedor con los datos ordenados por hospital y fecha
+        """
+        time_col = 'datetime' if 'datetime' in df.columns else 'date'
+        if columns is None:
+            columns = [col for col in df.columns if col not in ('hospital', time_col) and pd.api.types.is_numeric_dtype(df[col])]
+
+        df = df.sort_values(['hospital', time_col], kind='stable')
+        codes, hospitals = pd.factorize(df['hospital'], sort=True)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(hospitals)))])
+
+        times = df[time_col]
+        tz = times.dt.tz
+        if tz is not None:
+            times = times.dt.tz_convert(None)
+
+        return cls(
+            hospitals=np.asarray(hospitals),
+            offsets=offsets,
+            times=times.to_numpy(dtype='datetime64[ns]'),
+            columns={col: np.ascontiguousarray(df[col].to_numpy()) for col in columns},
+            time_col=time_col,
+            tz=tz
+        )
+
+    @classmethod
+    def from_arrow(cls, table: pa.Table, columns: list = None) -> 'HospitalSeries':
+        """
+        Construye el contenedor desde una tabla Arrow con el mismo esquema que el DataFrame largo
+        """
+        return cls.from_frame(table.to_pandas(), columns)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Devuelve el DataFrame largo ['hospital', 'date' o 'datetime', ...]
+        """
+        times = pd.Series(self.times)
+        if self.tz is not None:
+            times = times.dt.tz_localize('UTC').dt.tz_convert(self.tz)
+
+        df = pd.DataFrame({'hospital': np.repeat(self.hospitals, self.lengths), self.time_col: times})
+        for col, values in self.columns.items():
+            df[col] = values
+
+        return df
+
+    def to_arrow(self) -> pa.Table:
+        """
+        Devuelve una tabla Arrow; el hospital se guarda como diccionario (índice int32 por fila y nombres una sola vez)
+        """
+        indices = np.repeat(np.arange(len(self.hospitals), dtype=np.int32), self.lengths)
+        hospital = pa.DictionaryArray.from_arrays(pa.array(indices), pa.array(self.hospitals.tolist()))
+
+        time_type = pa.timestamp('ns', tz=str(self.tz) if self.tz is not None else None)
+        arrays = [hospital, pa.array(self.times).cast(time_type)]
+        arrays += [pa.array(values) for values in self.columns.values()]
+
+        return pa.Table.from_arrays(arrays, names=['hospital', self.time_col] + list(self.columns))
+
+    def __len__(self) -> int:
+        return len(self.hospitals)
+
+    def __contains__(self, hospital) -> bool:
+        return hospital in self._positions
+
+    def __getitem__(self, hospital) -> dict:
+        """
+        Devuelve los tiempos y columnas de un hospital como vistas (sin copia)
+        """
+        if hospital not in self._positions:
+            raise KeyError(f"El hospital '{hospital}' no existe")
+
+        rows = self.rows(self._positions[hospital])
+        return {self.time_col: self.times[rows], **{col: values[rows] for col, values in self.columns.items()}}
+
+    def rows(self, i: int) -> slice:
+        """
+        Devuelve el slice de filas del hospital en la posición i
+        """
+        return slice(self.offsets[i], self.offsets[i + 1])
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.offsets[-1])
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + self.times.nbytes + sum(values.nbytes for values in self.columns.values())
+
+    def select(self, hospitals: list) -> 'HospitalSeries':
+        """
+        Devuelve un contenedor nuevo solo con los hospitales indicados, en ese orden
+
+        Parameters:
+        - hospitals (list): hospitales a incluir
+
+        Returns:
+        - HospitalSeries: contenedor con copias contiguas de los tramos seleccionados
+        """
+        positions = [self._positions[h] for h in hospitals]
+        rows = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in positions]) if positions else np.empty(0, dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(self.lengths[positions])]) if positions else np.zeros(1, dtype=np.int64)
+
+        return HospitalSeries(
+            hospitals=self.hospitals[positions],
+            offsets=offsets,
+            times=self.times[rows],
+            columns={col: values[rows] for col, values in self.columns.items()},
+            time_col=self.time_col,
+            tz=self.tz
+        )
+
+    def reduce(self, column: str = 'admissions', op: str = 'sum') -> pd.Series:
+        """
+        Calcula una reducción por hospital sobre todo el array a la vez, ignorando los NaN
+
+        Parameters:
+        - column (str): columna a reducir
+        - op (str): 'sum', 'count', 'mean', 'min', 'max', 'first' o 'last'
+
+        Returns:
+        - pd.Series: un valor por hospital (NaN para hospitales sin datos)
+        """
+        if column not in self.columns:
+            raise ValueError(f"La columna '{column}' no existe")
+
+        values = self.columns[column].astype(np.float64, copy=False)
+        lengths = self.lengths
+        non_empty = lengths > 0
+        starts = self.offsets[:-1][non_empty]
+        result = np.full(len(self.hospitals), np.nan)
+
+        # reduceat no admite tramos vacíos, así que solo se reduce sobre los hospitales con datos
+        if op in ('sum', 'count', 'mean'):
+            valid = ~np.isnan(values)
+            sums = np.add.reduceat(np.where(valid, values, 0.0), starts) if len(starts) else np.empty(0)
+            counts = np.add.reduceat(valid.astype(np.int64), starts) if len(starts) else np.empty(0)
+            if op == 'sum':
+                result[non_empty] = sums
+            elif op == 'count':
+                result[non_empty] = counts
+            else:
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    result[non_empty] = sums / counts
+        elif op in ('min', 'max'):
+            ufunc = np.fmin if op == 'min' else np.fmax
+            if len(starts):
+                result[non_empty] = ufunc.reduceat(values, starts)
+        elif op == 'first':
+            result[non_empty] = values[starts]
+        elif op == 'last':
+            result[non_empty] = values[self.offsets[1:][non_empty] - 1]
+        else:
+            raise ValueError(f"Operación no soportada: {op}")
+
+        return pd.Series(result, index=pd.Index(self.hospitals, name='hospital'), name=f'{column}_{op}')
+
+def load_hospital_series(path: str, columns: list = None) -> HospitalSeries:
+    """
+    Lee un parquet procesado directamente como HospitalSeries
+
+    Parameters:
+    - path (str): ruta del parquet
+    - columns (list): columnas de valores a leer (por defecto todas)
+
+    Returns:
+    - HospitalSeries: contenedor con los datos del parquet
+    """
+    schema = pq.read_schema(path)
+    time_col = 'datetime' if 'datetime' in schema.names else 'date'
+    read_columns = None if columns is None else ['hospital', time_col] + list(columns)
+
+    return HospitalSeries.from_arrow(pq.read_table(path, columns=read_columns), columns)
@@ -0,0 +1,380 @@
+import pandas as pd
+import numpy as np
+import json
+import threading
+import time
+import warnings
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+from utils.data_preprocessing_utils import FEATURE_COLUMNS, read_processed_files
+from utils.backtesting_utils import prepare_hospital_arrays, seasonal_naive_model
+from utils.sarimax_utils import load_fitted_model, filter_sarimax
+from utils.streaming_utils import get_season
+
+class ForecastCache:
+    """
+    Caché LRU con caducidad (TTL) de las predicciones por (dataset, hospital, horizonte)
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple):
+        entry = self.entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: tuple, value) -> None:
+        self.entries[key] = (time.monotonic(), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, dataset: str, hospital) -> None:
+        """
+        Elimina todas las predicciones de un hospital (todos los horizontes)
+        """
+        for key in [k for k in self.entries if k[0] == dataset and k[1] == hospital]:
+            del self.entries[key]
+
+class HospitalModel:
+    """
+    Historia y modelo filtrado de un hospital, residentes en memoria
+    """
+
+    __slots__ = ('times', 'y', 'step', 'entry', 'results')
+
+    def __init__(self, times: np.ndarray, y: np.ndarray, step: np.timedelta64, entry: dict, results):
+        self.times = times
+        self.y = y
+        self.step = step
+        self.entry = entry
+        self.results = results
+
+def next_features(time_value: np.datetime64, history: list) -> list:
+    """
+    Calcula las features de FEATURE_COLUMNS de un periodo a partir de los valores anteriores
+    (históricos y predichos), con la misma definición que aggregate_data
+    """
+    day = time_value.astype('datetime64[D]')
+    day_of_week = int((day.astype(np.int64) + 3) % 7)
+    values = {
+        'day_of_week': day_of_week,
+        'is_weekend': int(day_of_week >= 5),
+        'season': get_season(day),
+        'lag_7': history[-7] if len(history) >= 7 else np.nan,
+        'lag_14': history[-14] if len(history) >= 14 else np.nan,
+        'rolling_7': float(np.mean(history[-7:])) if len(history) >= 7 else np.nan,
+        'rolling_14': float(np.mean(history[-14:])) if len(history) >= 14 else np.nan
+    }
+
+    return [values[col] for col in FEATURE_COLUMNS]
+
+class ForecastService:
+    """
+    Servicio de predicción en memoria: carga una vez las series procesadas y los modelos SARIMAX de la caché
+    de todos los hospitales (ya filtrados), y responde predicciones de los próximos 'horizon' periodos con una
+    caché LRU/TTL por (dataset, hospital, horizonte) que se invalida al ingerir datos nuevos del hospital.
+    Los hospitales sin modelo ajustado se predicen con el Random Walk estacional.
+    """
+
+    def __init__(self, datasets: list = None, order: tuple = (1, 0, 1), seasonal_order: tuple = (1, 0, 1, 7),
+                 cache_size: int = 1024, ttl: float = 300, max_latencies: int = 10_000):
+        self.order = order
+        self.seasonal_order = seasonal_order
+        self.cache = ForecastCache(cache_size, ttl)
+        self.latencies = deque(maxlen=max_latencies)
+        self.lock = threading.RLock()
+        self.models = {}
+        self.index = {}
+        self.pending = {}
+        self.versions = {}
+
+        for path in (datasets if datasets is not None else read_processed_files()):
+            self.load_dataset(path)
+
+        print(f"Servicio cargado con {len(self.models)} hospitales")
+
+    def load_dataset(self, path: str) -> None:
+        """
+        Carga en memoria las series y los modelos filtrados de un dataset procesado
+        """
+        name = Path(path).stem
+        df = pd.read_parquet(path)
+        hospitals, offsets, times, y, X = prepare_hospital_arrays(df, FEATURE_COLUMNS)
+
+        for i, hospital in enumerate(hospitals):
+            rows = slice(offsets[i], offsets[i + 1])
+            h_times, h_y, h_X = times[rows], y[rows], X[rows]
+
+            # El paso de la serie es la diferencia más habitual entre periodos consecutivos (día, hora o minuto)
+            diffs = np.diff(h_times)
+            step = pd.Series(diffs).mode().iloc[0].to_timedelta64() if len(diffs) else np.timedelta64(1, 'D')
+
+            entry = load_fitted_model(name, hospital, self.order, self.seasonal_order)
+            results = None
+            if entry is not None:
+                try:
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('ignore')
+                        results = filter_sarimax(entry, h_y, h_X)
+                except Exception as e:
+                    print(f"No se pudo cargar el modelo de '{hospital}' ({name}): {e}")
+
+            self.models[(name, hospital)] = HospitalModel(h_times, h_y, step, entry, results)
+            self.index.setdefault(str(hospital), []).append((name, hospital))
+
+    def resolve(self, hospital, dataset: str = None) -> tuple:
+        """
+        Devuelve la clave (dataset, hospital) de un hospital, aceptando el hospital como texto
+        """
+        if dataset is not None and (dataset, hospital) in self.models:
+            return dataset, hospital
+
+        keys = [k for k in self.index.get(str(hospital), []) if dataset is None or k[0] == dataset]
+        if not keys:
+            raise KeyError(f"El hospital '{hospital}' no existe")
+        if len(keys) > 1:
+            raise ValueError(f"El hospital '{hospital}' existe en varios datasets, indica el dataset")
+
+        return keys[0]
+
+    def compute_forecast(self, model: HospitalModel, horizon: int) -> np.ndarray:
+        """
+        Predice 'horizon' periodos de forma recursiva: las features de cada paso (lags y medias móviles)
+        se calculan con las predicciones anteriores, y el modelo se extiende paso a paso sin volver a filtrar
+        """
+        if model.results is None:
+            return seasonal_naive_model(model.y, None, np.empty((horizon, 0)), season=7)
+
+        history = list(model.y[-14:])
+        results = model.results
+        time_value = model.times[-1]
+        forecast = []
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            for step in range(horizon):
+                time_value = time_value + model.step
+                x = np.asarray([next_features(time_value, history)], dtype=float)
+                y_hat = float(np.asarray(results.forecast(steps=1, exog=x))[0])
+                forecast.append(y_hat)
+                history.append(y_hat)
+                if step < horizon - 1:
+                    results = results.extend([y_hat], exog=x)
+
+        return np.asarray(forecast)
+
+    def forecast(self, hospital, horizon: int = 7, dataset: str = None) -> dict:
+        """
+        Devuelve la predicción de los próximos 'horizon' periodos de un hospital
+
+        Parameters:
+        - hospital: hospital (clave o texto)
+        - horizon (int): número de periodos (24 para las próximas 24h en datos horarios, 7 para 7 días en diarios)
+        - dataset (str): dataset del hospital, necesario si el hospital existe en varios
+
+        Returns:
+        - dict: dataset, hospital, fechas y predicciones, y si la respuesta viene de caché
+        """
+        start = time.perf_counter()
+        owner = False
+        with self.lock:
+            key = self.resolve(hospital, dataset)
+            cache_key = (key[0], key[1], int(horizon))
+
+            response = self.cache.get(cache_key)
+            cached = response is not None
+            if not cached:
+                # Una sola petición calcula cada predicción; las simultáneas de la misma clave esperan su resultado
+                pending = self.pending.get(cache_key)
+                if pending is None:
+                    owner = True
+                    pending = self.pending[cache_key] = Future()
+                    model = self.models[key]
+                    snapshot = HospitalModel(model.times, model.y, model.step, model.entry, model.results)
+                    version = self.versions.get(key, 0)
+
+        if not cached and owner:
+            # El cálculo (el bucle de extend de statsmodels) se hace fuera del lock para no bloquear otras peticiones;
+            # ingest sustituye los arrays y resultados del modelo en lugar de modificarlos, así que la copia es estable
+            try:
+                values = self.compute_forecast(snapshot, int(horizon))
+                times = snapshot.times[-1] + snapshot.step * np.arange(1, int(horizon) + 1)
+                response = {
+                    'dataset': key[0],
+                    'hospital': key[1],
+                    'horizon': int(horizon),
+                    'times': [str(pd.Timestamp(t)) for t in times],
+                    'forecast': [max(float(v), 0.0) for v in values],
+                    'model': 'sarimax' if snapshot.results is not None else 'seasonal_naive'
+                }
+            except Exception as e:
+                with self.lock:
+                    del self.pending[cache_key]
+                pending.set_exception(e)
+                raise
+
+            with self.lock:
+                # Si se han ingerido datos del hospital durante el cálculo, la predicción ya no se guarda en caché
+                if self.versions.get(key, 0) == version:
+                    self.cache.put(cache_key, response)
+                del self.pending[cache_key]
+            pending.set_result(response)
+        elif not cached:
+            response = pending.result()
+
+        self.latencies.append(time.perf_counter() - start)
+        return {**response, 'cached': cached}
+
+    def forecast_batch(self, requests: list) -> list:
+        """
+        Resuelve varias peticiones {'hospital', 'horizon', 'dataset'}; los errores se devuelven por petición
+        """
+        responses = []
+        for request in requests:
+            try:
+                responses.append(self.forecast(request['hospital'], request.get('horizon', 7), request.get('dataset')))
+            except (KeyError, ValueError) as e:
+                responses.append({'hospital': request.get('hospital'), 'error': e.args[0] if e.args else str(e)})
+
+        return responses
+
+    def ingest(self, rows, dataset: str = None) -> int:
+        """
+        Añade periodos nuevos (p.ej. las filas emitidas por StreamingAggregator) a la historia en memoria,
+        extiende el modelo filtrado con ellos e invalida las predicciones en caché de los hospitales afectados
+
+        Parameters:
+        - rows: DataFrame o lista de filas con 'hospital', 'date' o 'datetime' y 'admissions'
+        - dataset (str): dataset de los hospitales
+
+        Returns:
+        - int: número de filas ingeridas
+        """
+        df = pd.DataFrame(rows)
+        if df.empty:
+            return 0
+        time_col = 'datetime' if 'datetime' in df.columns else 'date'
+
+        with self.lock:
+            for hospital, df_hosp in df.sort_values(time_col).groupby('hospital', sort=False):
+                key = self.resolve(hospital, dataset)
+                model = self.models[key]
+
+                new_times = pd.DatetimeIndex(pd.to_datetime(df_hosp[time_col]))
+                if new_times.tz is not None:
+                    new_times = new_times.tz_convert(None)
+                new_times = new_times.as_unit('ns').values
+                new_y = df_hosp['admissions'].to_numpy(dtype=float)
+
+                if model.results is not None:
+                    history = list(model.y[-14:])
+                    X_new = []
+                    for t, value in zip(new_times, new_y):
+                        X_new.append(next_features(t, history))
+                        history.append(value)
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('ignore')
+                        model.results = model.results.extend(new_y, exog=np.asarray(X_new, dtype=float))
+
+                model.times = np.concatenate([model.times, new_times])
+                model.y = np.concatenate([model.y, new_y])
+                self.versions[key] = self.versions.get(key, 0) + 1
+                self.cache.invalidate(*key)
+
+        return len(df)
+
+    def latency_stats(self) -> dict:
+        """
+        Devuelve los percentiles de latencia (ms) de las últimas peticiones y el acierto de la caché
+        """
+        latencies = np.asarray(self.latencies) * 1000
+        stats = {'requests': len(latencies), 'cache_hits': self.cache.hits, 'cache_misses': self.cache.misses}
+        if len(latencies):
+            stats.update({f'p{p}_ms': float(np.percentile(latencies, p)) for p in (50, 90, 99)})
+            stats['max_ms'] = float(latencies.max())
+
+        return stats
+
+def serve_http(service: ForecastService, host: str = '127.0.0.1', port: int = 8000) -> ThreadingHTTPServer:
+    """
+    Expone el servicio por HTTP en local:
+    - GET  /forecast?hospital=X&horizon=7[&dataset=...]
+    - POST /forecast   con una lista JSON de peticiones {'hospital', 'horizon', 'dataset'}
+    - POST /ingest     con {'dataset': ..., 'rows': [...]}
+    - GET  /stats      percentiles de latencia y aciertos de caché
+
+    Parameters:
+    - service (ForecastService): servicio cargado
+    - host (str): host
+    - port (int): puerto
+
+    Returns:
+    - ThreadingHTTPServer: servidor arrancado en un hilo en segundo plano (server.shutdown() para pararlo)
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def send_json(self, payload, status: int = 200) -> None:
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def read_json(self):
+            length = int(self.headers.get('Content-Length', 0))
+            return json.loads(self.rfile.read(length) or b'null')
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            try:
+                if url.path == '/forecast':
+                    self.send_json(service.forecast(query['hospital'], int(query.get('horizon', 7)), query.get('dataset')))
+                elif url.path == '/stats':
+                    self.send_json(service.latency_stats())
+                else:
+                    self.send_json({'error': 'Ruta no encontrada'}, 404)
+            except (KeyError, ValueError) as e:
+                self.send_json({'error': e.args[0] if e.args else str(e)}, 400)
+            except Exception as e:
+                self.send_json({'error': f"Error interno: {e!r}"}, 500)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            try:
+                if url.path == '/forecast':
+                    self.send_json(service.forecast_batch(self.read_json()))
+                elif url.path == '/ingest':
+                    payload = self.read_json()
+                    self.send_json({'ingested': service.ingest(payload['rows'], payload.get('dataset'))})
+                else:
+                    self.send_json({'error': 'Ruta no encontrada'}, 404)
+            except (KeyError, ValueError, TypeError) as e:
+                self.send_json({'error': e.args[0] if e.args else str(e)}, 400)
+            except Exception as e:
+                self.send_json({'error': f"Error interno: {e!r}"}, 500)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f"Servicio de predicción escuchando en http://{host}:{port}")
+    return server
@@ -0,0 +1,238 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import inspect
+import os
+import pickle
+from pathlib import Path
+from utils.instrumentation_utils import stage_trace
+
+STAGE_CACHE_DIR = '../datasets/stage_cache/'
+
+# Tamaño máximo de la caché; al superarlo se borran las entradas usadas hace más tiempo
+STAGE_CACHE_MAX_BYTES = 5 * 1024 ** 3
+
+# Permite desactivar la caché para todo el proceso sin cambiar las llamadas
+STAGE_CACHE_STATE = {'enabled': True}
+
+def set_stage_cache(enabled: bool) -> None:
+    """
+    Activa o desactiva la caché de etapas para todas las llamadas a run_stage
+    """
+    STAGE_CACHE_STATE['enabled'] = enabled
+
+def hash_value(value, h) -> None:
+    """
+    Añade al hash el contenido de un argumento de una etapa. Los DataFrame y arrays se hashean por
+    contenido, y las rutas a ficheros existentes por el contenido del fichero, no por el nombre.
+
+    Parameters:
+    - value: argumento a hashear
+    - h: objeto hashlib al que se añade el contenido
+    """
+    if isinstance(value, pd.DataFrame):
+        h.update(repr([(str(col), str(dtype)) for col, dtype in value.dtypes.items()]).encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Series):
+        h.update(f"{value.name}:{value.dtype}".encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        h.update(f"{value.dtype}:{value.shape}".encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (str, Path)) and os.path.isfile(str(value).split('::')[0]):
+        # Rutas de read_multi_file_paths, incluidos los miembros 'archivo.zip::miembro'
+        h.update(str(value).encode())
+        with open(str(value).split('::')[0], 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+    elif isinstance(value, dict):
+        for key in sorted(value, key=str):
+            h.update(repr(key).encode())
+            hash_value(value[key], h)
+    elif isinstance(value, (list, tuple)):
+        h.update(f"{type(value).__name__}:{len(value)}".encode())
+        for item in value:
+            hash_value(item, h)
+    else:
+        h.update(repr(value).encode())
+
+# Tipos de las constantes de módulo que forman parte de la clave de una etapa (p.ej. listas de columnas)
+CONSTANT_TYPES = (bool, int, float, str, bytes, tuple, list, dict, set, frozenset)
+
+def referenced_names(code) -> set:
+    """
+    Nombres globales y atributos que usa un objeto código, incluidos los de sus funciones anidadas,
+    lambdas y comprensiones
+    """
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= referenced_names(const)
+
+    return names
+
+def stage_source(func) -> str:
+    """
+    Devuelve el código del que depende una etapa: el de la propia función y, de forma transitiva, el de las
+    funciones y clases de utils (o de su mismo módulo) a las que llama, p.ej. fill_missing_values o
+    mexico_convert_date_hour, junto con las constantes de módulo que usan. Así, cambiar una función auxiliar
+    invalida la caché de las etapas que la usan, y cambiar una etapa no afecta a las demás del mismo módulo.
+    """
+    original = inspect.unwrap(func)
+    pending = [original]
+    seen = set()
+    sources = {}
+
+    while pending:
+        obj = pending.pop()
+        key = f"{getattr(obj, '__module__', '')}.{getattr(obj, '__qualname__', repr(obj))}"
+        if key in seen:
+            continue
+        seen.add(key)
+
+        try:
+            sources[key] = inspect.getsource(obj)
+        except (OSError, TypeError):
+            sources[key] = repr(getattr(obj, '__code__', obj))
+
+        functions = [value for value in vars(obj).values() if inspect.isfunction(value)] if inspect.isclass(obj) else [obj]
+        for function in functions:
+            function = inspect.unwrap(function)
+            names = referenced_names(function.__code__)
+
+            # Los nombres se resuelven en el módulo de la función y en los módulos de utils que usa (modulo.funcion)
+            namespaces = [function.__globals__]
+            namespaces += [vars(value) for value in (function.__globals__.get(name) for name in names)
+                           if inspect.ismodule(value) and value.__name__.startswith('utils.')]
+
+            for namespace in namespaces:
+                for name in names & namespace.keys():
+                    value = namespace[name]
+                    if isinstance(value, CONSTANT_TYPES):
+                        sources[f"{function.__module__}.{name}"] = repr(value)
+                        continue
+
+                    value = inspect.unwrap(value) if inspect.isfunction(value) else value
+                    module = getattr(value, '__module__', None) or ''
+                    if (inspect.isfunction(value) or inspect.isclass(value)) and \
+                            (module.startswith('utils.') or module == original.__module__):
+                        pending.append(value)
+
+    return ''.join(sources[key] for key in sorted(sources))
+
+def get_stage_key(func, args: tuple, kwargs: dict, depends_on: list = None) -> str:
+    """
+    Calcula la clave de una llamada a partir del código fuente de la etapa (ver stage_source), sus datos de entrada
+    y sus parámetros
+
+    Parameters:
+    - func (callable): etapa (se usa el código de la función original aunque esté decorada)
+    - args (tuple): argumentos posicionales
+    - kwargs (dict): argumentos por nombre
+    - depends_on (list): ficheros que la etapa lee por su cuenta y que también forman parte de la clave
+
+    Returns:
+    - str: hash hexadecimal
+    """
+    original = inspect.unwrap(func)
+    h = hashlib.sha256()
+    h.update(f"{original.__module__}.{original.__qualname__}".encode())
+    h.update(stage_source(original).encode())
+    hash_value(list(args), h)
+    hash_value(kwargs, h)
+    hash_value(list(depends_on or []), h)
+
+    return h.hexdigest()
+
+def evict_stage_cache(max_bytes: int = None) -> int:
+    """
+    Borra las entradas usadas hace más tiempo hasta que la caché ocupe como mucho max_bytes
+
+    Parameters:
+    - max_bytes (int): tamaño máximo (por defecto STAGE_CACHE_MAX_BYTES)
+
+    Returns:
+    - int: número de entradas borradas
+    """
+    max_bytes = STAGE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    folder = Path(STAGE_CACHE_DIR)
+    if not folder.exists():
+        return 0
+
+    # La fecha de modificación se actualiza en cada acierto, así que hace de marca de último uso.
+    # Otros procesos (p.ej. los workers del pool) pueden borrar entradas a la vez: las que ya no existen se saltan
+    entries = []
+    for path in folder.glob('*.pkl'):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+
+    removed = 0
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+
+    return removed
+
+def run_stage(func, *args, use_cache: bool = True, depends_on: list = None, **kwargs):
+    """
+    Ejecuta una etapa del pipeline reutilizando su salida de disco si ya se ejecutó con la misma
+    función (mismo código), los mismos datos y los mismos parámetros. Encadenando las etapas con
+    run_stage, al cambiar una etapa solo se recalculan esa y las posteriores, y solo en los datasets afectados.
+    No se debe usar con etapas con efectos secundarios (guardar ficheros, registrar hospitales...), y los
+    ficheros que la etapa lea por su cuenta (p.ej. un fichero de aux_files) se indican en depends_on.
+
+    Parameters:
+    - func (callable): etapa a ejecutar
+    - args: argumentos posicionales de la etapa
+    - use_cache (bool): si es False se ejecuta la etapa sin leer ni escribir la caché
+    - depends_on (list): ficheros adicionales de los que depende el resultado
+    - kwargs: argumentos por nombre de la etapa
+
+    Returns:
+    - resultado de la etapa
+    """
+    if not (use_cache and STAGE_CACHE_STATE['enabled']):
+        return func(*args, **kwargs)
+
+    name = inspect.unwrap(func).__name__
+    path = Path(STAGE_CACHE_DIR) / f"{name}_{get_stage_key(func, args, kwargs, depends_on)}.pkl"
+
+    if path.exists():
+        try:
+            # El acierto también queda en la traza, marcado como 'cached', aunque la etapa no llegue a ejecutarse
+            data_in = next((a for a in args if isinstance(a, (pd.DataFrame, pd.Series))), None)
+            with stage_trace(name, data_in, cached=True) as stage:
+                with open(path, 'rb') as f:
+                    result = pickle.load(f)
+                stage.set_output(result)
+            os.utime(path)
+            print(f"Etapa '{name}' leída de caché")
+            return result
+        except Exception as e:
+            print(f"No se pudo leer la caché de '{name}', se recalcula: {e}")
+
+    result = func(*args, **kwargs)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp_path.replace(path)
+
+    evict_stage_cache()
+
+    return result
+
+def clear_stage_cache() -> None:
+    """
+    Borra todas las entradas de la caché de etapas
+    """
+    evict_stage_cache(max_bytes=0)
@@ -0,0 +1,274 @@
+import pandas as pd
+import numpy as np
+import csv
+import socket
+import time
+from pathlib import Path
+
+# Resoluciones admitidas y su unidad de truncado en numpy ('minute' es la de Colombia/México tras cast_columns_types)
+STREAM_RESOLUTIONS = {'minute': 'm', 'hour': 'h', 'day': 'D'}
+
+# Columnas emitidas, en el mismo orden que la salida de aggregate_data
+STREAM_FEATURE_COLUMNS = ['admissions', 'day_of_week', 'is_weekend', 'season', 'lag_7', 'lag_14', 'rolling_7', 'rolling_14']
+
+RING_SIZE = 14
+
+def get_season(date: np.datetime64) -> int:
+    """
+    Estación del año en hemisferio norte, con los mismos cortes que aggregate_data
+    """
+    md = date.astype(object).month * 100 + date.astype(object).day
+    if 321 <= md <= 620:
+        return 1
+    elif 621 <= md <= 922:
+        return 2
+    elif 923 <= md <= 1220:
+        return 3
+    return 4
+
+class HospitalStream:
+    """
+    Estado de un hospital: periodo abierto, su contador y un buffer circular con los últimos 14 periodos cerrados,
+    junto con las sumas de las ventanas de 7 y 14 periodos que se actualizan al cerrar cada periodo
+    """
+
+    __slots__ = ('period', 'count', 'ring', 'pos', 'n', 'sum_7', 'sum_14')
+
+    def __init__(self, period: np.datetime64):
+        self.period = period
+        self.count = 0
+        self.ring = [0] * RING_SIZE
+        self.pos = 0
+        self.n = 0
+        self.sum_7 = 0
+        self.sum_14 = 0
+
+    def close(self) -> tuple:
+        """
+        Cierra el periodo abierto y devuelve (lag_7, lag_14, rolling_7, rolling_14) calculados con los periodos anteriores,
+        igual que shift(7), shift(14) y shift(1).rolling(7/14).mean() en aggregate_data
+        """
+        oldest_7 = self.ring[(self.pos - 7) % RING_SIZE]
+        oldest_14 = self.ring[self.pos]
+
+        lag_7 = float(oldest_7) if self.n >= 7 else np.nan
+        lag_14 = float(oldest_14) if self.n >= 14 else np.nan
+        rolling_7 = self.sum_7 / 7 if self.n >= 7 else np.nan
+        rolling_14 = self.sum_14 / 14 if self.n >= 14 else np.nan
+
+        # Se añade el periodo cerrado a las ventanas y se descarta el que sale de cada una
+        count = self.count
+        self.sum_7 += count - (oldest_7 if self.n >= 7 else 0)
+        self.sum_14 += count - (oldest_14 if self.n >= 14 else 0)
+        self.ring[self.pos] = count
+        self.pos = (self.pos + 1) % RING_SIZE
+        self.n += 1
+
+        return lag_7, lag_14, rolling_7, rolling_14
+
+class StreamingAggregator:
+    """
+    Agrega eventos de llegada (una fila por paciente: hospital y fecha/hora) por hospital y periodo, y emite una fila
+    de features cada vez que un periodo se cierra, con O(1) por evento. Un periodo se cierra cuando llega un evento
+    del mismo hospital de un periodo posterior, al avanzar la marca de agua o al final del flujo (flush).
+    Las filas emitidas coinciden con aggregate_data(group_data(eventos)).
+
+    Uso:
+        aggregator = StreamingAggregator('day')
+        for row in aggregator.ingest(tail_csv_events('../datasets/stream/llegadas.csv', follow=True)):
+            ...
+    """
+
+    def __init__(self, resolution: str = 'day', on_row=None):
+        if resolution not in STREAM_RESOLUTIONS:
+            raise ValueError(f"Resolución no soportada: {resolution}")
+
+        self.resolution = resolution
+        self.unit = STREAM_RESOLUTIONS[resolution]
+        self.time_col = 'date' if resolution == 'day' else 'datetime'
+        self.on_row = on_row
+        self.hospitals = {}
+        self.n_events = 0
+        self.late_events = 0
+
+    def make_row(self, hospital, state: HospitalStream) -> dict:
+        period = state.period
+        lag_7, lag_14, rolling_7, rolling_14 = state.close()
+        day_of_week = int((period.astype('datetime64[D]').astype(np.int64) + 3) % 7)
+
+        row = {
+            'hospital': hospital,
+            self.time_col: pd.Timestamp(period),
+            'admissions': state.count,
+            'day_of_week': day_of_week,
+            'is_weekend': int(day_of_week >= 5),
+            'season': get_season(period.astype('datetime64[D]')),
+            'lag_7': lag_7,
+            'lag_14': lag_14,
+            'rolling_7': rolling_7,
+            'rolling_14': rolling_14
+        }
+        if self.on_row is not None:
+            self.on_row(row)
+
+        return row
+
+    def add_event(self, hospital, timestamp) -> list:
+        """
+        Registra una llegada y devuelve las filas de los periodos que se cierran con ella (como mucho una)
+
+        Parameters:
+        - hospital: clave del hospital
+        - timestamp: fecha/hora de llegada (datetime, pd.Timestamp, np.datetime64 o cadena ISO)
+
+        Returns:
+        - list: filas emitidas
+        """
+        period = np.datetime64(timestamp, 'ns').astype(f'datetime64[{self.unit}]')
+        self.n_events += 1
+
+        state = self.hospitals.get(hospital)
+        if state is None:
+            state = self.hospitals[hospital] = HospitalStream(period)
+            state.count = 1
+            return []
+
+        if period == state.period and state.count > 0:
+            state.count += 1
+            return []
+
+        if period <= state.period:
+            # Un evento de un periodo ya cerrado no puede cambiar filas emitidas: se descarta y se cuenta
+            self.late_events += 1
+            return []
+
+        rows = [self.make_row(hospital, state)] if state.count > 0 else []
+        state.period = period
+        state.count = 1
+
+        return rows
+
+    def ingest(self, events):
+        """
+        Consume un iterable de eventos (hospital, timestamp) y va devolviendo las filas según se cierran los periodos
+
+        Parameters:
+        - events: iterable de tuplas (hospital, timestamp)
+
+        Returns:
+        - generator: filas emitidas
+        """
+        for hospital, timestamp in events:
+            yield from self.add_event(hospital, timestamp)
+
+    def advance_watermark(self, timestamp) -> list:
+        """
+        Cierra los periodos abiertos anteriores a timestamp, para los hospitales que no reciben más eventos.
+        Solo se debe usar si se garantiza que ya no llegarán eventos anteriores a timestamp.
+
+        Parameters:
+        - timestamp: marca de agua
+
+        Returns:
+        - list: filas emitidas
+        """
+        watermark = np.datetime64(timestamp, 'ns').astype(f'datetime64[{self.unit}]')
+        rows = []
+        for hospital, state in list(self.hospitals.items()):
+            if state.count > 0 and state.period < watermark:
+                rows.append(self.make_row(hospital, state))
+                state.count = 0
+
+        return rows
+
+    def flush(self) -> list:
+        """
+        Cierra todos los periodos abiertos (final del flujo)
+
+        Returns:
+        - list: filas emitidas
+        """
+        rows = []
+        for hospital, state in self.hospitals.items():
+            if state.count > 0:
+                rows.append(self.make_row(hospital, state))
+                state.count = 0
+
+        return rows
+
+def stream_rows_to_df(rows: list, resolution: str = 'day') -> pd.DataFrame:
+    """
+    Convierte las filas emitidas en un DataFrame con las mismas columnas, orden y tipos que aggregate_data
+
+    Parameters:
+    - rows (list): filas emitidas por StreamingAggregator
+    - resolution (str): resolución usada en el agregador
+
+    Returns:
+    - pd.DataFrame: DataFrame ordenado por hospital y fecha
+    """
+    time_col = 'date' if resolution == 'day' else 'datetime'
+    df = pd.DataFrame(rows, columns=['hospital', time_col] + STREAM_FEATURE_COLUMNS)
+    df[time_col] = pd.to_datetime(df[time_col])
+    df = df.astype({'admissions': 'int64', 'day_of_week': 'int32', 'is_weekend': 'int64', 'season': 'int64'})
+
+    return df.sort_values(['hospital', time_col]).reset_index(drop=True)
+
+def tail_csv_events(path: str, hospital_col: str = 'hospital', time_col: str = 'datetime', follow: bool = False,
+                    poll_interval: float = 1.0, delimiter: str = ','):
+    """
+    Lee eventos de llegada de un CSV con cabecera. Con follow=True se queda esperando nuevas líneas
+    al final del fichero, como 'tail -f', para simular un flujo en vivo.
+
+    Parameters:
+    - path (str): ruta del CSV
+    - hospital_col (str): columna con el hospital
+    - time_col (str): columna con la fecha/hora de llegada
+    - follow (bool): sigue leyendo las líneas que se añadan al fichero
+    - poll_interval (float): segundos entre comprobaciones cuando no hay líneas nuevas
+    - delimiter (str): separador del CSV
+
+    Returns:
+    - generator: tuplas (hospital, timestamp)
+    """
+    with open(Path(path), encoding='utf-8', newline='') as f:
+        header = next(csv.reader([f.readline()], delimiter=delimiter))
+        i_hospital, i_time = header.index(hospital_col), header.index(time_col)
+
+        pending = ''
+        while True:
+            line = f.readline()
+            if not line:
+                if not follow:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            # Una línea a medio escribir se completa en la siguiente lectura
+            if not line.endswith('\n') and follow:
+                pending += line
+                continue
+            line, pending = pending + line, ''
+
+            fields = next(csv.reader([line], delimiter=delimiter), None)
+            if fields:
+                yield fields[i_hospital], fields[i_time]
+
+def socket_events(host: str = 'localhost', port: int = 9999, delimiter: str = ','):
+    """
+    Lee eventos de llegada de un socket TCP, una línea 'hospital,timestamp' por evento, hasta que se cierra la conexión
+
+    Parameters:
+    - host (str): host
+    - port (int): puerto
+    - delimiter (str): separador entre hospital y timestamp
+
+    Returns:
+    - generator: tuplas (hospital, timestamp)
+    """
+    with socket.create_connection((host, port)) as conn, conn.makefile('r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                hospital, timestamp = line.rsplit(delimiter, 1)
+                yield hospital, timestamp
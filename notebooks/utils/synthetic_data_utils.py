@@ -0,0 +1,346 @@
+import pandas as pd
+import numpy as np
+from pathlib import Path
+
+# Años con un formato de fichero propio en la fuente de México
+MEXICO_YEARS = list(range(2009, 2024))
+
+# Configuración de lectura de los ficheros sintéticos, con el mismo formato que datasets_dicts del notebook 01
+SYNTHETIC_DATASETS = [
+    {"name": "australia", "format": "csv", "options": {"header": [0, 1]}, "final_name": "australia_data"},
+    {"name": "cardiff", "format": "csv", "options": {}, "final_name": "cardiff_data"},
+    {"name": "chile", "format": "csv", "options": {
+        "delimiter": ";",
+        "encoding": "latin1",
+        "usecols": ["IdEstablecimiento", "NEstablecimiento", "Total", "Menores_1", "De_1_a_4", "De_5_a_14", "De_15_a_64", "De_65_y_mas", "fecha", "semana"]
+    }, "final_name": "chile_data", "large_file": True},
+    {"name": "colombia", "format": "csv", "options": {}, "final_name": "colombia_data"},
+    {"name": "col_betania", "format": "csv", "options": {}, "final_name": "betania_data"},
+    {"name": "esp_canarias", "format": "csv", "options": {}, "final_name": "spain_data"},
+    {"name": "esp_castilla_y_leon", "format": "csv", "options": {"delimiter": ";", "encoding": "utf-8-sig"}, "final_name": "spain_data"},
+    {"name": "iowa", "format": "xlsx", "options": {"header": 3}, "final_name": "iowa_data"},
+    {"name": "iran", "format": "csv", "options": {}, "final_name": "iran_data"},
+    *[
+        {"name": f"mexico_{year}", "format": "csv", "options": {"delimiter": ";", "header": None, "dtype": "str"}, "final_name": "mexico_data", "large_file": True}
+        for year in range(2009, 2015)
+    ],
+    *[
+        {"name": f"mexico_{year}", "format": "csv", "options": {
+            "delimiter": "|" if year in (2016, 2017) else ",",
+            "usecols": ["CLUES", "FECHAINGRESO", "HORAINIATE", "MININIATE"]
+        }, "final_name": "mexico_data", "large_file": True}
+        for year in range(2015, 2020)
+    ],
+    *[
+        {"name": f"mexico_{year}", "format": "txt", "options": {
+            "delimiter": "|",
+            "usecols": ["CLUES", "FECHAINGRESO", "HORA_INGRESO"] if year == 2021 else ["CLUES", "fechaingreso", "hora_ingreso"]
+        }, "final_name": "mexico_data", "large_file": True}
+        for year in range(2020, 2024)
+    ],
+    {"name": "pak_", "format": "xlsx", "options": {}, "final_name": "pakistan_data"},
+    {"name": "usa_", "format": "xlsx", "options": {}, "final_name": "usa_data"},
+    {"name": "nl_", "format": "xlsx", "options": {}, "final_name": "netherlands_data"},
+    {"name": "bwa_", "format": "xlsx", "options": {}, "final_name": "botswana_data"},
+    {"name": "wales", "format": "csv", "options": {"encoding": "latin1", "skiprows": 2}, "final_name": "wales_data"}
+]
+
+def daily_counts(rng: np.random.Generator, n_hospitals: int, dates: pd.DatetimeIndex, mean: float) -> np.ndarray:
+    """
+    Genera admisiones diarias con estacionalidad semanal y anual
+
+    Parameters:
+    - rng (np.random.Generator): generador aleatorio
+    - n_hospitals (int): número de hospitales
+    - dates (pd.DatetimeIndex): días a generar
+    - mean (float): media de admisiones diarias por hospital
+
+    Returns:
+    - np.ndarray: matriz (n_hospitals, n_dias) de conteos
+    """
+    weekly = 1 + 0.15 * np.cos(2 * np.pi * dates.dayofweek.to_numpy() / 7)
+    yearly = 1 + 0.1 * np.sin(2 * np.pi * dates.dayofyear.to_numpy() / 365.25)
+    scale = rng.uniform(0.5, 1.5, size=(n_hospitals, 1))
+
+    return rng.poisson(mean * scale * weekly * yearly)
+
+def expand_arrivals(rng: np.random.Generator, counts: np.ndarray, dates: pd.DatetimeIndex) -> tuple:
+    """
+    Convierte conteos diarios en registros individuales de llegada con hora y minuto
+
+    Parameters:
+    - rng (np.random.Generator): generador aleatorio
+    - counts (np.ndarray): matriz (n_hospitals, n_dias) de conteos
+    - dates (pd.DatetimeIndex): días de la matriz
+
+    Returns:
+    - tuple: (índice de hospital, fecha, hora, minuto) por llegada
+    """
+    n_hospitals, n_days = counts.shape
+    flat = counts.ravel()
+
+    hospital = np.repeat(np.repeat(np.arange(n_hospitals), n_days), flat)
+    day = dates.to_numpy()[np.repeat(np.tile(np.arange(n_days), n_hospitals), flat)]
+
+    # Más llegadas durante el día que de madrugada
+    hour = np.clip(rng.normal(14, 5, size=len(hospital)), 0, 23).astype(int)
+    minute = rng.integers(0, 60, size=len(hospital))
+
+    return hospital, pd.DatetimeIndex(day), hour, minute
+
+def clues_codes(n_hospitals: int) -> list:
+    """
+    Devuelve códigos CLUES sintéticos de México
+    """
+    return [f"ASSSA{i:06d}" for i in range(n_hospitals)]
+
+def write_australia(output_dir: Path, rng: np.random.Generator, n_hospitals: int, dates: pd.DatetimeIndex, mean: float) -> None:
+    fields = ['Attendance', 'Admissions', 'Tri_1', 'Tri_2', 'Tri_3', 'Tri_4', 'Tri_5']
+    counts = daily_counts(rng, n_hospitals, dates, mean)
+
+    # Cabecera de dos filas: el nombre del hospital solo aparece en la primera columna de su bloque
+    header_0 = ['']
+    header_1 = ['Date']
+    columns = [dates.strftime('%d-%b-%Y').str.upper()]
+    for h in range(n_hospitals):
+        header_0 += [f"Hospital {h}"] + [''] * (len(fields) - 1)
+        header_1 += fields
+        attendance = counts[h] + rng.poisson(mean * 0.3, size=len(dates))
+        triage = rng.multinomial(attendance, [0.05, 0.15, 0.4, 0.3, 0.1])
+        columns += [attendance, counts[h]] + list(triage.T)
+
+    df = pd.DataFrame(np.column_stack(columns))
+    with open(output_dir / 'australia_data.csv', 'w', encoding='utf-8', newline='') as f:
+        f.write(','.join(header_0) + '\n')
+        f.write(','.join(header_1) + '\n')
+        df.to_csv(f, header=False, index=False)
+
+def write_cardiff(output_dir: Path, rng: np.random.Generator, dates: pd.DatetimeIndex, mean: float) -> None:
+    hours = pd.date_range(dates[0], dates[-1] + pd.Timedelta(hours=23), freq='h')
+    profile = 1 + 0.6 * np.sin(2 * np.pi * (hours.hour.to_numpy() - 8) / 24)
+
+    pd.DataFrame({
+        'arrival_1h': hours.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'n_attendance': rng.poisson(mean / 24 * profile)
+    }).to_csv(output_dir / 'cardiff_1_data.csv', index=False)
+
+def write_chile(output_dir: Path, rng: np.random.Generator, n_hospitals: int, dates: pd.DatetimeIndex, mean: float) -> None:
+    causas = ['SECCIÓN 1. TOTAL ATENCIONES DE URGENCIA', 'TOTAL CAUSAS SISTEMA RESPIRATORIO', 'TOTAL CAUSAS SISTEMA CIRCULATORIO']
+
+    for year in sorted(set(dates.year)):
+        year_dates = dates[dates.year == year]
+        counts = daily_counts(rng, n_hospitals, year_dates, mean)
+
+        # Una fila por establecimiento, día y causa, como en AtencionesUrgencia20XX
+        n = n_hospitals * len(year_dates)
+        hospital = np.repeat(np.arange(n_hospitals), len(year_dates))
+        total = counts.ravel()
+        frames = []
+        for i, causa in enumerate(causas):
+            share = total if i == 0 else rng.binomial(total, 0.2)
+            ages = rng.multinomial(1, [0.05, 0.1, 0.15, 0.5, 0.2], size=n) * share[:, None]
+            frames.append(pd.DataFrame({
+                'IdEstablecimiento': 100000 + hospital,
+                'NEstablecimiento': [f"Hospital Sintético {h}" for h in hospital],
+                'IdCausa': i + 1,
+                'GlosaCausa': causa,
+                'Total': share,
+                'Menores_1': ages[:, 0],
+                'De_1_a_4': ages[:, 1],
+                'De_5_a_14': ages[:, 2],
+                'De_15_a_64': ages[:, 3],
+                'De_65_y_mas': ages[:, 4],
+                'fecha': np.tile(year_dates.strftime('%d/%m/%Y'), n_hospitals),
+                'semana': np.tile(year_dates.isocalendar().week.to_numpy(), n_hospitals),
+                'GLOSATIPOESTABLECIMIENTO': 'Hospital'
+            }))
+
+        pd.concat(frames, ignore_index=True).to_csv(output_dir / f'chile_{year}.csv', sep=';', index=False, encoding='latin1')
+
+def write_colombia(output_dir: Path, rng: np.random.Generator, n_hospitals: int, dates: pd.DatetimeIndex, mean: float) -> None:
+    hospital, day, hour, minute = expand_arrivals(rng, daily_counts(rng, n_hospitals, dates, mean), dates)
+
+    pd.DataFrame({
+        'Ips': np.array([f"IPS SINTETICA {h}" for h in range(n_hospitals)])[hospital],
+        'Fecha_Ing': day.strftime('%m/%d/%Y'),
+        'Hora_Ingre': pd.Series(hour).astype(str).str.zfill(2) + ':' + pd.Series(minute).astype(str).str.zfill(2) + ':00',
+        'Triage': rng.integers(1, 6, size=len(hospital))
+    }).to_csv(output_dir / 'colombia_data.csv', index=False)
+
+def write_col_betania(output_dir: Path, rng: np.random.Generator, dates: pd.DatetimeIndex, mean: float) -> None:
+    _, day, _, _ = expand_arrivals(rng, daily_counts(rng, 1, dates, mean), dates)
+
+    pd.DataFrame({
+        'FechaAtencion': day.strftime('%Y/%m/%d'),
+        'Diagnostico': rng.integers(0, 100, size=len(day))
+    }).to_csv(output_dir / 'col_betania_data.csv', index=False)
+
+def write_esp_canarias(output_dir: Path, rng: np.random.Generator, n_hospitals: int, dates: pd.DatetimeIndex, mean: float) -> None:
+    codes = [380000 + i for i in range(n_hospitals)]
+    counts = daily_counts(rng, n_hospitals, dates, mean)
+
+    pd.DataFrame({
+        'fecha_datos': dates[-1].strftime('%d/%m/%Y'),
+        'codigo': np.repeat(codes, len(dates)),
+        'fecha': np.tile(dates.strftime('%d/%m/%Y'), n_hospitals),
+        'serie': 'ingresos_urgencias',
+        'valor': counts.ravel()
+    }).to_csv(output_dir / 'esp_canarias_data.csv', index=False)
+
+def write_esp_castilla_y_leon(output_dir: Path, rng: np.random.Generator, n_hospitals: int, dates: pd.DatetimeIndex, mean: float) -> None:
+    hospital, day, _, _ = expand_arrivals(rng, daily_counts(rng, n_hospitals, dates, mean), dates)
+
+    pd.DataFrame({
+        'Fecha de atención': day.strftime('%Y-%m-%d'),
+        'Hospital': np.array([f"Complejo Asistencial {h}" for h in range(n_hospitals)])[hospital],
+        'Nivel de triaje': rng.integers(1, 6, size=len(hospital))
+    }).to_csv(output_dir / 'esp_castilla_y_leon_data.csv', sep=';', index=False, encoding='utf-8-sig')
+
+def write_iowa(output_dir: Path, rng: np.random.Generator, dates: pd.DatetimeIndex, mean: float) -> None:
+    # Hoja ancha: una columna por día del año (incluido 29 de febrero) y, por cada año, una fila con el año y 24 filas horarias
+    month_days = pd.date_range('2000-01-01', '2000-12-31', freq='D')
+    day_columns = [f"{d.strftime('%b')}.{d.day}" for d in month_days]
+    hour_labels = [f"{(h % 12) or 12} {'AM' if h < 12 else 'PM'}" for h in range(24)]
+
+    rows = []
+    for year in sorted(set(dates.year)):
+        rows.append([year] + [None] * len(day_columns))
+        values = rng.poisson(mean / 24, size=(24, len(day_columns))).astype(float)
+        for h, label in enumerate(hour_labels):
+            rows.append([label] + values[h].tolist())
+
+    df = pd.DataFrame(rows, columns=['Year/Hour'] + day_columns)
+
+    with pd.ExcelWriter(output_dir / 'iowa_data.xlsx') as writer:
+        # Tres filas de título antes de la cabecera (header=3)
+        pd.DataFrame([['Hourly ED arrivals'], ['Synthetic data'], ['']]).to_excel(writer, index=False, header=False)
+        df.to_excel(writer, index=False, startrow=3)
+
+def write_iran(output_dir: Path, rng: np.random.Generator, dates: pd.DatetimeIndex, mean: float) -> None:
+    _, day, hour, _ = expand_arrivals(rng, daily_counts(rng, 1, dates, mean), dates)
+
+    pd.DataFrame({
+        'ResidentDate_year': day.year,
+        'ResidentDate_month': day.month,
+        'ResidentDate_day': day.day,
+        'ResidentDate_hour': hour,
+        'Sex': rng.integers(0, 2, size=len(day))
+    }).to_csv(output_dir / 'iran_data.csv', index=False)
+
+def write_mexico(output_dir: Path, rng: np.random.Generator, n_hospitals: int, year: int, mean: float) -> None:
+    dates = pd.date_range(f'{year}-01-01', f'{year}-12-31', freq='D')
+    hospital, day, hour, minute = expand_arrivals(rng, daily_counts(rng, n_hospitals, dates, mean), dates)
+    clues = np.array(clues_codes(n_hospitals))[hospital]
+    fecha = day.strftime('%Y-%m-%d')
+
+    if year <= 2014:
+        # Sin cabecera, separado por ';' y con las columnas de interés en posiciones fijas
+        n_columns, positions = {2009: (20, [1, 15, 18, 19])}.get(year, (23, [1, 18, 21, 22]) if year <= 2011 else (24, [1, 19, 22, 23]))
+        df = pd.DataFrame({i: 'X' for i in range(n_columns)}, index=range(len(clues)))
+        for position, values in zip(positions, [clues, fecha, hour, minute]):
+            df[position] = values
+        df.to_csv(output_dir / f'mexico_{year}_data.csv', sep=';', header=False, index=False)
+
+    elif year <= 2019:
+        pd.DataFrame({
+            'ID': np.arange(len(clues)),
+            'CLUES': clues,
+            'FECHAINGRESO': fecha,
+            'HORAINIATE': hour,
+            'MININIATE': minute,
+            'MOTATE': rng.integers(1, 10, size=len(clues))
+        }).to_csv(output_dir / f'mexico_{year}_data.csv', sep='|' if year in (2016, 2017) else ',', index=False)
+
+    else:
+        date_col, hour_col = ('FECHAINGRESO', 'HORA_INGRESO') if year == 2021 else ('fechaingreso', 'hora_ingreso')
+        pd.DataFrame({
+            'ID': np.arange(len(clues)),
+            'CLUES': clues,
+            date_col: fecha,
+            hour_col: pd.Series(hour).astype(str).str.zfill(2) + ':' + pd.Series(minute).astype(str).str.zfill(2)
+        }).to_csv(output_dir / f'mexico_{year}_data.txt', sep='|', index=False)
+
+def write_multicountry(output_dir: Path, rng: np.random.Generator, n_hospitals: int, dates: pd.DatetimeIndex, mean: float) -> None:
+    # Libro con visitas y temperatura de varios países; se escribe una copia por cada patrón de lectura
+    countries = ['pak', 'usa', 'nl', 'bot', 'aus']
+    counts = daily_counts(rng, n_hospitals, dates, mean)
+
+    df = pd.DataFrame({
+        'country': np.repeat([countries[h % len(countries)] for h in range(n_hospitals)], len(dates)),
+        'date': np.tile(dates.strftime('%Y%m%d').astype(int), n_hospitals),
+        'hospital': np.repeat([f"h{h:03d}" for h in range(n_hospitals)], len(dates)),
+        'attendences': counts.ravel().astype(float),
+        'temperature': np.round(15 + 10 * np.sin(2 * np.pi * np.tile(dates.dayofyear.to_numpy(), n_hospitals) / 365.25) + rng.normal(0, 2, n_hospitals * len(dates)), 1)
+    })
+
+    for prefix in ['pak_', 'usa_', 'nl_', 'bwa_']:
+        df.to_excel(output_dir / f'{prefix}data.xlsx', index=False)
+
+def write_wales(output_dir: Path, rng: np.random.Generator, n_hospitals: int, dates: pd.DatetimeIndex, mean: float) -> None:
+    boards = [f"Health Board {h}" for h in range(n_hospitals)]
+    counts = daily_counts(rng, n_hospitals, dates, mean)
+
+    df = pd.DataFrame(counts.T, columns=boards)
+    df.insert(0, '', '"' + dates.strftime('%d %b %Y') + '"')
+    df['Wales'] = counts.sum(axis=0)
+
+    with open(output_dir / 'wales_data.csv', 'w', encoding='latin1', newline='') as f:
+        # Dos filas de metadatos antes de la cabecera (skiprows=2) y notas al final
+        f.write('Accident and emergency attendances by date and local health board\n')
+        f.write('Source: synthetic\n')
+        df.to_csv(f, index=False)
+        f.write('Notes,Data are synthetic\n')
+
+def generate_raw_datasets(output_dir: str, n_hospitals: int = 10, n_years: int = 1, start_year: int = 2020, arrivals_per_day: float = 50, sources: list = None, seed: int = 0) -> list:
+    """
+    Genera ficheros en bruto sintéticos con el mismo formato que cada fuente real, para medir el
+    rendimiento de la limpieza y el preprocesado sin los datasets originales
+
+    Parameters:
+    - output_dir (str): carpeta de salida (normalmente una carpeta raw_datasets temporal)
+    - n_hospitals (int): número de hospitales de las fuentes con varios hospitales
+    - n_years (int): número de años de datos desde start_year (en México, un fichero por formato anual)
+    - start_year (int): primer año generado
+    - arrivals_per_day (float): media de admisiones diarias por hospital
+    - sources (list): nombres de SYNTHETIC_DATASETS a generar (por defecto todos)
+    - seed (int): semilla aleatoria
+
+    Returns:
+    - list: nombres de las fuentes generadas
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(f'{start_year}-01-01', f'{start_year + n_years - 1}-12-31', freq='D')
+    sources = sources or [dataset['name'] for dataset in SYNTHETIC_DATASETS]
+
+    writers = {
+        'australia': lambda: write_australia(output_dir, rng, n_hospitals, dates, arrivals_per_day),
+        'cardiff': lambda: write_cardiff(output_dir, rng, dates, arrivals_per_day),
+        'chile': lambda: write_chile(output_dir, rng, n_hospitals, dates, arrivals_per_day),
+        'colombia': lambda: write_colombia(output_dir, rng, n_hospitals, dates, arrivals_per_day),
+        'col_betania': lambda: write_col_betania(output_dir, rng, dates, arrivals_per_day),
+        'esp_canarias': lambda: write_esp_canarias(output_dir, rng, n_hospitals, dates, arrivals_per_day),
+        'esp_castilla_y_leon': lambda: write_esp_castilla_y_leon(output_dir, rng, n_hospitals, dates, arrivals_per_day),
+        'iowa': lambda: write_iowa(output_dir, rng, dates, arrivals_per_day),
+        'iran': lambda: write_iran(output_dir, rng, dates, arrivals_per_day),
+        'wales': lambda: write_wales(output_dir, rng, n_hospitals, dates, arrivals_per_day),
+        **{f'mexico_{year}': (lambda year=year: write_mexico(output_dir, rng, n_hospitals, year, arrivals_per_day)) for year in MEXICO_YEARS}
+    }
+
+    generated = []
+    multicountry = False
+    for name in sources:
+        if name in ('pak_', 'usa_', 'nl_', 'bwa_'):
+            if not multicountry:
+                write_multicountry(output_dir, rng, n_hospitals, dates, arrivals_per_day)
+                multicountry = True
+        elif name in writers:
+            writers[name]()
+        else:
+            raise ValueError(f"Fuente sintética no soportada: {name}")
+        generated.append(name)
+
+    print(f"Datos sintéticos generados en: {output_dir} ({len(generated)} fuentes)")
+    return generated
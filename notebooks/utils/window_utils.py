@@ -0,0 +1,164 @@
+import pandas as pd
+import numpy as np
+import pyarrow.parquet as pq
+from numpy.lib.stride_tricks import sliding_window_view
+from utils.data_preprocessing_utils import CALENDAR_COLUMNS
+from utils.backtesting_utils import prepare_hospital_arrays
+
+class SupervisedWindows:
+    """
+    Matrices supervisadas (ventana de admisiones pasadas -> admisiones de los próximos h periodos)
+    para todos los hospitales de un dataset.
+
+    Las ventanas son una única vista sliding_window_view sobre el array float32 de admisiones;
+    solo se indexan los inicios que no cruzan el límite entre hospitales. Los datos solo se copian
+    cuando se pide un lote con get_batch o to_arrays.
+    """
+
+    def __init__(self, y: np.ndarray, exog: np.ndarray, starts: np.ndarray, lookback: int, horizon: int,
+                 hospitals: list, offsets: np.ndarray, exog_columns: list, stride: int = 1):
+        self.y = y
+        self.exog = exog
+        self.starts = starts
+        self.lookback = lookback
+        self.horizon = horizon
+        self.hospitals = hospitals
+        self.offsets = offsets
+        self.exog_columns = exog_columns
+        self.stride = stride
+
+        # Vista sin copia: cada fila es [ventana de entrada | objetivos]
+        self.windows = sliding_window_view(y, lookback + horizon) if len(y) >= lookback + horizon else np.empty((0, lookback + horizon), dtype=y.dtype)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def hospital_view(self, hospital: str) -> tuple:
+        """
+        Devuelve las ventanas de un hospital como vistas, sin copiar datos. Se aplica el mismo stride que en
+        starts, así que las filas coinciden con las muestras del hospital en get_batch y to_arrays.
+
+        Parameters:
+        - hospital (str): nombre del hospital
+
+        Returns:
+        - tuple: (entradas, objetivos, exógenas) de forma (n, lookback), (n, horizon) y (n, k)
+        """
+        i = self.hospitals.index(hospital)
+        first = self.offsets[i]
+        last = self.offsets[i + 1] - self.lookback - self.horizon + 1
+
+        if last <= first:
+            return self.windows[:0, :self.lookback], self.windows[:0, self.lookback:], self.exog[:0]
+
+        windows = self.windows[first:last:self.stride]
+        exog = self.exog[first + self.lookback:last + self.lookback:self.stride]
+
+        return windows[:, :self.lookback], windows[:, self.lookback:], exog
+
+    def get_batch(self, indices: np.ndarray, with_exog: bool = True) -> tuple:
+        """
+        Materializa un lote de muestras. Las exógenas (calendario del primer periodo a predecir)
+        se concatenan a la ventana de entrada solo en este momento.
+
+        Parameters:
+        - indices (np.ndarray): posiciones de las muestras
+        - with_exog (bool): indica si se añaden las columnas exógenas a las entradas
+
+        Returns:
+        - tuple: (X, Y) como arrays float32
+        """
+        starts = self.starts[indices]
+        windows = self.windows[starts]
+        X = windows[:, :self.lookback]
+        Y = windows[:, self.lookback:]
+
+        if with_exog and self.exog.shape[1] > 0:
+            X = np.concatenate([X, self.exog[starts + self.lookback]], axis=1)
+
+        return X, Y
+
+    def iter_batches(self, batch_size: int = 1024, shuffle: bool = False, seed: int = None, with_exog: bool = True):
+        """
+        Recorre las muestras en lotes de tamaño fijo, materializando solo un lote cada vez
+
+        Parameters:
+        - batch_size (int): número de muestras por lote
+        - shuffle (bool): indica si se barajan las muestras
+        - seed (int): semilla del barajado
+        - with_exog (bool): indica si se añaden las columnas exógenas a las entradas
+
+        Returns:
+        - generator: tuplas (X, Y)
+        """
+        order = np.arange(len(self))
+        if shuffle:
+            np.random.default_rng(seed).shuffle(order)
+
+        for start in range(0, len(order), batch_size):
+            yield self.get_batch(order[start:start + batch_size], with_exog=with_exog)
+
+    def sample_hospitals(self) -> np.ndarray:
+        """
+        Devuelve el índice de hospital de cada muestra
+        """
+        return np.searchsorted(self.offsets, self.starts, side='right') - 1
+
+    def to_arrays(self, with_exog: bool = True) -> tuple:
+        """
+        Materializa todas las muestras (para modelos que necesitan la matriz completa en memoria)
+        """
+        return self.get_batch(np.arange(len(self)), with_exog=with_exog)
+
+def build_supervised_windows(df: pd.DataFrame, lookback: int, horizon: int = 1, exog_columns: list = None, stride: int = 1) -> SupervisedWindows:
+    """
+    Construye las matrices supervisadas de un dataset procesado sin romper los límites entre hospitales
+
+    Parameters:
+    - df (pd.DataFrame): DataFrame procesado por aggregate_data
+    - lookback (int): número de periodos pasados en la ventana de entrada (p.ej. 168 horas)
+    - horizon (int): número de periodos futuros a predecir
+    - exog_columns (list): columnas exógenas a concatenar (por defecto CALENDAR_COLUMNS)
+    - stride (int): separación entre inicios de ventana consecutivos
+
+    Returns:
+    - SupervisedWindows: contenedor perezoso de las ventanas
+    """
+    exog_columns = exog_columns if exog_columns is not None else CALENDAR_COLUMNS
+    hospitals, offsets, times, y, exog = prepare_hospital_arrays(df, exog_columns, dtype=np.float32)
+
+    # Inicios válidos: la ventana completa (entrada + objetivos) cabe dentro del hospital
+    starts = []
+    for i in range(len(hospitals)):
+        last = offsets[i + 1] - lookback - horizon + 1
+        if last > offsets[i]:
+            starts.append(np.arange(offsets[i], last, stride, dtype=np.int64))
+
+    starts = np.concatenate(starts) if starts else np.empty(0, dtype=np.int64)
+
+    windows = SupervisedWindows(y, exog, starts, lookback, horizon, hospitals, offsets, exog_columns, stride)
+
+    print(f"Ventanas construidas: {len(windows)} muestras, lookback {lookback}, horizonte {horizon}")
+    return windows
+
+def load_supervised_windows(path: str, lookback: int, horizon: int = 1, exog_columns: list = None, stride: int = 1) -> SupervisedWindows:
+    """
+    Lee un parquet procesado (solo las columnas necesarias) y construye sus ventanas supervisadas
+
+    Parameters:
+    - path (str): ruta del parquet en processed_datasets
+    - lookback (int): número de periodos pasados en la ventana de entrada
+    - horizon (int): número de periodos futuros a predecir
+    - exog_columns (list): columnas exógenas a concatenar (por defecto CALENDAR_COLUMNS)
+    - stride (int): separación entre inicios de ventana consecutivos
+
+    Returns:
+    - SupervisedWindows: contenedor perezoso de las ventanas
+    """
+    exog_columns = exog_columns if exog_columns is not None else CALENDAR_COLUMNS
+    available = pq.read_schema(path).names
+    columns = [col for col in ['hospital', 'date', 'datetime', 'admissions'] + exog_columns if col in available]
+
+    df = pd.read_parquet(path, columns=columns)
+
+    return build_supervised_windows(df, lookback, horizon, exog_columns, stride)
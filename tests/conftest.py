@@ -0,0 +1,17 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+NOTEBOOKS_DIR = Path(__file__).resolve().parents[1] / 'notebooks'
+
+# Los módulos de utils se importan como en los notebooks ('from utils.x import ...')
+sys.path.insert(0, str(NOTEBOOKS_DIR))
+
+@pytest.fixture(autouse=True)
+def notebooks_cwd(monkeypatch):
+    """
+    Ejecuta cada test desde notebooks/, ya que las rutas de utils son relativas a esa carpeta ('../datasets/...')
+    """
+    monkeypatch.chdir(NOTEBOOKS_DIR)
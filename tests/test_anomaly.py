@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.anomaly_utils import ANOMALY_COLUMNS, OnlineAnomalyDetector, replay_anomalies
+
+PROCESSED_DIR = '../datasets/processed_datasets/'
+
+def online_anomalies(df: pd.DataFrame, resolution: str) -> tuple:
+    """
+    Pasa las filas por el detector en línea, una a una y en orden temporal
+    """
+    detector = OnlineAnomalyDetector(resolution)
+    time_col = detector.time_col
+    rows = [detector.update(hospital, period, admissions)
+            for hospital, period, admissions in df.sort_values(time_col)[['hospital', time_col, 'admissions']].itertuples(index=False)]
+
+    return pd.DataFrame(rows).set_index(['hospital', time_col]), detector
+
+@pytest.mark.parametrize('name', ['spain_data', 'cardiff_data'])
+@pytest.mark.parametrize('missing', [0.0, 0.05])
+def test_replay_matches_online_detector(name, missing):
+    df = pd.read_parquet(f'{PROCESSED_DIR}{name}.parquet')
+    df['admissions'] = df['admissions'].astype(float).mask(np.random.default_rng(0).random(len(df)) < missing)
+    resolution = 'day' if 'date' in df.columns else 'hour'
+
+    online, online_detector = online_anomalies(df, resolution)
+    replay_detector = OnlineAnomalyDetector(resolution)
+    replayed = replay_anomalies(df, replay_detector).set_index(online.index.names).loc[online.index]
+
+    for col in ANOMALY_COLUMNS:
+        np.testing.assert_array_equal(online[col].to_numpy(), replayed[col].to_numpy(), err_msg=col)
+
+    # Las filas sin dato no se puntúan
+    assert replayed.loc[replayed['admissions'].isna(), 'zscore'].isna().all()
+
+    # El estado final es el mismo, así que el detector puede seguir en línea tras la reproducción
+    for hospital, baseline in online_detector.baselines.items():
+        replay_baseline = replay_detector.baselines[hospital]
+        np.testing.assert_array_equal(baseline.mean, replay_baseline.mean)
+        np.testing.assert_array_equal(baseline.var, replay_baseline.var)
+        np.testing.assert_array_equal(baseline.n, replay_baseline.n)
+        assert baseline.last_period == replay_baseline.last_period
+
+def test_missing_observation_does_not_disable_its_slot():
+    detector = OnlineAnomalyDetector('day', warmup=2)
+    weeks = pd.date_range('2024-01-01', periods=6, freq='7D')
+    results = [detector.update('H1', week, value) for week, value in zip(weeks, [10, 11, np.nan, 9, 10, 50])]
+
+    assert np.isnan(results[2]['zscore']) and not results[2]['is_anomaly']
+    assert np.isfinite(results[3]['zscore'])
+    assert results[5]['is_anomaly']
+    assert detector.baselines['H1'].n[0] == 5
@@ -0,0 +1,29 @@
+import os
+import shutil
+
+from utils.arrow_handoff_utils import arrow_handoff_dir, clean_files_in_pool
+from utils.data_cleaning_utils import read_multi_file_paths
+from utils.instrumentation_utils import TRACE_EVENTS, start_trace
+from utils.synthetic_data_utils import generate_raw_datasets
+
+def test_pool_stages_reach_the_driver_trace(tmp_path, monkeypatch):
+    # Estructura del repositorio en una carpeta temporal: raw_datasets con dos ficheros de Irán y la caché de etapas
+    (tmp_path / 'notebooks').mkdir()
+    monkeypatch.chdir(tmp_path / 'notebooks')
+    generate_raw_datasets('../datasets/raw_datasets', n_hospitals=3, n_years=1, sources=['iran'])
+    shutil.copy('../datasets/raw_datasets/iran_data.csv', '../datasets/raw_datasets/iran_b_data.csv')
+    paths = read_multi_file_paths('csv', 'iran')
+
+    start_trace()
+    for _ in range(2):
+        with arrow_handoff_dir(str(tmp_path / 'handoff')) as handoff_dir:
+            table = clean_files_in_pool('iran', 'csv', paths, {}, False, handoff_dir, max_workers=2)
+            assert table.num_rows > 0
+
+    process_events = [event for event in TRACE_EVENTS if event['name'] == 'process_iran']
+    assert len(process_events) == 4
+    assert all(event['pid'] != os.getpid() for event in process_events)
+
+    # La segunda vez las etapas salen de la caché y quedan en la traza como 'cached'
+    assert [event.get('cached', False) for event in process_events] == [False, False, True, True]
+    assert sum(event['name'] == 'read_raw_data' for event in TRACE_EVENTS) == 4
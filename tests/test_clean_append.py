@@ -0,0 +1,81 @@
+import pandas as pd
+import pytest
+
+from utils import data_cleaning_utils, hospital_registry_utils
+from utils.data_cleaning_utils import (save_clean_source, process_esp_canarias, process_esp_castilla_y_leon,
+                                       process_mexico_2019, process_mexico_2020)
+from utils.hospital_registry_utils import load_hospital_registry
+
+@pytest.fixture
+def clean_dir(tmp_path, monkeypatch):
+    """
+    Registro de hospitales y carpeta clean_datasets temporales, para no tocar los datos del repositorio
+    """
+    monkeypatch.setattr(hospital_registry_utils, 'HOSPITAL_REGISTRY_PATH', str(tmp_path / 'hospital_registry.parquet'))
+    monkeypatch.setattr(data_cleaning_utils, 'CLEAN_DATA_DIR', f'{tmp_path}/')
+
+    return tmp_path
+
+def raw_canarias() -> pd.DataFrame:
+    return pd.DataFrame({
+        'codigo': ['350290', '350290', '380178', '380178'],
+        'fecha': ['01/01/2022', '02/01/2022', '01/01/2022', '02/01/2022'],
+        'valor': [5, 7, 3, 4]
+    })
+
+def raw_castilla_y_leon() -> pd.DataFrame:
+    return pd.DataFrame({
+        'Fecha de atención': ['2022-01-01', '2022-01-01', '2022-01-02'],
+        'Hospital': ['Hospital Clínico de Valladolid', 'Hospital de León', 'Hospital de León']
+    })
+
+def raw_mexico_2019() -> pd.DataFrame:
+    return pd.DataFrame([
+        ['DFIMS000011', '2019-12-31', '10', '5'],
+        ['DFIMS000011', '2019-12-31', '10', '30'],
+        ['JCIMS000023', '2019-12-31', '22', '0']
+    ])
+
+def raw_mexico_2020() -> pd.DataFrame:
+    return pd.DataFrame({
+        'CLUES': ['DFIMS000011', 'MCIMS000104'],
+        'fechaingreso': ['2020-01-01', '2020-01-01'],
+        'hora_ingreso': ['08:00', '09:00']
+    })
+
+def test_castilla_y_leon_keeps_canarias_ids(clean_dir):
+    canarias = save_clean_source(process_esp_canarias(raw_canarias()), 'spain_data', 'esp_canarias')
+    registry_before = load_hospital_registry()
+
+    castilla = save_clean_source(process_esp_castilla_y_leon(raw_castilla_y_leon()), 'spain_data',
+                                 'esp_castilla_y_leon', append=True)
+    registry = load_hospital_registry()
+    spain = pd.read_parquet(clean_dir / 'spain_data.parquet')
+
+    # Las filas de Canarias conservan sus identificadores y solo se registran los dos hospitales nuevos
+    merged = spain.merge(canarias, on=['date', 'hospital'], suffixes=('', '_canarias'))
+    assert len(merged) == len(canarias)
+    assert len(registry) == len(registry_before) + 2
+    pd.testing.assert_frame_equal(registry.iloc[:len(registry_before)], registry_before)
+
+    # Ningún identificador existente se registra como clave nativa de Castilla y León
+    nuevos = registry[registry['source'] == 'esp_castilla_y_leon']
+    assert set(nuevos['native_key']) == {'Hospital Clínico de Valladolid', 'Hospital de León'}
+    assert set(castilla['hospital']) == set(nuevos['hospital_id'])
+    assert len(spain) == len(canarias) + len(castilla)
+
+def test_mexico_years_keep_ids(clean_dir):
+    mexico_2019 = save_clean_source(process_mexico_2019(raw_mexico_2019()), 'mexico_data', 'mexico')
+    registry_before = load_hospital_registry()
+
+    save_clean_source(process_mexico_2020(raw_mexico_2020()), 'mexico_data', 'mexico', append=True)
+    registry = load_hospital_registry()
+    mexico = pd.read_parquet(clean_dir / 'mexico_data.parquet')
+
+    # El CLUES repetido conserva su identificador y solo se registra el nuevo
+    assert len(registry) == len(registry_before) + 1
+    pd.testing.assert_frame_equal(registry.iloc[:len(registry_before)], registry_before)
+    assert set(registry['native_key']) == {'DFIMS000011', 'JCIMS000023', 'MCIMS000104'}
+
+    first_year = mexico[mexico['datetime'] < '2020-01-01'].reset_index(drop=True)
+    pd.testing.assert_frame_equal(first_year[mexico_2019.columns], mexico_2019.reset_index(drop=True))
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.clustering_utils import extract_profile_features
+
+PROCESSED_DIR = '../datasets/processed_datasets/'
+
+def profile_reference(path: str) -> pd.DataFrame:
+    """
+    Perfil de cada hospital calculado en memoria con pandas, hospital a hospital, como referencia
+    """
+    df = pd.read_parquet(path)
+    time_col = 'datetime' if 'datetime' in df.columns else 'date'
+    times = df[time_col].dt.tz_localize(None) if df[time_col].dt.tz is not None else df[time_col]
+    df = df.assign(day=times.dt.floor('D'), admissions=df['admissions'].fillna(0))
+
+    rows = []
+    for hospital, group in df.groupby('hospital', sort=False):
+        daily = group.groupby('day')['admissions'].sum()
+        years = (daily.index - daily.index.min()).days.to_numpy() / 365.25
+        weekly = daily.groupby(daily.index.dayofweek).sum().reindex(range(7), fill_value=0) * 7 / daily.sum()
+        span = (daily.index.max() - daily.index.min()).days + 1
+
+        rows.append({
+            'hospital': hospital,
+            'mean_daily': daily.mean(),
+            **{f'weekly_{i}': weekly[i] for i in range(7)},
+            'trend': np.polyfit(years, daily.to_numpy(), 1)[0] / daily.mean() if len(daily) > 1 else 0.0,
+            'volatility': daily.std() / daily.mean(),
+            'intermittency': 1 - (daily > 0).sum() / span
+        })
+
+    return pd.DataFrame(rows)
+
+@pytest.mark.parametrize('name', ['spain_data', 'cardiff_data'])
+def test_profile_features_match_in_memory_reference(name):
+    path = f'{PROCESSED_DIR}{name}.parquet'
+    features = extract_profile_features(path)
+    reference = profile_reference(path)
+
+    merged = reference.merge(features, on='hospital', suffixes=('_ref', ''))
+    assert len(merged) == len(features) == len(reference)
+    for col in [c for c in reference.columns if c != 'hospital']:
+        np.testing.assert_allclose(merged[col], merged[f'{col}_ref'], rtol=1e-8, atol=1e-10, err_msg=col)
+
+@pytest.mark.parametrize('name', ['spain_data', 'cardiff_data'])
+def test_profile_features_do_not_depend_on_batch_size(name):
+    path = f'{PROCESSED_DIR}{name}.parquet'
+    features = extract_profile_features(path)
+
+    # Lotes pequeños y de tamaño impar: hospitales y días quedan repartidos entre lotes
+    batched = extract_profile_features(path, batch_size=997)
+
+    pd.testing.assert_frame_equal(batched, features, rtol=1e-10)
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+import statsmodels.api as sm
+
+from utils.count_forecast_utils import fit_count_glm
+
+def synthetic_counts(lengths=(120, 200, 90), p: int = 4, seed: int = 0) -> tuple:
+    """
+    Series de conteo Poisson de varios hospitales con longitudes distintas, apiladas como en prepare_hospital_arrays
+    """
+    rng = np.random.default_rng(seed)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    X = np.column_stack([np.ones(offsets[-1]), rng.normal(size=(offsets[-1], p - 1))])
+    beta = rng.normal(scale=0.3, size=(len(lengths), p)) + np.array([2.0] + [0.0] * (p - 1))
+
+    hospital = np.repeat(np.arange(len(lengths)), lengths)
+    y = rng.poisson(np.exp((X * beta[hospital]).sum(axis=1))).astype(float)
+
+    # Algunas filas sin lags (NaN), como las primeras de cada hospital en aggregate_data
+    X[offsets[:-1] + 1, 1] = np.nan
+
+    return X, y, offsets
+
+def test_poisson_matches_per_hospital_glm():
+    X, y, offsets = synthetic_counts()
+    betas, _ = fit_count_glm(X, y, offsets, 'poisson', ridge=0.0, tol=1e-12, max_iter=100)
+
+    for i in range(len(offsets) - 1):
+        rows = slice(offsets[i], offsets[i + 1])
+        valid = np.isfinite(X[rows]).all(axis=1)
+        reference = sm.GLM(y[rows][valid], X[rows][valid], family=sm.families.Poisson()).fit(tol=1e-12)
+        np.testing.assert_allclose(betas[i], reference.params, rtol=1e-8, atol=1e-8)
+
+@pytest.mark.parametrize('family', ['poisson', 'negbin'])
+def test_batched_fit_matches_one_hospital_at_a_time(family):
+    X, y, offsets = synthetic_counts()
+    betas, alphas = fit_count_glm(X, y, offsets, family)
+
+    # Con un presupuesto mínimo cada lote tiene un único hospital
+    single_betas, single_alphas = fit_count_glm(X, y, offsets, family, max_batch_bytes=1)
+
+    np.testing.assert_allclose(betas, single_betas, rtol=1e-10, atol=1e-10)
+    np.testing.assert_allclose(alphas, single_alphas, rtol=1e-10, atol=1e-12)
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import data_cleaning_utils, hospital_registry_utils
+from utils.data_cleaning_utils import save_clean_source, process_esp_canarias, process_esp_castilla_y_leon
+from utils.exogenous_utils import asof_positions, add_exogenous_features, save_hospital_subdivisions
+from utils.hospital_registry_utils import load_hospital_registry
+
+@pytest.mark.parametrize('tolerance', [None, np.timedelta64(2, 'D')])
+def test_asof_positions_matches_merge_asof(tolerance):
+    rng = np.random.default_rng(0)
+    start = np.datetime64('2023-01-01', 's')
+    left = pd.DataFrame({
+        'key': rng.integers(0, 5, 2000),
+        'time': start + rng.integers(0, 60 * 86400, 2000).astype('timedelta64[s]')
+    })
+    right = pd.DataFrame({
+        'key': rng.integers(0, 6, 300),
+        'time': start + rng.integers(0, 60 * 86400, 300).astype('timedelta64[s]')
+    }).drop_duplicates(['key', 'time'])
+    right['row'] = np.arange(len(right))
+
+    position = asof_positions(left['key'].to_numpy(), left['time'].to_numpy(), right['key'].to_numpy(),
+                              right['time'].to_numpy(), tolerance)
+
+    expected = pd.merge_asof(
+        left.reset_index().sort_values('time'), right.sort_values('time'), on='time', by='key',
+        direction='backward', tolerance=pd.Timedelta(tolerance) if tolerance is not None else None
+    ).sort_values('index')
+    np.testing.assert_array_equal(position, expected['row'].fillna(-1).to_numpy(dtype=np.int64))
+
+def test_spain_regions_keep_their_own_holidays(tmp_path, monkeypatch):
+    monkeypatch.setattr(hospital_registry_utils, 'HOSPITAL_REGISTRY_PATH', str(tmp_path / 'hospital_registry.parquet'))
+    monkeypatch.setattr(data_cleaning_utils, 'CLEAN_DATA_DIR', f'{tmp_path}/')
+
+    # 23 de abril: Día de Castilla y León; 30 de mayo: Día de Canarias
+    fechas = ['23/04/2022', '30/05/2022']
+    canarias = pd.DataFrame({'codigo': ['350290', '350290'], 'fecha': fechas, 'valor': [5, 7]})
+    castilla = pd.DataFrame({'Fecha de atención': ['2022-04-23', '2022-05-30'], 'Hospital': ['Hospital de León'] * 2})
+
+    # Igual que el notebook 01: la subdivisión se guarda con las filas que ha producido cada fuente
+    rows = save_clean_source(process_esp_canarias(canarias), 'spain_data', 'esp_canarias')
+    save_hospital_subdivisions(rows['hospital'], 'CN')
+    rows = save_clean_source(process_esp_castilla_y_leon(castilla), 'spain_data', 'esp_castilla_y_leon', append=True)
+    save_hospital_subdivisions(rows['hospital'], 'CL')
+
+    registry = load_hospital_registry().set_index('source')
+    assert registry.loc['esp_canarias', 'subdiv'] == 'CN'
+    assert registry.loc['esp_castilla_y_leon', 'subdiv'] == 'CL'
+
+    spain = add_exogenous_features(pd.read_parquet(tmp_path / 'spain_data.parquet'), 'spain_data')
+    holidays = spain.set_index(['hospital', 'date'])['is_holiday']
+    canarias_id = registry.loc['esp_canarias', 'hospital_id']
+    castilla_id = registry.loc['esp_castilla_y_leon', 'hospital_id']
+
+    assert holidays[(canarias_id, pd.Timestamp('2022-05-30'))] == 1
+    assert holidays[(canarias_id, pd.Timestamp('2022-04-23'))] == 0
+    assert holidays[(castilla_id, pd.Timestamp('2022-04-23'))] == 1
+    assert holidays[(castilla_id, pd.Timestamp('2022-05-30'))] == 0
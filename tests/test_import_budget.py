@@ -0,0 +1,48 @@
+import json
+import subprocess
+import sys
+
+from conftest import NOTEBOOKS_DIR
+
+# Presupuesto de importar el módulo por encima de pandas y numpy, que cualquier worker ya carga
+IMPORT_TIME_BUDGET_S = 0.5
+IMPORT_RSS_BUDGET_BYTES = 50 * 1024 ** 2
+
+HEAVY_MODULES = ['statsmodels', 'scipy.stats', 'matplotlib', 'seaborn']
+
+MEASURE_IMPORT = '''
+import json, resource, sys, time
+import numpy, pandas
+
+rss_start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+import utils.data_exploration_utils
+elapsed = time.perf_counter() - start
+rss_end = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+scale = 1 if sys.platform == 'darwin' else 1024
+print(json.dumps({
+    'time_s': elapsed,
+    'rss_bytes': (rss_end - rss_start) * scale,
+    'modules': sorted(sys.modules)
+}))
+'''
+
+def measure_import() -> dict:
+    """
+    Importa data_exploration_utils en un proceso nuevo, como un worker del pool, y devuelve tiempo, memoria y módulos
+    """
+    result = subprocess.run([sys.executable, '-c', MEASURE_IMPORT], cwd=NOTEBOOKS_DIR,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_heavy_dependencies_not_imported():
+    modules = set(measure_import()['modules'])
+
+    assert not [m for m in HEAVY_MODULES if m in modules]
+
+def test_import_within_budget():
+    measurement = measure_import()
+
+    assert measurement['time_s'] < IMPORT_TIME_BUDGET_S
+    assert measurement['rss_bytes'] < IMPORT_RSS_BUDGET_BYTES
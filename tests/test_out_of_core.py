@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.data_preprocessing_utils import cast_columns_types, group_data
+from utils.out_of_core_utils import group_data_out_of_core
+
+def write_clean_parquet(path, n_rows: int = 20_000, seed: int = 0) -> None:
+    """
+    Parquet limpio sintético por minuto, con varias filas por (hospital, minuto) y en orden aleatorio
+    """
+    rng = np.random.default_rng(seed)
+    minutes = rng.integers(0, 30 * 24 * 60, n_rows).astype('timedelta64[m]')
+    pd.DataFrame({
+        'datetime': pd.Timestamp('2023-03-01').to_datetime64() + minutes,
+        'admissions': rng.integers(1, 4, n_rows),
+        'hospital': rng.integers(0, 37, n_rows).astype('int32')
+    }).to_parquet(path, index=False, row_group_size=3000)
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_out_of_core_matches_group_data(tmp_path, max_workers):
+    path = tmp_path / 'clean.parquet'
+    write_clean_parquet(path)
+
+    expected = group_data(cast_columns_types(pd.read_parquet(path)))
+    chunks = list(group_data_out_of_core(str(path), n_partitions=5, max_workers=max_workers,
+                                         transform=cast_columns_types, spill_dir=str(tmp_path / 'spill'),
+                                         chunk_rows=1000))
+
+    assert len(chunks) > 1
+    pd.testing.assert_frame_equal(pd.concat(chunks), expected)
+    assert not any((tmp_path / 'spill').glob('**/*.parquet'))
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.data_cleaning_utils import process_australia
+
+CLEAN_PATH = '../datasets/clean_datasets/australia_data.parquet'
+
+def process_australia_reference(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Copia congelada de process_australia antes de vectorizarla, usada como referencia
+    """
+    new_columns = []
+    last_hospital = None
+
+    for col in df.columns.to_list():
+        hospital, campo = col
+        if not str(hospital).startswith("Unnamed"):
+            last_hospital = hospital
+        new_columns.append(f"{last_hospital}_{campo}" if campo != "Date" else "Date")
+
+    df.columns = new_columns
+
+    hospitales = set()
+    for col in df.columns:
+        if col != "Date":
+            hospitales.add("_".join(col.split("_")[:-1]))
+    hospitales = sorted([h for h in hospitales if not h.endswith("_Tri")])
+
+    dfs_por_hospital = {}
+    for hospital in hospitales:
+        cols_hospital = [col for col in df.columns if col.startswith(hospital + "_")]
+        df_hospital = df[["Date"] + cols_hospital].copy()
+        df_hospital = df_hospital.rename(columns={col: col.replace(hospital + "_", "") for col in cols_hospital})
+        df_hospital["Hospital"] = hospital
+        dfs_por_hospital[hospital] = df_hospital
+
+    df_final = pd.concat(dfs_por_hospital.values(), ignore_index=True)
+    df_filtrado = df_final[['Date', 'Admissions', 'Hospital']]
+
+    return df_filtrado.rename(columns={'Date': 'date', 'Admissions': 'admissions', 'Hospital': 'hospital'})
+
+def to_raw(clean: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reconstruye el CSV ancho de Australia (cabecera de dos niveles, un bloque Tri_1, Tri_2, Admissions por
+    hospital con el nombre solo en la primera columna) a partir de los datos limpios
+    """
+    dates = clean['date'].drop_duplicates().to_list()
+    rng = np.random.default_rng(0)
+
+    columns = [('Unnamed: 0_level_0', 'Date')]
+    data = [dates]
+    # El orden del fichero no es alfabético: la salida debe ordenar los hospitales igualmente
+    for i, (hospital, group) in enumerate(reversed(list(clean.groupby('hospital', sort=True)))):
+        admissions = group.set_index('date')['admissions'].reindex(dates).to_numpy()
+        columns += [(hospital, 'Tri_1'), (f'Unnamed: {3 * i + 2}_level_0', 'Tri_2'), (f'Unnamed: {3 * i + 3}_level_0', 'Admissions')]
+        data += [rng.integers(0, 5, len(dates)).astype(float), rng.integers(0, 5, len(dates)).astype(float), admissions]
+
+    return pd.DataFrame(dict(enumerate(data))).set_axis(pd.MultiIndex.from_tuples(columns), axis=1)
+
+@pytest.fixture
+def raw_with_nans():
+    clean = pd.DataFrame({
+        'date': ['01-JUL-2013', '02-JUL-2013', '03-JUL-2013', '04-JUL-2013'] * 3,
+        'admissions': [19.0, np.nan, 11.0, 15.0, 7.0, 8.0, np.nan, np.nan, 30.0, 31.0, 32.0, 33.0],
+        'hospital': ['Royal Perth Hospital'] * 4 + ['Fremantle Hospital'] * 4 + ['Swan District Hospital'] * 4
+    })
+    raw = to_raw(clean)
+    # Fila con fecha vacía, como las filas finales del CSV
+    raw.loc[len(raw)] = np.nan
+
+    return raw
+
+def test_matches_reference_implementation(raw_with_nans):
+    expected = process_australia_reference(raw_with_nans.copy())
+    result = process_australia(raw_with_nans.copy())
+
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False)
+
+def test_matches_committed_clean_dataset():
+    clean = pd.read_parquet(CLEAN_PATH)
+    result = process_australia(to_raw(clean))
+
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), clean.reset_index(drop=True), check_dtype=False)
@@ -0,0 +1,53 @@
+import importlib
+import linecache
+import sys
+
+from utils.stage_cache_utils import get_stage_key
+
+STAGES = '''
+import pandas as pd
+
+FACTOR = {factor}
+
+def helper(df):
+    return df * FACTOR
+
+def process_a(df):
+    return helper(df) + {offset_a}
+
+def process_b(df):
+    return helper(df) + 1
+'''
+
+def load_stages(tmp_path, monkeypatch, **params):
+    """
+    Escribe (o reescribe) un módulo con dos etapas que comparten una función auxiliar y lo recarga
+    """
+    (tmp_path / 'stages_fixture.py').write_text(STAGES.format(**{'factor': 2, 'offset_a': 0, **params}))
+    linecache.clearcache()
+    importlib.invalidate_caches()
+
+    if 'stages_fixture' in sys.modules:
+        return importlib.reload(sys.modules['stages_fixture'])
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+    return importlib.import_module('stages_fixture')
+
+def stage_keys(module) -> tuple:
+    return get_stage_key(module.process_a, (1,), {}), get_stage_key(module.process_b, (1,), {})
+
+def test_editing_one_stage_keeps_other_keys(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, 'dont_write_bytecode', True)
+    key_a, key_b = stage_keys(load_stages(tmp_path, monkeypatch))
+
+    # Cambiar process_a solo invalida process_a
+    edited_a, edited_b = stage_keys(load_stages(tmp_path, monkeypatch, offset_a=10))
+    assert edited_a != key_a
+    assert edited_b == key_b
+
+    # Cambiar una constante que usa la función auxiliar invalida las dos etapas
+    changed_a, changed_b = stage_keys(load_stages(tmp_path, monkeypatch, offset_a=10, factor=3))
+    assert changed_a != edited_a
+    assert changed_b != edited_b
+
+    sys.modules.pop('stages_fixture', None)
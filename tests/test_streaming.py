@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.data_preprocessing_utils import group_data, aggregate_data
+from utils.streaming_utils import StreamingAggregator, stream_rows_to_df
+
+FLOOR = {'day': 'D', 'hour': 'h', 'minute': 'min'}
+
+def synthetic_events(n_events: int = 3000, days: int = 60, seed: int = 0) -> pd.DataFrame:
+    """
+    Llegadas sintéticas (una fila por paciente) de tres hospitales, en orden temporal
+    """
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2023-01-01T00:00', 's')
+    offsets = np.sort(rng.integers(0, days * 86400, n_events))
+
+    return pd.DataFrame({
+        'hospital': rng.choice(['H1', 'H2', 'H3'], n_events),
+        'timestamp': pd.to_datetime(start + offsets.astype('timedelta64[s]')).as_unit('ns')
+    })
+
+@pytest.mark.parametrize('resolution', ['day', 'hour', 'minute'])
+def test_stream_matches_aggregate_data(resolution):
+    events = synthetic_events()
+    time_col = 'date' if resolution == 'day' else 'datetime'
+
+    aggregator = StreamingAggregator(resolution)
+    rows = list(aggregator.ingest(events.itertuples(index=False, name=None))) + aggregator.flush()
+    streamed = stream_rows_to_df(rows, resolution)
+
+    arrivals = pd.DataFrame({
+        'hospital': events['hospital'],
+        time_col: events['timestamp'].dt.floor(FLOOR[resolution]),
+        'admissions': 1
+    })
+    expected = aggregate_data(group_data(arrivals))
+
+    assert aggregator.late_events == 0
+    pd.testing.assert_frame_equal(streamed, expected[streamed.columns])